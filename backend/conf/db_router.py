@@ -0,0 +1,145 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# The replica the current request reads from; None reads from the primary.
+replica_alias = ContextVar("replica_alias", default=None)
+
+PIN_COOKIE = "db_primary"
+
+
+def pin_key(user_id):
+    return f"db-primary:{user_id}"
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes and migrations go to the primary. Reads go to the replica a
+    ``ReplicaReadMixin`` view picked for the current request, and to the
+    primary everywhere else, so only the views that opt in can see lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias.get()
+        if alias is None or self.same_database(alias):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def same_database(alias):
+        # A test mirror points at the test database; reading it through the primary's connection
+        # keeps the reads inside the test's transaction.
+        replica, primary = connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+        return all(replica.get(key) == primary.get(key) for key in ("HOST", "PORT", "NAME"))
+
+
+def choose_replica(request, pinned):
+    if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS or pinned:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def _pinned_user(request):
+    user = getattr(request, "user", None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user_id = _pinned_user(request)
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+async def ais_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user_id = _pinned_user(request)
+    return user_id is not None and await cache.aget(pin_key(user_id)) is not None
+
+
+class ReplicaReadMixin:
+    """
+    Serves safe requests from a random replica, picked after authentication
+    so that clients who wrote within ``REPLICA_STICKY_SECONDS`` stay on the
+    primary. ``read_database`` is the replica used, or None for the primary.
+    """
+    read_database = None
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            self.read_database = choose_replica(request, is_pinned(request))
+            self._replica_token = replica_alias.set(self.read_database)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            replica_alias.reset(self._replica_token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Pins a client to the primary for ``REPLICA_STICKY_SECONDS`` after a
+    successful write, so its next reads see the write while replicas catch
+    up. Users are pinned in the cache, which every process shares, anonymous
+    clients with a cookie.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            user_id = _pinned_user(request)
+            if user_id is not None:
+                cache.set(pin_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+            else:
+                self.set_cookie(response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            # request.user may still be the lazy session user, which loads synchronously.
+            user_id = await sync_to_async(_pinned_user)(request)
+            if user_id is not None:
+                await cache.aset(pin_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+            else:
+                self.set_cookie(response)
+        return response
+
+    @staticmethod
+    def wrote(request, response):
+        return bool(settings.DATABASE_REPLICAS) and request.method not in SAFE_METHODS and response.status_code < 400
+
+    @staticmethod
+    def set_cookie(response):
+        response.set_cookie(
+            PIN_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax"
+        )
@@ -0,0 +1,257 @@
+import functools
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+from users.permissions import IsAdminUser
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is unbounded.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+current_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What one request spent its time on. Serializer time includes the SQL serializers trigger."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = self.serializer_time = self.render_time = 0.0
+        self.statements = Counter()
+        self.queries = Counter()
+        self.in_serializer = False
+        self.render_started = None
+
+    @property
+    def query_count(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        """Queries repeated with the same SQL and parameters."""
+        return sum(count - 1 for count in self.queries.values())
+
+    @property
+    def similar(self):
+        """Queries repeated with the same SQL and any parameters: N+1 patterns."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def rendered(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+    def server_timing(self, elapsed):
+        metrics = [
+            f'sql;dur={self.sql_time * 1000:.2f};desc="{self.query_count} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={elapsed * 1000:.2f}',
+        ]
+        if self.similar:
+            metrics.insert(1, f'sql-repeat;desc="{self.duplicates} duplicate, {self.similar} similar"')
+        return ", ".join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.statements[sql] += 1
+        metrics.queries[sql, repr(params)] += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serializer(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.in_serializer:
+            return method(self, *args, **kwargs)
+        metrics.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.in_serializer = False
+    return wrapper
+
+
+def install():
+    """Record SQL on every connection and time serializer validation and ``.data``; idempotent."""
+    connection_created.connect(install_query_recorder, dispatch_uid="instrumentation")
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+    if not getattr(BaseSerializer, "_instrumented", False):
+        # Serializer.data and ListSerializer.data both go through BaseSerializer.data.
+        BaseSerializer.data = property(timed_serializer(BaseSerializer.data.fget))
+        BaseSerializer.is_valid = timed_serializer(BaseSerializer.is_valid)
+        BaseSerializer._instrumented = True
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = self.errors = self.queries = self.duplicates = self.similar = 0
+        self.total = self.max = self.sql_time = self.serializer_time = self.render_time = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.worst_statement = ("", 0)
+
+    def add(self, metrics, elapsed, status):
+        elapsed_ms = elapsed * 1000
+        self.count += 1
+        self.errors += status >= 500
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        self.buckets[next((i for i, bound in enumerate(BUCKETS_MS) if elapsed_ms <= bound), len(BUCKETS_MS))] += 1
+        self.sql_time += metrics.sql_time * 1000
+        self.serializer_time += metrics.serializer_time * 1000
+        self.render_time += metrics.render_time * 1000
+        self.queries += metrics.query_count
+        self.duplicates += metrics.duplicates
+        self.similar += metrics.similar
+        if metrics.statements:
+            statement, repeats = metrics.statements.most_common(1)[0]
+            if repeats > self.worst_statement[1]:
+                self.worst_statement = (statement[:500], repeats)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the percentile, capped at the slowest request seen."""
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + (None,), self.buckets):
+            seen += count
+            if seen >= pct / 100 * self.count:
+                return min(bound, self.max) if bound is not None else self.max
+        return self.max
+
+    def as_dict(self):
+        mean = lambda total: round(total / self.count, 3) if self.count else 0.0
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": mean(self.total),
+            "max_ms": round(self.max, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "sql_ms": mean(self.sql_time),
+            "serializer_ms": mean(self.serializer_time),
+            "render_ms": mean(self.render_time),
+            "queries": mean(self.queries),
+            "duplicate_queries": mean(self.duplicates),
+            "similar_queries": mean(self.similar),
+            "most_repeated_query": {"sql": self.worst_statement[0], "count": self.worst_statement[1]},
+            "histogram_ms": dict(zip([str(bound) for bound in BUCKETS_MS] + ["+Inf"], self.buckets)),
+        }
+
+
+class RouteHistograms:
+    """Per-process request statistics keyed by method and URL route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.since = timezone.now()
+
+    def record(self, route, metrics, elapsed, status):
+        with self._lock:
+            self.routes.setdefault(route, RouteStats()).add(metrics, elapsed, status)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "since": self.since.isoformat(),
+                "routes": {route: stats.as_dict() for route, stats in sorted(self.routes.items())},
+            }
+
+
+route_histograms = RouteHistograms()
+
+
+class PerformanceMiddleware:
+    """
+    Measures SQL, serializer and render time per request, adds them as a
+    ``Server-Timing`` header when ``SERVER_TIMING`` is on and aggregates
+    them per route in ``route_histograms``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # First in MIDDLEWARE, so this runs last, right before DRF renders the response.
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(metrics.rendered)
+        return response
+
+    def finish(self, request, response, metrics):
+        elapsed = time.perf_counter() - metrics.started
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing(elapsed)
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else "<unmatched>"
+        route_histograms.record(f"{request.method} {route}", metrics, elapsed, response.status_code)
+        return response
+
+
+class RouteMetricsView(APIView):
+    """Staff only: this process's per-route request statistics; DELETE resets them."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(route_histograms.snapshot())
+
+    def delete(self, request):
+        route_histograms.reset()
+        return Response(status=204)
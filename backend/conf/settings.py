@@ -36,6 +36,7 @@ AUTH_USER_MODEL = 'users.User'
 
 
 MIDDLEWARE = [
+    'conf.instrumentation.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -44,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'conf.db_router.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'conf.urls'
@@ -76,6 +78,26 @@ DATABASES = {
     }
 }
 
+# Read replicas as comma separated "host[:port][/name]", with the primary's credentials. Each becomes
+# replica_<n>; tests read them through the test database (MIRROR).
+for index, replica in enumerate(filter(None, config('PG_REPLICAS', default='').split(',')), 1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['conf.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# After a write a client reads from the primary for this long; keep it above the worst replica lag.
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+# Flight cache entries filled from a replica expire after this, at most the sticky window minus the lag.
+REPLICA_CACHE_TIMEOUT = config('REPLICA_CACHE_TIMEOUT', default=10, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -107,6 +129,30 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+FLIGHT_CACHE_TIMEOUT = config('FLIGHT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Unfiltered admin changelists over larger tables show the planner's row estimate instead of COUNT(*).
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -114,7 +160,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',  
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -134,6 +180,24 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Users behind JWTs are cached per process for AUTH_USER_LOCAL_TTL seconds and in the shared cache
+# for AUTH_USER_CACHE_TIMEOUT; User.save() drops both.
+AUTH_USER_LOCAL_TTL = config('AUTH_USER_LOCAL_TTL', default=5, cast=int)
+AUTH_USER_LOCAL_SIZE = config('AUTH_USER_LOCAL_SIZE', default=10000, cast=int)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# PerformanceMiddleware reports SQL, serializer and render time in a Server-Timing header.
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
+
+# Blacklisted refresh tokens are checked against a per-process Bloom filter sized for
+# TOKEN_REVOCATION_CAPACITY JTIs; expired tokens are pruned every TOKEN_PRUNE_INTERVAL seconds.
+TOKEN_REVOCATION_CAPACITY = config('TOKEN_REVOCATION_CAPACITY', default=1000000, cast=int)
+TOKEN_REVOCATION_ERROR_RATE = config('TOKEN_REVOCATION_ERROR_RATE', default=0.001, cast=float)
+TOKEN_REVOCATION_SYNC_SECONDS = config('TOKEN_REVOCATION_SYNC_SECONDS', default=5, cast=int)
+TOKEN_REVOCATION_REBUILD_SECONDS = config('TOKEN_REVOCATION_REBUILD_SECONDS', default=3600, cast=int)
+TOKEN_PRUNE_BATCH_SIZE = config('TOKEN_PRUNE_BATCH_SIZE', default=5000, cast=int)
+TOKEN_PRUNE_INTERVAL = config('TOKEN_PRUNE_INTERVAL', default=3600, cast=int)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'AIRLINES API',
     'DESCRIPTION': 'API Documentation',
@@ -167,6 +231,7 @@ SIMPLE_JWT = {
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
     
     'JTI_CLAIM': 'jti',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
     
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -177,10 +242,33 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL=config('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND=config('CELERY_RESULT_BACKEND')
 
+ORDER_HOLD_TTL_SECONDS = config('ORDER_HOLD_TTL_SECONDS', default=60, cast=int)
+SEAT_HOLD_BUCKET_SECONDS = config('SEAT_HOLD_BUCKET_SECONDS', default=10, cast=int)
+ORDER_EXPIRY_BATCH_SIZE = config('ORDER_EXPIRY_BATCH_SIZE', default=1000, cast=int)
+ORDER_EXPIRY_SWEEP_INTERVAL = config('ORDER_EXPIRY_SWEEP_INTERVAL', default=15, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    'expire-booked-orders': {
+        'task': 'tasks.cancel_order.expire_booked_orders',
+        'schedule': ORDER_EXPIRY_SWEEP_INTERVAL,
+    },
+    'prune-expired-tokens': {
+        'task': 'users.revocation.prune_expired_tokens',
+        'schedule': TOKEN_PRUNE_INTERVAL,
+    },
+}
+
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET')
 GOOGLE_REDIRECT_URL = config('GOOGLE_REDIRECT_URL')
 GOOGLE_AUTH_URI = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
-GOOGLE_USERINFO_URI = "https://www.googleapis.com/oauth2/v2/userinfo"
+# Google's ID-token signing keys, as PEM by key id.
+GOOGLE_CERTS_URI = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_HTTP_TIMEOUT = config('GOOGLE_HTTP_TIMEOUT', default=5, cast=float)
+GOOGLE_HTTP_POOL_SIZE = config('GOOGLE_HTTP_POOL_SIZE', default=10, cast=int)
+GOOGLE_CERTS_MIN_REFRESH = config('GOOGLE_CERTS_MIN_REFRESH', default=60, cast=int)
+
 
+ROUTE_MIN_CONNECTION_MINUTES = config('ROUTE_MIN_CONNECTION_MINUTES', default=45, cast=int)
+ROUTE_MAX_CONNECTION_HOURS = config('ROUTE_MAX_CONNECTION_HOURS', default=24, cast=int)
@@ -7,6 +7,7 @@ from drf_spectacular.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
+from .instrumentation import RouteMetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -16,7 +17,8 @@ urlpatterns = [
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     
     path('api/accounts/', include('users.urls')),
-    path('api/flight/', include('tasks.urls'))
+    path('api/flight/', include('tasks.urls')),
+    path('api/metrics/routes/', RouteMetricsView.as_view(), name='route-metrics'),
 ]
 
 if settings.DEBUG:  
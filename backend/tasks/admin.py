@@ -1,45 +1,76 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Flight, Airport, Airplane, Order, Ticket, Country, Airline
+from .pagination import EstimatedCountPaginator
+
+
+class SelectRelatedAdmin(admin.ModelAdmin):
+    """
+    Joins ``list_select_related`` everywhere the admin loads rows, so ``__str__``
+    stays one query in autocomplete results and change forms too. The changelist
+    skips ``list_select_related`` once ``get_queryset`` has joined anything.
+    """
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+class LargeTableAdmin(SelectRelatedAdmin):
+    """Changelist settings for tables that grow into the millions of rows."""
+    paginator = EstimatedCountPaginator
+    # Filtered lists would otherwise count the whole table again for "N total".
+    show_full_result_count = False
 
 @admin.register(Country)
 class CountryAdmin(admin.ModelAdmin):
-    list_display = ("id", "name")
-    search_fields = ("name",)
+    list_display = ("id", "name", "code")
+    search_fields = ("name", "code")
     list_filter = ("name",)
 
 @admin.register(Airport)
 class AirportAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "city", "country")
-    search_fields = ("name", "city")
+    list_display = ("id", "name", "code", "city", "country")
+    search_fields = ("name", "city", "code")
     list_filter = ("country",)
+    list_select_related = ("country",)
+    autocomplete_fields = ("country",)
 
 @admin.register(Airplane)
-class AirplaneAdmin(admin.ModelAdmin):
+class AirplaneAdmin(SelectRelatedAdmin):
     list_display = ("id", "model", "capacity", "economy_seats", "business_seats", "first_class_seats", "airline")
-    search_fields = ("model", "airline__name")
+    search_fields = ("model", "registration", "airline__name")
     list_filter = ("capacity", "airline")
+    list_select_related = ("airline",)
+    autocomplete_fields = ("airline",)
     fieldsets = (
         ('Basic Information', {
-            'fields': ('model', 'airline', 'capacity')
+            'fields': ('model', 'registration', 'airline', 'capacity')
         }),
         ('Seat Configuration', {
             'fields': (
                 ('economy_seats', 'business_seats', 'first_class_seats'),
+                ('economy_seats_per_row', 'business_seats_per_row', 'first_class_seats_per_row'),
             )
         }),
     )
 
 @admin.register(Airline)
 class AirlineAdmin(admin.ModelAdmin):
-    list_display = ("id", "slug", "name", 'airport')
-    search_fields = ("name",)
+    list_display = ("id", "slug", "name", "code", 'airport')
+    search_fields = ("name", "code")
     list_filter = ("airport",)
+    list_select_related = ("airport",)
+    autocomplete_fields = ("airport",)
 
 @admin.register(Flight)
-class FlightAdmin(admin.ModelAdmin):
+class FlightAdmin(LargeTableAdmin):
     list_display = ("id", "flight_number", "departure_airport", "arrival_airport", "airplane", "departure_time", "arrival_time", "status")
     search_fields = ("flight_number", "departure_airport__name", "arrival_airport__name")
-    list_filter = ("airplane", "departure_time", "arrival_time", "status")
+    list_filter = ("status", "airplane__airline")
+    list_select_related = ("departure_airport", "arrival_airport", "airplane__airline")
+    autocomplete_fields = ("airplane", "departure_airport", "arrival_airport")
+    # Served by flight_departure_keyset_idx.
+    date_hierarchy = "departure_time"
+    ordering = ("-departure_time", "-id")
     fieldsets = (
         ('Basic Information', {
             'fields': ('flight_number', 'airplane', 'status')
@@ -53,14 +84,26 @@ class FlightAdmin(admin.ModelAdmin):
         ('Seat Availability', {
             'fields': ('economy_seats', 'business_seats', 'first_class_seats')
         }),
+        ('Pricing', {
+            'fields': ('base_fare',)
+        }),
     )
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ("id", "user", "flight", "return_flight", "ticket_type", "status", "total_price", "created_at")
     search_fields = ("user__email", "flight__flight_number", "return_flight__flight_number")
-    list_filter = ("ticket_type", "status", "created_at")
+    list_filter = ("ticket_type", "status")
+    list_select_related = (
+        "user",
+        "flight__departure_airport", "flight__arrival_airport",
+        "return_flight__departure_airport", "return_flight__arrival_airport",
+    )
+    autocomplete_fields = ("user", "flight", "return_flight")
     readonly_fields = ("created_at",)
+    # Served by order_created_keyset_idx.
+    date_hierarchy = "created_at"
+    ordering = ("-created_at", "-id")
     actions = ['confirm_orders', 'cancel_orders']
     fieldsets = (
         ('Basic Information', {
@@ -71,11 +114,32 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description="Confirm selected booked orders")
+    def confirm_orders(self, request, queryset):
+        confirmed, failed = Order.confirm_many(
+            queryset.filter(status=Order.OrderStatus.BOOKED).values_list('pk', flat=True).iterator()
+        )
+        self.message_user(request, f"Confirmed {confirmed} order(s).", messages.SUCCESS)
+        if failed:
+            self.message_user(request, f"{failed} order(s) could not be confirmed.", messages.WARNING)
+
+    @admin.action(description="Cancel selected orders")
+    def cancel_orders(self, request, queryset):
+        cancelled = Order.cancel_many(
+            queryset.exclude(status=Order.OrderStatus.CANCELLED).values_list('pk', flat=True).iterator()
+        )
+        self.message_user(request, f"Cancelled {cancelled} order(s).", messages.SUCCESS)
+
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(LargeTableAdmin):
     list_display = ("id", "order", "seat_number", "seat_class", "direction", "price")
     search_fields = ("seat_number", "order__user__email", "order__flight__flight_number")
     list_filter = ("seat_class", "direction")
+    list_select_related = ("order__user", "order__flight")
+    autocomplete_fields = ("order",)
+    # Served by ticket_created_keyset_idx.
+    date_hierarchy = "created_at"
+    ordering = ("-created_at", "-id")
     fieldsets = (
         ('Basic Information', {
             'fields': ('order', 'seat_number', 'seat_class', 'direction', 'price')
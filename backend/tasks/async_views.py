@@ -0,0 +1,127 @@
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import filters, status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from conf.db_router import ais_pinned, choose_replica, replica_alias
+from users.authentication import AsyncJWTAuthentication
+from . import holds
+from .models import Flight
+from .pagination import KeysetPagination
+from .serializers import FlightSearchSerializer, FlightSerializer, OrderSerializer
+
+FLIGHT_QUERYSET = Flight.objects.select_related(
+    "airplane__airline__airport__country", "departure_airport__country", "arrival_airport__country"
+)
+
+
+class AsyncAPIView(View):
+    """
+    Base for the endpoints served natively under ASGI. DRF views are
+    synchronous, so these are async Django views that reuse DRF's request
+    parsing, exceptions and serializers. Users are loaded with the async ORM
+    and errors come back in DRF's JSON shape.
+    """
+
+    authentication_required = False
+    # Serve GET from a replica, as ReplicaReadMixin does for the DRF views.
+    replica_reads = False
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Bearer tokens only, like the DRF API; there is no session to protect.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticator = AsyncJWTAuthentication()
+        request = Request(request, parsers=[JSONParser()])
+        try:
+            authenticated = await authenticator.aauthenticate(request)
+            request.user = authenticated[0] if authenticated else AnonymousUser()
+            if self.authentication_required and not request.user.is_authenticated:
+                raise NotAuthenticated()
+            self.request = request
+            if not (self.replica_reads and settings.DATABASE_REPLICAS):
+                return await super().dispatch(request, *args, **kwargs)
+            token = replica_alias.set(choose_replica(request, await ais_pinned(request)))
+            try:
+                return await super().dispatch(request, *args, **kwargs)
+            finally:
+                replica_alias.reset(token)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+            response = JsonResponse(detail, status=exc.status_code, safe=False)
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+            return response
+
+    def serializer_context(self):
+        # Holds are subtracted per response with one cache read, as in FlightViewSet.list.
+        return {"request": self.request, "raw_seat_availability": True}
+
+
+class FlightSearchView(AsyncAPIView):
+    replica_reads = True
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ["departure_time", "arrival_time", "flight_number"]
+    keyset_ordering = ("departure_time", "id")
+
+    async def get(self, request):
+        params = FlightSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        queryset = FLIGHT_QUERYSET
+        if "departure_airport" in data:
+            queryset = queryset.filter(departure_airport_id=data["departure_airport"])
+        if "arrival_airport" in data:
+            queryset = queryset.filter(arrival_airport_id=data["arrival_airport"])
+        if "status" in data:
+            queryset = queryset.filter(status=data["status"])
+        if "date" in data:
+            start = timezone.make_aware(datetime.combine(data["date"], time.min))
+            queryset = queryset.filter(departure_time__gte=start, departure_time__lt=start + timedelta(days=1))
+
+        paginator = KeysetPagination()
+        flights = await paginator.apaginate_queryset(queryset, request, self)
+        results = FlightSerializer(flights, many=True, context=self.serializer_context()).data
+        await sync_to_async(holds.subtract_from_payloads)(results)
+        return JsonResponse(paginator.get_keyset_data(results))
+
+
+class FlightDetailView(AsyncAPIView):
+    replica_reads = True
+
+    async def get(self, request, flight_number):
+        try:
+            flight = await FLIGHT_QUERYSET.aget(flight_number=flight_number)
+        except Flight.DoesNotExist:
+            raise NotFound()
+        data = FlightSerializer(flight, context=self.serializer_context()).data
+        await sync_to_async(holds.subtract_from_payloads)([data])
+        return JsonResponse(data)
+
+
+class OrderCreateView(AsyncAPIView):
+    authentication_required = True
+
+    async def post(self, request):
+        # Booking runs in a transaction, which the async ORM does not support yet.
+        data = await sync_to_async(self.create_order)(request)
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+    def create_order(self, request):
+        serializer = OrderSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return serializer.data
@@ -0,0 +1,215 @@
+import datetime
+import hashlib
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from conf.db_router import replica_alias
+
+PREFIX = "tasks:flight-cache"
+GENERATION_KEY = f"{PREFIX}:generation"
+STATS_KEYS = ("list_hits", "list_misses", "payload_hits", "payload_misses")
+
+# Filters that scope a cached flight list, most selective first. A list is only
+# invalidated by changes to flights that match (or used to match) its scope.
+SCOPE_FIELDS = (
+    ("departure_airport", "departure_airport_id"),
+    ("arrival_airport", "arrival_airport_id"),
+    ("airplane", "airplane_id"),
+    ("status", "status"),
+)
+LIST_FIELDS = (
+    "flight_number", "airplane_id", "departure_airport_id", "arrival_airport_id",
+    "departure_time", "arrival_time", "status",
+)
+
+
+def _timeout():
+    if replica_alias.get():
+        # Filled from a replica that may predate the last invalidation: expire before the writer's pin does.
+        return min(settings.FLIGHT_CACHE_TIMEOUT, settings.REPLICA_CACHE_TIMEOUT)
+    return settings.FLIGHT_CACHE_TIMEOUT
+
+
+def _tag_key(tag):
+    return f"{PREFIX}:tag:{tag}"
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        if not cache.add(key, time.time_ns(), timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+
+
+def _record(stat, amount=1):
+    if not amount:
+        return
+    key = f"{PREFIX}:stats:{stat}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    values = cache.get_many([f"{PREFIX}:stats:{stat}" for stat in STATS_KEYS])
+    stats = {stat: values.get(f"{PREFIX}:stats:{stat}", 0) for stat in STATS_KEYS}
+    for kind in ("list", "payload"):
+        total = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+        stats[f"{kind}_hit_ratio"] = round(stats[f"{kind}_hits"] / total, 4) if total else None
+    return stats
+
+
+def scope_tag(params):
+    for param, _ in SCOPE_FIELDS:
+        value = params.get(param)
+        if value not in (None, ""):
+            return f"{param}:{value}"
+    return "all"
+
+
+def flight_tags(values):
+    return {"all"} | {f"{param}:{values[attname]}" for param, attname in SCOPE_FIELDS}
+
+
+def list_key(request):
+    params = sorted(
+        (key, value) for key in request.query_params for value in request.query_params.getlist(key) if value != ""
+    )
+    generation, version = _versions([GENERATION_KEY, _tag_key(scope_tag(request.query_params))])
+    raw = f"{request.get_host()}|{request.path}|{params}"
+    return f"{PREFIX}:list:{generation}:{version}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def _flight_version_key(flight_id):
+    return f"{PREFIX}:flight-version:{flight_id}"
+
+
+def _payload_keys(flight_ids, variant):
+    keys = [GENERATION_KEY] + [_flight_version_key(flight_id) for flight_id in flight_ids]
+    generation, *versions = _versions(keys)
+    return {
+        flight_id: f"{PREFIX}:flight:{generation}:{variant}:{flight_id}:{version}"
+        for flight_id, version in zip(flight_ids, versions)
+    }
+
+
+def get_payloads(flight_ids, load, variant=""):
+    """
+    Return serialized flights for ``flight_ids`` in order, serializing the
+    missing ones with ``load(ids)`` (one query) and caching them.
+    ``variant`` identifies the representation (fields, compact, ...).
+    """
+    keys = _payload_keys(flight_ids, variant)
+    cached = cache.get_many(list(keys.values()))
+    payloads = {flight_id: cached[key] for flight_id, key in keys.items() if key in cached}
+    missing = [flight_id for flight_id in flight_ids if flight_id not in payloads]
+    if missing:
+        loaded = load(missing)
+        cache.set_many({keys[flight_id]: payload for flight_id, payload in loaded.items()}, timeout=_timeout())
+        payloads.update(loaded)
+    _record("payload_hits", len(flight_ids) - len(missing))
+    _record("payload_misses", len(missing))
+    return [payloads[flight_id] for flight_id in flight_ids if flight_id in payloads]
+
+
+def store_payloads(payloads, variant=""):
+    keys = _payload_keys(list(payloads), variant)
+    cache.set_many({keys[flight_id]: payload for flight_id, payload in payloads.items()}, timeout=_timeout())
+
+
+def get_list(key):
+    entry = cache.get(key)
+    _record("list_hits" if entry is not None else "list_misses")
+    return entry
+
+
+def set_list(key, entry):
+    cache.set(key, entry, timeout=_timeout())
+
+
+def _calendar_version_key(departure_airport_id, arrival_airport_id, month):
+    return f"{PREFIX}:calendar-version:{departure_airport_id}:{arrival_airport_id}:{month:%Y-%m}"
+
+
+def calendar_key(departure_airport_id, arrival_airport_id, month):
+    generation, version = _versions([
+        GENERATION_KEY, _calendar_version_key(departure_airport_id, arrival_airport_id, month)
+    ])
+    return f"{PREFIX}:calendar:{generation}:{version}:{departure_airport_id}:{arrival_airport_id}:{month:%Y-%m}"
+
+
+def get_calendar(key):
+    return cache.get(key)
+
+
+def set_calendar(key, days):
+    cache.set(key, days, timeout=_timeout())
+
+
+def _calendar_keys(states):
+    keys = set()
+    for state in states:
+        departure = state and state.get("departure_time")
+        if isinstance(departure, datetime.datetime) and timezone.is_aware(departure):
+            keys.add(_calendar_version_key(
+                state["departure_airport_id"], state["arrival_airport_id"], timezone.localtime(departure)
+            ))
+    return keys
+
+
+def _invalidate_calendars(flight_ids):
+    # Seat counter updates only know flight ids; look up their routes once, after commit.
+    Flight = apps.get_model("tasks", "Flight")
+    states = Flight.objects.filter(pk__in=flight_ids).values(
+        "departure_airport_id", "arrival_airport_id", "departure_time"
+    )
+    _bump(_calendar_keys(states))
+
+
+def invalidate_flight_payloads(flight_ids):
+    """
+    Drop cached payloads (every representation) of flights whose seat
+    counters changed, and the route calendars they appear in.
+    """
+    flight_ids = list(flight_ids)
+    keys = [_flight_version_key(flight_id) for flight_id in flight_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    transaction.on_commit(lambda: _invalidate_calendars(flight_ids))
+
+
+def invalidate_flight(flight_id, *states):
+    """
+    Drop the flight's payload and every list and route calendar whose scope
+    matches one of ``states`` (dicts of ``LIST_FIELDS``, e.g. before and
+    after a save).
+    """
+    tags = set()
+    for state in states:
+        if state:
+            tags |= flight_tags(state)
+    keys = [_tag_key(tag) for tag in tags] + list(_calendar_keys(states))
+    transaction.on_commit(lambda: cache.delete(_flight_version_key(flight_id)))
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all():
+    transaction.on_commit(lambda: _bump([GENERATION_KEY]))
@@ -0,0 +1,66 @@
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import fares
+from .models import Flight
+
+UNBOOKABLE = (Flight.FlightStatus.CANCELLED, Flight.FlightStatus.DEPARTED)
+
+
+def month_bounds(month):
+    start = timezone.make_aware(datetime.combine(month.replace(day=1), time.min))
+    days = calendar.monthrange(month.year, month.month)[1]
+    return start, start + timedelta(days=days)
+
+
+def route_calendar(departure_airport_id, arrival_airport_id, month, now=None):
+    """
+    Flights, remaining seats and the lowest fares per day of ``month`` on one
+    route. The month's bookable flights are read in one query and priced in
+    one ``fares.quote`` batch, so each day's fare is the lowest full quote of
+    a flight with seats left in that class.
+    """
+    now = now or timezone.now()
+    start, end = month_bounds(month)
+    flights = list(
+        Flight.objects.filter(
+            departure_airport_id=departure_airport_id, arrival_airport_id=arrival_airport_id,
+            departure_time__gte=max(start, now), departure_time__lt=end,
+        )
+        .exclude(status__in=UNBOOKABLE)
+        .select_related("airplane")
+        .only("departure_time", "base_fare", *Flight.SEAT_FIELDS.values(),
+              *(f"airplane__{field}" for field in Flight.SEAT_FIELDS.values()))
+    )
+    quotes = fares.quote(flights, now=now)
+    by_day = defaultdict(list)
+    for flight in flights:
+        by_day[timezone.localdate(flight.departure_time)].append(flight)
+
+    days = []
+    for offset in range((end - start).days):
+        day = start.date() + timedelta(days=offset)
+        day_flights = by_day.get(day, [])
+        day_fares = {
+            seat_class: min((
+                quotes[flight.pk][seat_class] for flight in day_flights if getattr(flight, field) > 0
+            ), default=None)
+            for seat_class, field in Flight.SEAT_FIELDS.items()
+        }
+        available = [fare for fare in day_fares.values() if fare is not None]
+        days.append({
+            "date": day,
+            "flights": len(day_flights),
+            "seats": {
+                seat_class: sum(getattr(flight, field) for flight in day_flights)
+                for seat_class, field in Flight.SEAT_FIELDS.items()
+            },
+            "lowest_fare": f"{min(available):.2f}" if available else None,
+            "fares": {
+                seat_class: f"{fare:.2f}" if fare is not None else None for seat_class, fare in day_fares.items()
+            },
+        })
+    return days
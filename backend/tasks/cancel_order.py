@@ -1,15 +1,83 @@
+import logging
+import time
+
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
 from django.utils import timezone
 from datetime import timedelta
+from . import holds
 from .models import Order
 
+logger = logging.getLogger(__name__)
+
+
+def hold_ttl():
+    return timedelta(seconds=settings.ORDER_HOLD_TTL_SECONDS)
+
+
+def expire_booked_orders_batch(cutoff, batch_size):
+    stale = Order.objects.filter(status=Order.OrderStatus.BOOKED, created_at__lt=cutoff)
+    with transaction.atomic():
+        # Orders being bought right now are locked; the next sweep picks them up if the purchase fails.
+        batch = list(
+            stale.select_for_update(skip_locked=True).order_by('created_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return 0
+        Order.objects.filter(pk__in=batch).update(status=Order.OrderStatus.CANCELLED, tickets_data=None)
+        # Hold buckets outlive the TTL by up to two buckets; free the seats now.
+        transaction.on_commit(lambda: holds.release(batch))
+    return len(batch)
+
+
+def sweep_expired_orders(batch_size=None, max_batches=None):
+    """
+    Cancel every BOOKED order older than ORDER_HOLD_TTL_SECONDS, the
+    oldest N per batch, release their seat holds and return sweep metrics:
+    rows expired, batches, rows per second and lag (how long past its
+    expiry the oldest swept order was).
+    """
+    batch_size = batch_size or settings.ORDER_EXPIRY_BATCH_SIZE
+    started = time.perf_counter()
+    now = timezone.now()
+    cutoff = now - hold_ttl()
+
+    oldest = Order.objects.filter(
+        status=Order.OrderStatus.BOOKED, created_at__lt=cutoff
+    ).aggregate(oldest=Min('created_at'))['oldest']
+
+    expired = batches = 0
+    while oldest is not None and (max_batches is None or batches < max_batches):
+        updated = expire_booked_orders_batch(cutoff, batch_size)
+        expired += updated
+        batches += 1
+        if updated < batch_size:
+            break
+
+    elapsed = time.perf_counter() - started
+    metrics = {
+        'expired': expired,
+        'batches': batches,
+        'seconds': round(elapsed, 4),
+        'rows_per_second': round(expired / elapsed, 1) if elapsed else 0.0,
+        'lag_seconds': round((now - oldest - hold_ttl()).total_seconds(), 3) if oldest else 0.0,
+    }
+    if expired:
+        logger.info("Expired booked orders: %s", metrics)
+    return metrics
+
+
+@shared_task
+def expire_booked_orders():
+    return sweep_expired_orders()
+
+
 @shared_task
 def cancel_unpaid_order(order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-        if order.status == Order.OrderStatus.BOOKED:
-            if order.created_at <= timezone.now() - timedelta(minutes=1):
-                order.status = Order.OrderStatus.CANCELLED
-                order.save()
-    except Order.DoesNotExist:
-        pass
+    # Kept so countdown messages queued before the sweeper existed still resolve.
+    if Order.objects.filter(
+        pk=order_id, status=Order.OrderStatus.BOOKED, created_at__lte=timezone.now() - hold_ttl()
+    ).update(status=Order.OrderStatus.CANCELLED, tickets_data=None):
+        holds.release([order_id])
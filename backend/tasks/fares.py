@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Airplane, Flight
+
+SEAT_CLASSES = tuple(Flight.SEAT_FIELDS)
+CLASS_MULTIPLIERS = np.array([{"economy": 1.0, "business": 2.5, "first_class": 4.0}[seat_class] for seat_class in SEAT_CLASSES])
+
+# A full cabin costs 1 + LOAD_WEIGHT times an empty one; the price rises with the square of the load factor.
+LOAD_WEIGHT = 1.5
+# Booking on the day of departure costs 1 + LAST_MINUTE_WEIGHT times the base fare; the premium decays
+# exponentially with LAST_MINUTE_DAYS as the time constant.
+LAST_MINUTE_WEIGHT = 0.6
+LAST_MINUTE_DAYS = 14.0
+
+
+def _capacities(flights):
+    """Seats per class as an (n, 3) array, reading airplanes from the cache or with one query."""
+    missing = {flight.airplane_id for flight in flights if not Flight.airplane.is_cached(flight)}
+    rows = dict(
+        (row[0], row[1:]) for row in Airplane.objects.filter(pk__in=missing).values_list(
+            "pk", *(Flight.SEAT_FIELDS[seat_class] for seat_class in SEAT_CLASSES)
+        )
+    ) if missing else {}
+    return np.array([
+        rows[flight.airplane_id] if flight.airplane_id in rows
+        else [getattr(flight.airplane, Flight.SEAT_FIELDS[seat_class]) for seat_class in SEAT_CLASSES]
+        for flight in flights
+    ], dtype=float).reshape(len(flights), len(SEAT_CLASSES))
+
+
+def fare_grid(base, capacity, remaining, days):
+    """
+    Fares for ``n`` flights as an (n, 3) array in ``SEAT_CLASSES`` order.
+    ``base`` and ``days`` have shape (n,); ``capacity`` and ``remaining`` (n, 3).
+    """
+    sold = np.clip(capacity - remaining, 0, None)
+    load = np.divide(sold, capacity, out=np.ones_like(capacity), where=capacity > 0)
+    demand = 1 + LOAD_WEIGHT * np.clip(load, 0, 1) ** 2
+    return np.round(base[:, None] * CLASS_MULTIPLIERS[None, :] * demand * urgency(days)[:, None], 2)
+
+
+def urgency(days):
+    """Last-minute multiplier for an array of days to departure."""
+    return 1 + LAST_MINUTE_WEIGHT * np.exp(-np.clip(days, 0, None) / LAST_MINUTE_DAYS)
+
+
+def quote(flights, now=None):
+    """Return ``{flight_id: {seat_class: Decimal}}`` for ``flights``, priced in one batch."""
+    flights = list(flights)
+    if not flights:
+        return {}
+    now = now or timezone.now()
+    grid = fare_grid(
+        base=np.array([float(flight.base_fare) for flight in flights]),
+        capacity=_capacities(flights),
+        remaining=np.array([
+            [getattr(flight, Flight.SEAT_FIELDS[seat_class]) for seat_class in SEAT_CLASSES] for flight in flights
+        ], dtype=float),
+        days=np.array([(flight.departure_time - now).total_seconds() / 86400 for flight in flights]),
+    )
+    return {
+        flight.pk: {seat_class: Decimal(f"{fare:.2f}") for seat_class, fare in zip(SEAT_CLASSES, row)}
+        for flight, row in zip(flights, grid.tolist())
+    }
@@ -0,0 +1,128 @@
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIX = "tasks:seat-hold"
+SEAT_CLASSES = ("economy", "business", "first_class")
+
+# Holds are counted per (flight, seat class, expiry bucket). A bucket key
+# expires by itself once its holds have, so live holds are the sum of the
+# few buckets between now and now + ORDER_HOLD_TTL_SECONDS and nothing ever
+# has to be cleaned up in the database.
+
+
+def _ttl():
+    return settings.ORDER_HOLD_TTL_SECONDS
+
+
+def _bucket_size():
+    return settings.SEAT_HOLD_BUCKET_SECONDS
+
+
+def _counter_key(flight_id, seat_class, bucket):
+    return f"{PREFIX}:{flight_id}:{seat_class}:{bucket}"
+
+
+def _order_key(order_id):
+    return f"{PREFIX}:order:{order_id}"
+
+
+def _live_buckets(now):
+    # place() rounds expiries up to the next bucket, hence the + 2.
+    size = _bucket_size()
+    return range(int(now // size), int((now + _ttl()) // size) + 2)
+
+
+def held_seats(flight_ids):
+    """Return live holds as a ``Counter`` of ``(flight_id, seat_class)``, one ``get_many``."""
+    buckets = _live_buckets(time.time())
+    keys = {
+        _counter_key(flight_id, seat_class, bucket): (flight_id, seat_class)
+        for flight_id in set(flight_ids) for seat_class in SEAT_CLASSES for bucket in buckets
+    }
+    held = Counter()
+    for key, value in cache.get_many(list(keys)).items():
+        held[keys[key]] += value
+    return +held
+
+
+def order_holds(order_ids):
+    """Return the seats still held for ``order_ids``, summed the same way as ``held_seats``."""
+    held = Counter()
+    for record in cache.get_many([_order_key(order_id) for order_id in order_ids]).values():
+        for flight_id, seat_class, count in record["seats"]:
+            held[(flight_id, seat_class)] += count
+    return held
+
+
+def _add(key, amount, timeout):
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # The key expired between add() and incr(); a hold in it would be stale anyway.
+        cache.set(key, max(amount, 0), timeout=timeout)
+        return amount
+
+
+def place(order_id, seats, available):
+    """
+    Hold ``seats`` (``(flight_id, seat_class) -> count``) for ``order_id``
+    until ``ORDER_HOLD_TTL_SECONDS`` pass. ``available`` gives the seats left
+    in the database. Returns the first ``(flight_id, seat_class)`` that can't
+    be held, undoing the whole hold, or ``None`` once everything is held.
+    """
+    seats = {key: count for key, count in seats.items() if count > 0}
+    now = time.time()
+    size = _bucket_size()
+    bucket = math.ceil((now + _ttl()) / size)
+    timeout = math.ceil((bucket + 1) * size - now) + 1
+
+    placed = []
+    for (flight_id, seat_class), count in seats.items():
+        _add(_counter_key(flight_id, seat_class, bucket), count, timeout)
+        placed.append((flight_id, seat_class, count))
+
+    held = held_seats({flight_id for flight_id, _ in seats})
+    for key, count in seats.items():
+        if held[key] > available.get(key, 0):
+            _undo(bucket, placed)
+            return key
+
+    cache.set(_order_key(order_id), {"bucket": bucket, "seats": placed}, timeout=timeout)
+    return None
+
+
+def _undo(bucket, placed):
+    for flight_id, seat_class, count in placed:
+        try:
+            cache.decr(_counter_key(flight_id, seat_class, bucket), count)
+        except ValueError:
+            pass
+
+
+def release(order_ids):
+    """Drop the holds of ``order_ids`` (bought, cancelled or expired orders)."""
+    keys = [_order_key(order_id) for order_id in order_ids]
+    records = cache.get_many(keys)
+    if not records:
+        return
+    cache.delete_many(list(records))
+    for record in records.values():
+        _undo(record["bucket"], record["seats"])
+
+
+def subtract_from_payloads(payloads):
+    """Subtract live holds from the ``seat_availability`` of serialized flights in place."""
+    payloads = [payload for payload in payloads if "seat_availability" in payload]
+    held = held_seats(payload["id"] for payload in payloads)
+    if not held:
+        return
+    for payload in payloads:
+        availability = payload["seat_availability"]
+        for seat_class in SEAT_CLASSES:
+            if seat_class in availability:
+                availability[seat_class] = max(availability[seat_class] - held[(payload["id"], seat_class)], 0)
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from tasks.models import Country, Airport, Airline, Airplane, Flight, Order
+from users.models import User
+
+
+class BenchFixture:
+    def __init__(self):
+        self.tag = uuid.uuid4().hex[:8]
+        self.country = Country.objects.create(name=f"Bench {self.tag}", slug=f"bench-{self.tag}")
+        self.origin = Airport.objects.create(
+            name=f"Bench Origin {self.tag}", slug=f"bench-origin-{self.tag}", city="Origin", country=self.country
+        )
+        self.destination = Airport.objects.create(
+            name=f"Bench Destination {self.tag}", slug=f"bench-destination-{self.tag}",
+            city="Destination", country=self.country
+        )
+        self.airline = Airline.objects.create(name=f"Bench {self.tag}", slug=f"bench-{self.tag}", airport=self.origin)
+        self.users = []
+        self._flights = 0
+
+    def flight(self, economy=0, business=0, first_class=0, days_ahead=30):
+        self._flights += 1
+        airplane = Airplane.objects.create(
+            model=f"Bench {self.tag} {self._flights}", slug=f"bench-{self.tag}-{self._flights}",
+            airline=self.airline, economy_seats=economy, business_seats=business, first_class_seats=first_class
+        )
+        departure = timezone.now() + timedelta(days=days_ahead)
+        return Flight.objects.create(
+            flight_number=f"B{self.tag[:5]}{self._flights}"[:10], airplane=airplane,
+            departure_airport=self.origin, arrival_airport=self.destination,
+            departure_time=departure, arrival_time=departure + timedelta(hours=2)
+        )
+
+    def user(self):
+        user = User.objects.create_user(
+            email=f"bench-{self.tag}-{len(self.users)}@example.com",
+            username=f"bench-{self.tag}-{len(self.users)}", password=None
+        )
+        self.users.append(user)
+        return user
+
+    def booked_orders(self, flight, count, tickets_per_order=1, seat_class=Flight.SeatClass.ECONOMY):
+        user = self.users[0] if self.users else self.user()
+        tickets = [{"seat_class": seat_class, "direction": "outbound", "price": 100}] * tickets_per_order
+        return Order.objects.bulk_create(
+            Order(user=user, flight=flight, status=Order.OrderStatus.BOOKED,
+                  total_price=100 * tickets_per_order, tickets_data=tickets)
+            for _ in range(count)
+        )
+
+    def cleanup(self):
+        User.objects.filter(pk__in=[user.pk for user in self.users]).delete()
+        self.country.delete()
+
+
+@contextmanager
+def bench_fixture():
+    fixture = BenchFixture()
+    try:
+        yield fixture
+    finally:
+        fixture.cleanup()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = self.lap()
+
+    def lap(self):
+        return time.perf_counter() - self.started
+
+
+async def send(host, port, method, path, headers, body=b""):
+    """One HTTP/1.1 request on a fresh connection; returns the status code and the body."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        if body:
+            head += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        chunked = False
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            chunked |= name.strip().lower() == "transfer-encoding" and "chunked" in value.lower()
+        payload = await reader.read()
+        if chunked:
+            payload = dechunk(payload)
+        return int(status_line.split()[1]), payload
+    finally:
+        writer.close()
+
+
+def dechunk(payload):
+    body, position = b"", 0
+    while True:
+        end = payload.index(b"\r\n", position)
+        size = int(payload[position:end].split(b";")[0], 16)
+        if not size:
+            return body
+        body += payload[end + 2:end + 2 + size]
+        position = end + 4 + size
+
+
+def server_process(command, host, port, workers, threads=1):
+    """Run gunicorn or uvicorn on this project's WSGI or ASGI application as a ServerProcess."""
+    command = [sys.executable, "-m", *command]
+    if command[2] == "gunicorn":
+        command += ["--bind", f"{host}:{port}", "--workers", str(workers)]
+        if threads > 1:
+            command += ["--worker-class", "gthread", "--threads", str(threads)]
+    else:
+        command += ["--host", host, "--port", str(port), "--workers", str(workers)]
+    return ServerProcess(command, host, port)
+
+
+class ServerProcess:
+    def __init__(self, command, host, port):
+        self.command, self.host, self.port = command, host, port
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.command, cwd=settings.BASE_DIR, env=os.environ.copy(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{' '.join(self.command)} exited with {self.process.returncode}")
+            try:
+                asyncio.run(send(self.host, self.port, "GET", "/api/flight/async/flights/?page_size=1", {}))
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"{' '.join(self.command)} did not start listening on {self.host}:{self.port}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ._bench import bench_fixture, percentile, send, server_process, Timer
+
+# server name -> (command line, path prefix of the endpoints it serves)
+SERVERS = {
+    "wsgi": (["gunicorn", "conf.wsgi:application"], "/api/flight/"),
+    "asgi": (["uvicorn", "conf.asgi:application", "--no-access-log"], "/api/flight/async/"),
+    # The synchronous DRF views under uvicorn, to separate the server from the views.
+    "asgi-drf": (["uvicorn", "conf.asgi:application", "--no-access-log"], "/api/flight/"),
+}
+ENDPOINTS = ("search", "detail", "order")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark flight search, flight detail and order creation: the async views under uvicorn "
+        "against the DRF views under gunicorn, reporting requests per second and tail latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and concurrency level")
+        parser.add_argument("--concurrency", default="10,50,100", help="Comma separated concurrent client counts")
+        parser.add_argument("--workers", type=int, default=2, help="Server processes for every server")
+        parser.add_argument(
+            "--wsgi-threads", type=int, default=1, help="Threads per gunicorn worker; above 1 uses the gthread worker"
+        )
+        parser.add_argument("--servers", default="wsgi,asgi", help=f"Comma separated, from {', '.join(SERVERS)}")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options["servers"].split(",") if name.strip()]
+        endpoints = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        levels = [int(value) for value in options["concurrency"].split(",")]
+        unknown = set(servers) - set(SERVERS) | set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown servers or endpoints: {', '.join(sorted(unknown))}")
+        self.host, self.port = options["host"], options["port"]
+
+        rows = []
+        with bench_fixture() as fixture:
+            self.headers = {"Authorization": f"Bearer {AccessToken.for_user(fixture.user())}"}
+            self.fixture = fixture
+            self.flight = fixture.flight(economy=100, business=20, first_class=8)
+            for server in servers:
+                # Every server books from its own flight so that no run sells out.
+                self.booking_flight = fixture.flight(economy=(options["requests"] + max(levels)) * len(levels))
+                with self.server(server, options):
+                    for endpoint in endpoints:
+                        for concurrency in levels:
+                            result = asyncio.run(self.run(server, endpoint, options["requests"], concurrency))
+                            rows.append(result)
+                            self.report(result)
+
+        self.stdout.write(self.style.SUCCESS(
+            "\nserver    endpoint  clients    req/s    p50 ms    p95 ms    p99 ms  errors"
+        ))
+        for row in rows:
+            self.stdout.write(
+                f"{row['server']:<9} {row['endpoint']:<8} {row['concurrency']:>8} {row['rps']:>8.0f} "
+                f"{row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f} {row['errors']:>7}"
+            )
+
+    def server(self, name, options):
+        command, self.prefix = SERVERS[name]
+        return server_process(command, self.host, self.port, options["workers"], options["wsgi_threads"])
+
+    def request(self, endpoint, sequence):
+        if endpoint == "search":
+            # A distinct query string per request keeps FlightViewSet.list on its database path.
+            path = (
+                f"{self.prefix}flights/?departure_airport={self.fixture.origin.pk}"
+                f"&arrival_airport={self.fixture.destination.pk}&pagination=cursor&seq={sequence}"
+            )
+            return "GET", path, b""
+        if endpoint == "detail":
+            return "GET", f"{self.prefix}flights/{self.flight.flight_number}/", b""
+        body = {"flight_id": self.booking_flight.pk, "tickets": [{"seat_class": "economy", "direction": "outbound"}]}
+        return "POST", f"{self.prefix}orders/", json.dumps(body).encode()
+
+    async def run(self, server, endpoint, total, concurrency):
+        latencies, statuses = [], []
+        sequence = iter(range(total + concurrency))
+
+        async def client(count):
+            for _ in range(count):
+                method, path, body = self.request(endpoint, next(sequence))
+                started = time.perf_counter()
+                try:
+                    status, _ = await send(self.host, self.port, method, path, self.headers, body)
+                except OSError:
+                    status = 0
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(status)
+
+        await asyncio.gather(*(client(1) for _ in range(concurrency)))  # warm up every worker
+        latencies.clear()
+        statuses.clear()
+        with Timer() as timer:
+            await asyncio.gather(*(
+                client(total // concurrency + (index < total % concurrency)) for index in range(concurrency)
+            ))
+        return {
+            "server": server, "endpoint": endpoint, "concurrency": concurrency,
+            "rps": len(latencies) / timer.elapsed,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+            "errors": sum(not 200 <= status < 300 for status in statuses),
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f"{result['server']} {result['endpoint']} x{result['concurrency']}: {result['rps']:.0f} req/s, "
+            f"p99 {result['p99']:.1f} ms, {result['errors']} errors"
+        )
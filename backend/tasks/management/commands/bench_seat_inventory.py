@@ -0,0 +1,76 @@
+import queue
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks.models import Flight, Order
+from ._bench import bench_fixture, Timer
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent Order.buy() against one flight and check that no seats are oversold"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seats", type=int, default=500, help="Economy seats on the benchmark flight")
+        parser.add_argument("--threads", default="1,2,4,8,16", help="Comma separated buyer counts")
+        parser.add_argument("--tickets-per-order", type=int, default=1)
+        parser.add_argument(
+            "--oversubscribe", type=float, default=1.25,
+            help="Ratio of requested seats to available seats, so every run sells out"
+        )
+
+    def handle(self, *args, **options):
+        seats = options["seats"]
+        per_order = options["tickets_per_order"]
+        orders_count = int(seats * options["oversubscribe"]) // per_order
+
+        with bench_fixture() as fixture:
+            fixture.user()
+            for threads in [int(value) for value in options["threads"].split(",")]:
+                flight = fixture.flight(economy=seats)
+                orders = queue.SimpleQueue()
+                for order in fixture.booked_orders(flight, orders_count, per_order):
+                    orders.put(order.pk)
+
+                results = {"sold": 0, "rejected": 0, "errors": 0}
+                lock = threading.Lock()
+
+                def buyer():
+                    try:
+                        while True:
+                            try:
+                                order_id = orders.get_nowait()
+                            except queue.Empty:
+                                return
+                            order = Order.objects.select_related("flight").get(pk=order_id)
+                            try:
+                                order.buy()
+                                outcome = "sold"
+                            except ValueError:
+                                outcome = "rejected"
+                            except Exception:
+                                outcome = "errors"
+                            with lock:
+                                results[outcome] += 1
+                    finally:
+                        connection.close()
+
+                workers = [threading.Thread(target=buyer) for _ in range(threads)]
+                with Timer() as timer:
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+
+                remaining = Flight.objects.values_list("economy_seats", flat=True).get(pk=flight.pk)
+                sold_seats = results["sold"] * per_order
+                oversold = sold_seats > seats or remaining != seats - sold_seats
+                self.stdout.write(
+                    f"threads={threads:<3} buys/s={results['sold'] / timer.elapsed:8.1f} "
+                    f"attempts/s={orders_count / timer.elapsed:8.1f} sold={results['sold']} "
+                    f"rejected={results['rejected']} errors={results['errors']} remaining={remaining} "
+                    f"oversold={'YES' if oversold else 'no'}"
+                )
+                if oversold:
+                    self.stderr.write(self.style.ERROR(f"Inventory mismatch on {flight.flight_number}"))
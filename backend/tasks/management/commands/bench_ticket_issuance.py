@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from tasks.models import Flight, Order, Ticket
+from ._bench import bench_fixture, Timer
+
+
+def legacy_buy(order):
+    # The pre-bulk Order.buy(): one counter UPDATE and one INSERT per ticket.
+    with transaction.atomic():
+        for ticket_data in order.tickets_data:
+            field = Flight.seat_field(ticket_data['seat_class'])
+            if not Flight.objects.filter(pk=order.flight_id, **{f'{field}__gt': 0}).update(**{field: F(field) - 1}):
+                raise ValueError(f"No {ticket_data['seat_class']} seats available.")
+            Ticket.objects.create(
+                order=order,
+                seat_number=ticket_data.get('seat_number', ''),
+                seat_class=ticket_data['seat_class'],
+                direction=Ticket.TicketDirection.OUTBOUND,
+                price=ticket_data['price']
+            )
+        order.tickets_data = None
+        order.status = Order.OrderStatus.CONFIRMED
+        order.save()
+
+
+class Command(BaseCommand):
+    help = "Compare per-ticket and bulk ticket issuance in Order.buy() by latency and SQL statements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", default="1,10,100", help="Comma separated tickets per order")
+        parser.add_argument("--repeat", type=int, default=20, help="Orders bought per path and size")
+
+    def handle(self, *args, **options):
+        sizes = [int(value) for value in options["tickets"].split(",")]
+        repeat = options["repeat"]
+
+        self.stdout.write(f"{'tickets':>8} {'path':>8} {'ms/order':>10} {'statements':>11}")
+        with bench_fixture() as fixture:
+            fixture.user()
+            for size in sizes:
+                for name, buy in (("legacy", legacy_buy), ("bulk", Order.buy)):
+                    flight = fixture.flight(economy=size * repeat)
+                    orders = list(
+                        Order.objects.select_related("flight")
+                        .filter(pk__in=[order.pk for order in fixture.booked_orders(flight, repeat, size)])
+                    )
+                    with CaptureQueriesContext(connection) as queries, Timer() as timer:
+                        for order in orders:
+                            buy(order)
+                    self.stdout.write(
+                        f"{size:>8} {name:>8} {timer.elapsed * 1000 / repeat:>10.2f} "
+                        f"{len(queries) / repeat:>11.1f}"
+                    )
@@ -0,0 +1,141 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as StockTokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as StockRefreshToken
+
+from users.authentication import user_cache
+from users.revocation import prune_tokens, revocations
+from users.serializers import TokenRefreshSerializer
+from ._bench import bench_fixture, percentile, Timer
+
+SEED_BATCH = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed outstanding and blacklisted refresh tokens, then compare simplejwt's refresh with the cached, "
+        "Bloom-filtered one by latency and SQL statements, and time the filter build and the prune job"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=10_000_000, help="Outstanding tokens to seed")
+        parser.add_argument("--expired", type=int, default=50, help="Percent of seeded tokens already expired")
+        parser.add_argument("--blacklisted", type=int, default=30, help="Percent of seeded tokens blacklisted")
+        parser.add_argument("--refreshes", type=int, default=500, help="Refreshes timed per path")
+        parser.add_argument("--checks", type=int, default=5000, help="Revocation checks timed per path")
+        parser.add_argument("--keep", action="store_true", help="Leave the seeded tokens in place")
+
+    def handle(self, *args, **options):
+        prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+        with Timer() as timer:
+            self.seed(prefix, options["tokens"], options["expired"], options["blacklisted"])
+        self.stdout.write(f"seeded {options['tokens']} tokens in {timer.elapsed:.1f} s")
+
+        try:
+            with bench_fixture() as fixture:
+                user = fixture.user()
+                self.bench_filter()
+                self.bench_checks(prefix, options["tokens"], options["checks"])
+                self.stdout.write(f"\n{'path':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'statements':>11}")
+                self.bench_refresh("stock", StockRefreshToken, StockTokenRefreshSerializer, user, options["refreshes"])
+                user_cache.clear()
+                self.bench_refresh("cached", StockRefreshToken, TokenRefreshSerializer, user, options["refreshes"])
+                OutstandingToken.objects.filter(user=user).delete()
+
+            with Timer() as timer:
+                metrics = prune_tokens()
+            self.stdout.write(f"\nprune: {metrics['deleted']} tokens in {timer.elapsed:.1f} s, {metrics}")
+        finally:
+            if not options["keep"]:
+                self.cleanup(prefix)
+
+    def seed(self, prefix, count, expired, blacklisted):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO token_blacklist_outstandingtoken (jti, token, created_at, expires_at, user_id) "
+                    "SELECT %s || g, '', now(), CASE WHEN g %% 100 < %s THEN now() - interval '1 day' "
+                    "ELSE now() + interval '7 days' END, NULL FROM generate_series(1, %s) g",
+                    [prefix, expired, count],
+                )
+                cursor.execute(
+                    "INSERT INTO token_blacklist_blacklistedtoken (token_id, blacklisted_at) "
+                    "SELECT id, now() FROM token_blacklist_outstandingtoken WHERE jti LIKE %s AND id %% 100 < %s",
+                    [prefix + "%", blacklisted],
+                )
+                cursor.execute("ANALYZE token_blacklist_outstandingtoken")
+                cursor.execute("ANALYZE token_blacklist_blacklistedtoken")
+            return
+
+        now = timezone.now()
+        for start in range(1, count + 1, SEED_BATCH):
+            with transaction.atomic():
+                tokens = OutstandingToken.objects.bulk_create(
+                    OutstandingToken(
+                        jti=f"{prefix}{g}", token="", created_at=now,
+                        expires_at=now - timedelta(days=1) if g % 100 < expired else now + timedelta(days=7),
+                    )
+                    for g in range(start, min(start + SEED_BATCH, count + 1))
+                )
+                ids = OutstandingToken.objects.filter(jti__in=[token.jti for token in tokens]).values_list("pk", flat=True)
+                BlacklistedToken.objects.bulk_create(
+                    BlacklistedToken(token_id=token_id) for token_id in ids if token_id % 100 < blacklisted
+                )
+
+    def bench_filter(self):
+        revocations.reset()
+        with Timer() as timer:
+            bloom = revocations.rebuild()
+        self.stdout.write(
+            f"filter: {BlacklistedToken.objects.count()} revoked JTIs in {bloom.bits.nbytes / 2 ** 20:.1f} MiB "
+            f"({bloom.hashes} hashes), built in {timer.elapsed:.1f} s"
+        )
+
+    def bench_checks(self, prefix, count, checks):
+        jtis = [f"{prefix}{random.randint(1, count)}" for _ in range(checks)]
+        self.stdout.write(f"\n{'check':>8} {'p50 us':>9} {'p99 us':>9} {'statements':>11}")
+        for name, check in (
+            ("query", lambda jti: BlacklistedToken.objects.filter(token__jti=jti).exists()),
+            ("filter", revocations.is_revoked),
+        ):
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for jti in jtis:
+                    with Timer() as timer:
+                        check(jti)
+                    timings.append(timer.elapsed * 1e6)
+            self.stdout.write(
+                f"{name:>8} {percentile(timings, 50):>9.1f} {percentile(timings, 99):>9.1f} "
+                f"{len(queries) / checks:>11.2f}"
+            )
+
+    def bench_refresh(self, name, token_class, serializer_class, user, refreshes):
+        token = str(token_class.for_user(user))
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(refreshes):
+                with Timer() as timer:
+                    serializer = serializer_class(data={"refresh": token})
+                    serializer.is_valid(raise_exception=True)
+                    token = serializer.validated_data["refresh"]
+                timings.append(timer.elapsed * 1000)
+        self.stdout.write(
+            f"{name:>8} {percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f} "
+            f"{percentile(timings, 99):>9.2f} {len(queries) / refreshes:>11.1f}"
+        )
+
+    def cleanup(self, prefix):
+        while True:
+            ids = list(OutstandingToken.objects.filter(jti__startswith=prefix).values_list("pk", flat=True)[:SEED_BATCH])
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(pk__in=ids).only("pk").delete()
@@ -0,0 +1,206 @@
+import random
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tasks.models import Airport, Airplane, Flight, Order, Ticket
+from tasks.views import FlightViewSet, OrderViewSet, TicketViewSet
+from users.models import User
+from ._bench import BenchFixture
+
+# (name, viewset, who is asking, query params). Page-number cases only
+# EXPLAIN the page query; the COUNT(*) is a full count by design.
+CASES = (
+    ("flights by route", FlightViewSet, None, {"departure_airport": "origin", "arrival_airport": "destination", "ordering": "departure_time"}),
+    ("flights by route, keyset", FlightViewSet, None, {"departure_airport": "origin", "arrival_airport": "destination", "pagination": "cursor"}),
+    ("flights from airport", FlightViewSet, None, {"departure_airport": "origin", "ordering": "departure_time"}),
+    ("flights to airport", FlightViewSet, None, {"arrival_airport": "destination", "ordering": "departure_time"}),
+    ("scheduled flights, keyset", FlightViewSet, None, {"status": "scheduled", "pagination": "cursor"}),
+    ("flights, keyset", FlightViewSet, None, {"pagination": "cursor"}),
+    ("user orders", OrderViewSet, "user", {"ordering": "-created_at"}),
+    ("user orders, keyset", OrderViewSet, "user", {"pagination": "cursor"}),
+    ("orders by status, keyset", OrderViewSet, "staff", {"status": "booked", "pagination": "cursor"}),
+    ("orders, keyset", OrderViewSet, "staff", {"pagination": "cursor"}),
+    ("user tickets, keyset", TicketViewSet, "user", {"pagination": "cursor"}),
+    ("tickets, keyset", TicketViewSet, "staff", {"pagination": "cursor"}),
+)
+
+# A user's tickets are found through their orders and sorted; that sort is bounded by one user's history.
+SORTED_CASES = {"user tickets, keyset"}
+# Small reference tables (airports, airlines, ...) may be scanned into a hash join.
+LARGE_MODELS = (Flight, Order, Ticket, User)
+
+EXPLAIN_PREFIX = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN ", "mysql": "EXPLAIN "}
+
+
+class Command(BaseCommand):
+    help = "Seed a dataset and check that flight, order and ticket list queries use index scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flights", type=int, default=20000)
+        parser.add_argument("--airports", type=int, default=40)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--tickets-per-order", type=int, default=2)
+        parser.add_argument("--no-seed", action="store_true", help="Check against the existing data")
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded rows instead of rolling back")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIX:
+            raise CommandError(f"EXPLAIN is not supported for {connection.vendor}.")
+
+        with transaction.atomic():
+            if not options["no_seed"]:
+                self.seed(options)
+            failures = self.check_cases(options["verbosity"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{failures} quer{'y' if failures == 1 else 'ies'} scanned a table or sorted a keyset page.")
+        self.stdout.write(self.style.SUCCESS("All list queries use indexes."))
+
+    def seed(self, options):
+        rng = random.Random(0)
+        fixture = BenchFixture()
+        airports = [fixture.origin, fixture.destination] + Airport.objects.bulk_create(
+            Airport(name=f"Plan {fixture.tag} {i}", slug=f"plan-{fixture.tag}-{i}", city=f"City {i}", country=fixture.country)
+            for i in range(max(options["airports"] - 2, 0))
+        )
+        airplane = Airplane.objects.create(
+            model=f"Plan {fixture.tag}", slug=f"plan-{fixture.tag}", airline=fixture.airline,
+            economy_seats=180, business_seats=24, first_class_seats=8,
+        )
+        statuses = [Flight.FlightStatus.SCHEDULED] * 8 + [Flight.FlightStatus.DEPARTED, Flight.FlightStatus.CANCELLED]
+        now = timezone.now()
+        flights = []
+        for i in range(options["flights"]):
+            origin, destination = rng.sample(airports, 2)
+            departure = now + timedelta(minutes=rng.randint(-180 * 24 * 60, 180 * 24 * 60))
+            flights.append(Flight(
+                flight_number=f"P{fixture.tag[:3]}{i}", airplane=airplane,
+                departure_airport=origin, arrival_airport=destination,
+                departure_time=departure, arrival_time=departure + timedelta(hours=rng.randint(1, 12)),
+                status=rng.choice(statuses), economy_seats=180, business_seats=24, first_class_seats=8,
+            ))
+        flights = Flight.objects.bulk_create(flights, batch_size=2000)
+
+        users = User.objects.bulk_create(
+            User(email=f"plan-{fixture.tag}-{i}@example.com", username=f"plan-{fixture.tag}-{i}")
+            for i in range(options["users"])
+        )
+        order_statuses = list(Order.OrderStatus.values)
+        orders = Order.objects.bulk_create(
+            (
+                Order(user=rng.choice(users), flight=rng.choice(flights), status=rng.choice(order_statuses), total_price=100)
+                for _ in range(options["orders"])
+            ),
+            batch_size=2000,
+        )
+        Ticket.objects.bulk_create(
+            (
+                Ticket(order=order, seat_class=Flight.SeatClass.ECONOMY, direction=Ticket.TicketDirection.OUTBOUND, price=100)
+                for order in orders for _ in range(options["tickets_per_order"])
+            ),
+            batch_size=2000,
+        )
+
+        with connection.cursor() as cursor:
+            for model in (Flight, Order, Ticket):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(f"Seeded {len(flights)} flights, {len(orders)} orders, {len(orders) * options['tickets_per_order']} tickets.")
+
+    def resolve_params(self, params):
+        flight = Flight.objects.order_by("id").first()
+        if flight is None:
+            raise CommandError("No flights to check against; run without --no-seed.")
+        ids = {"origin": flight.departure_airport_id, "destination": flight.arrival_airport_id}
+        return {key: ids.get(value, value) for key, value in params.items()}
+
+    @staticmethod
+    def server_name():
+        # Pagination builds absolute links, which validate the host against ALLOWED_HOSTS.
+        for host in settings.ALLOWED_HOSTS:
+            host = host.strip().lstrip(".")
+            if host and host != "*":
+                return host
+        return "localhost"
+
+    def check_cases(self, verbosity):
+        factory = APIRequestFactory(SERVER_NAME=self.server_name())
+        order = Order.objects.order_by("id").first()
+        users = {"user": order.user if order else User(), "staff": User(is_staff=True, is_superuser=True)}
+        failures = 0
+
+        for name, viewset, who, params in CASES:
+            request = factory.get("/", self.resolve_params(params))
+            if who:
+                force_authenticate(request, user=users[who])
+            view = viewset(action_map={"get": "list"}, format_kwarg=None, kwargs={}, args=())
+            view.request = view.initialize_request(request)
+            view.request.user  # authenticate before capturing queries
+            queryset = view.filter_queryset(view.get_queryset())
+
+            with CaptureQueriesContext(connection) as queries:
+                list(view.paginate_queryset(queryset) or [])
+
+            for sql in (query["sql"] for query in queries.captured_queries):
+                if not sql.startswith("SELECT") or "COUNT(*)" in sql:
+                    continue
+                table = re.search(r'FROM [`"]?(\w+)', sql).group(1)
+                plan = self.explain(sql)
+                problems = self.problems(plan, keyset="pagination" in params and name not in SORTED_CASES)
+                failures += bool(problems)
+                status = self.style.ERROR(", ".join(problems)) if problems else self.style.SUCCESS("index")
+                self.stdout.write(f"{name:<28} {table:<8} {status}  {', '.join(self.indexes(plan)) or '-'}")
+                if verbosity > 1 or problems:
+                    self.stdout.write("\n".join(f"    {line}" for line in plan))
+        return failures
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_PREFIX[connection.vendor] + sql)
+            rows = cursor.fetchall()
+        return [str(row[-1] if connection.vendor == "sqlite" else " ".join(map(str, row))) for row in rows]
+
+    @staticmethod
+    def problems(plan, keyset):
+        """
+        Full scans of the large tables anywhere in ``plan`` and, for keyset
+        pages, sorts: a keyset page is only cheap when an index already
+        returns rows in order.
+        """
+        large = {model._meta.db_table for model in LARGE_MODELS}
+        if connection.vendor == "postgresql":
+            scan, sort = r"Seq Scan on \"?(\w+)", r"^\s*(?:->\s*)?(?:Incremental )?Sort\b"
+            walk = None
+        elif connection.vendor == "sqlite":
+            scan, sort = r"^SCAN \"?(\w+)\"?(?:\s+AS \w+)?$", r"USE TEMP B-TREE FOR"
+            # A full walk of an index only stops early when it returns rows in the order wanted.
+            walk = r"^SCAN \"?(\w+)\"? USING (?:COVERING )?INDEX"
+        else:
+            scan, sort, walk = r"^\S+ \S+ (\w+) .*\bALL\b", r"Using filesort", None
+        sorted_plan = any(re.search(sort, line) for line in plan)
+        found = []
+        for line in plan:
+            match = re.search(scan, line) or (sorted_plan and walk and re.search(walk, line))
+            if match and match.group(1) in large and f"scan {match.group(1)}" not in found:
+                found.append(f"scan {match.group(1)}")
+        if keyset and sorted_plan:
+            found.append("sort")
+        return found
+
+    @staticmethod
+    def indexes(plan):
+        found = []
+        for line in plan:
+            match = re.search(r"(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)", line)
+            if match and match.group(1) not in found:
+                found.append(match.group(1))
+        return found
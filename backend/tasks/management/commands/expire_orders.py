@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.cancel_order import sweep_expired_orders
+
+
+class Command(BaseCommand):
+    help = "Cancel BOOKED orders older than ORDER_HOLD_TTL_SECONDS and print sweep metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        metrics = sweep_expired_orders(options["batch_size"], options["max_batches"])
+        self.stdout.write(" ".join(f"{key}={value}" for key, value in metrics.items()))
@@ -0,0 +1,202 @@
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tasks import caching
+from tasks.models import Airport, Airplane, Flight, chunked
+from tasks.routing import MAX_REPLAY, route_index
+from ._bench import Timer
+
+REQUIRED = ("flight_number", "airplane", "departure_airport", "arrival_airport", "departure_time", "arrival_time")
+OPTIONAL = ("status", "base_fare")
+# Seat counters and the seat map belong to bookings; an upsert never overwrites them. A flight that
+# moves to another airplane starts over on its layout, so rows moving booked flights are skipped.
+UPDATE_FIELDS = ("airplane", "departure_airport", "arrival_airport", "departure_time", "arrival_time")
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise CommandError(f"Line {number}: invalid JSON ({e}).")
+
+
+class Command(BaseCommand):
+    help = "Stream flights from CSV or NDJSON and upsert them on flight_number in chunked transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--skip-invalid", action="store_true", help="Skip bad rows instead of aborting")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        self.airports = dict(Airport.objects.values_list("slug", "pk"))
+        self.airplanes = {
+            slug: (pk, seats) for slug, pk, *seats in
+            Airplane.objects.values_list("slug", "pk", "economy_seats", "business_seats", "first_class_seats")
+        }
+        self.statuses = set(Flight.FlightStatus.values)
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        imported = skipped = repeated = chunks = 0
+        booked = []
+        # Only a handful of ids are kept for the route index; larger imports make every process rebuild it.
+        changed_ids = []
+        try:
+            with Timer() as timer:
+                rows = enumerate(read_rows(stream, fmt), 1)
+                for chunk in chunked(rows, options["chunk_size"]):
+                    # One upsert can't touch a row twice, so the last row of a flight_number wins.
+                    latest = {}
+                    for number, row in chunk:
+                        try:
+                            flight = self.build(row)
+                        except RowError as e:
+                            if not options["skip_invalid"]:
+                                raise CommandError(f"Row {number}: {e}")
+                            skipped += 1
+                            continue
+                        if latest.pop(flight.flight_number, None) is not None:
+                            repeated += 1
+                        provided = tuple(name for name in OPTIONAL if row.get(name) not in (None, ""))
+                        latest[flight.flight_number] = (flight, provided)
+                    if not latest:
+                        continue
+
+                    with transaction.atomic():
+                        moved, kept = self.moved_flights([flight for flight, _ in latest.values()])
+                        if kept:
+                            booked += sorted(kept)
+                            skipped += len(kept)
+                        # Rows that leave out an optional column keep the stored value, so each set of
+                        # provided columns is its own upsert.
+                        groups = {}
+                        for flight, provided in latest.values():
+                            if flight.flight_number not in kept:
+                                groups.setdefault(provided, []).append(flight)
+                        flights, created = [], []
+                        for provided, group in groups.items():
+                            created += Flight.objects.bulk_create(
+                                group, update_conflicts=True, unique_fields=["flight_number"],
+                                update_fields=UPDATE_FIELDS + provided,
+                            )
+                            flights += group
+                        if moved:
+                            Flight.reset_seats(Flight.objects.filter(flight_number__in=moved))
+                    imported += len(flights)
+                    chunks += 1
+                    reset_queries()  # DEBUG keeps every statement otherwise
+                    if changed_ids is not None:
+                        changed_ids += [flight.pk for flight in created]
+                        if len(changed_ids) > MAX_REPLAY or None in changed_ids:
+                            changed_ids = None
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"{imported} rows ({imported / timer.lap():.0f} rows/s)")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if imported:
+            route_index.publish_many(changed_ids)
+            caching.invalidate_all()
+        if booked:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped {len(booked)} rows that move flights with bookings to another airplane: "
+                f"{', '.join(booked[:20])}{' ...' if len(booked) > 20 else ''}"
+            ))
+        if repeated:
+            self.stdout.write(self.style.WARNING(
+                f"{repeated} rows repeated a flight_number within a chunk; the last row of each was imported."
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} flights in {chunks} chunks, skipped {skipped}, "
+            f"{timer.elapsed:.2f}s, {imported / timer.elapsed if timer.elapsed else 0:.0f} rows/s"
+        ))
+
+    @staticmethod
+    def moved_flights(flights):
+        """
+        Split the existing flights that ``flights`` move to another airplane
+        into those that can follow (no bookings) and those that must be kept.
+        """
+        stored = dict(
+            Flight.objects.filter(flight_number__in=[flight.flight_number for flight in flights])
+            .values_list("flight_number", "airplane_id")
+        )
+        moved = {
+            flight.flight_number for flight in flights
+            if stored.get(flight.flight_number, flight.airplane_id) != flight.airplane_id
+        }
+        if not moved:
+            return moved, set()
+        kept = set(Flight.with_bookings().filter(flight_number__in=moved).values_list("flight_number", flat=True))
+        return moved - kept, kept
+
+    def build(self, row):
+        missing = [name for name in REQUIRED if not row.get(name)]
+        if missing:
+            raise RowError(f"missing {', '.join(missing)}")
+
+        airplane = self.airplanes.get(row["airplane"])
+        if airplane is None:
+            raise RowError(f"unknown airplane {row['airplane']!r}")
+        departure_airport, arrival_airport = (self.airports.get(row[name]) for name in ("departure_airport", "arrival_airport"))
+        if departure_airport is None or arrival_airport is None:
+            raise RowError(f"unknown airport {row['departure_airport' if departure_airport is None else 'arrival_airport']!r}")
+        if departure_airport == arrival_airport:
+            raise RowError("departure and arrival airports are the same")
+
+        departure_time, arrival_time = (self.parse_time(row[name]) for name in ("departure_time", "arrival_time"))
+        if arrival_time <= departure_time:
+            raise RowError("arrival_time must be after departure_time")
+
+        status = row.get("status") or Flight.FlightStatus.SCHEDULED
+        if status not in self.statuses:
+            raise RowError(f"unknown status {status!r}")
+        extra = {}
+        if row.get("base_fare") not in (None, ""):
+            try:
+                extra["base_fare"] = Decimal(str(row["base_fare"]))
+            except InvalidOperation:
+                raise RowError(f"invalid base_fare {row['base_fare']!r}")
+
+        flight_number = str(row["flight_number"]).strip()
+        if len(flight_number) > Flight._meta.get_field("flight_number").max_length:
+            raise RowError(f"flight_number {flight_number!r} is too long")
+
+        airplane_id, (economy, business, first_class) = airplane
+        return Flight(
+            flight_number=flight_number, airplane_id=airplane_id,
+            departure_airport_id=departure_airport, arrival_airport_id=arrival_airport,
+            departure_time=departure_time, arrival_time=arrival_time, status=status,
+            economy_seats=economy, business_seats=business, first_class_seats=first_class,
+            **extra,
+        )
+
+    @staticmethod
+    def parse_time(value):
+        try:
+            parsed = parse_datetime(str(value))
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise RowError(f"invalid datetime {value!r}")
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
@@ -0,0 +1,192 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks import caching
+from tasks.models import Country, Airport, Airline, Airplane, Flight
+from tasks.seatmap import SEAT_LETTERS
+from tasks.slugs import SlugAllocator
+
+SEAT_FIELDS = (
+    "economy_seats", "business_seats", "first_class_seats",
+    "economy_seats_per_row", "business_seats_per_row", "first_class_seats_per_row",
+)
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as stream:
+        yield from csv.DictReader(stream)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load countries, airports, airlines and airplanes from OurAirports-style CSV files, "
+        "allocating unique slugs and writing only new or changed rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--countries", help="CSV with code, name (OurAirports countries.csv)")
+        parser.add_argument("--airports", help="CSV with ident, type, name, municipality, iso_country (OurAirports airports.csv)")
+        parser.add_argument("--airlines", help="CSV with code, name, airport (base airport ident)")
+        parser.add_argument(
+            "--airplanes", help="CSV with registration, model, airline (code) and economy/business/first_class seat counts"
+        )
+        parser.add_argument(
+            "--airport-types", default="",
+            help="Comma separated OurAirports types to load; defaults to every type but 'closed'",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change and roll back")
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ("countries", "airports", "airlines", "airplanes")):
+            raise CommandError("Nothing to load; pass at least one of --countries, --airports, --airlines, --airplanes.")
+        self.batch_size = options["batch_size"]
+        self.airport_types = {value.strip() for value in options["airport_types"].split(",") if value.strip()}
+        written = 0
+
+        with transaction.atomic():
+            # Natural keys of everything already loaded, so later files can reference earlier ones.
+            self.countries = self.keys(Country, "code")
+            self.airports = self.keys(Airport, "code")
+            self.airlines = self.keys(Airline, "code")
+
+            if options["countries"]:
+                written += self.load(Country, "code", self.country_rows(options["countries"]), "name", self.countries)
+            if options["airports"]:
+                written += self.load(Airport, "code", self.airport_rows(options["airports"]), "name", self.airports)
+            if options["airlines"]:
+                written += self.load(Airline, "code", self.airline_rows(options["airlines"]), "name", self.airlines)
+            if options["airplanes"]:
+                rows, resized = self.keep_booked_layouts(self.airplane_rows(options["airplanes"]))
+                written += self.load(Airplane, "registration", rows, "model", {})
+                Flight.reset_seats(Flight.objects.filter(airplane__in=resized))
+
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+            elif written:
+                # Bulk writes send no signals; drop cached flights that embed reference data.
+                caching.invalidate_all()
+
+    @staticmethod
+    def keys(model, key):
+        return dict(model.objects.exclude(**{key: None}).values_list(key, "pk"))
+
+    def load(self, model, key, rows, slug_source, known):
+        """
+        Upsert ``rows`` (``{natural key: field values}``) into ``model``: new keys
+        are bulk-created with freshly allocated slugs, existing ones are
+        bulk-updated only when a value differs. Returns the rows written.
+        """
+        rows, skipped = rows
+        fields = list(next(iter(rows.values()), {}))
+        existing = {
+            values.pop(key): values for values in model.objects.exclude(**{key: None}).values("pk", key, *fields)
+        }
+        slugs = SlugAllocator(
+            model.objects.exclude(slug=None).values_list("slug", flat=True), model._meta.get_field("slug").max_length
+        )
+
+        created, updated = [], []
+        for natural_key, values in rows.items():
+            current = existing.get(natural_key)
+            if current is None:
+                created.append(model(
+                    **{key: natural_key}, **values, slug=slugs.allocate(values[slug_source], natural_key)
+                ))
+            elif any(current[field] != value for field, value in values.items()):
+                updated.append(model(pk=current["pk"], **{key: natural_key}, **values))
+
+        model.objects.bulk_create(created, batch_size=self.batch_size)
+        if updated:
+            model.objects.bulk_update(updated, fields, batch_size=self.batch_size)
+        known.update({getattr(obj, key): obj.pk for obj in created})
+
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {len(created)} created, {len(updated)} updated, "
+            f"{len(rows) - len(created) - len(updated)} unchanged, {skipped} skipped"
+        )
+        return len(created) + len(updated)
+
+    def keep_booked_layouts(self, rows):
+        """
+        Keep the stored seat configuration of airplanes whose flights have
+        bookings, since their seat numbers depend on it; the rest of such a
+        row still loads. Returns the rows and the airplanes whose flights
+        start over on a new configuration.
+        """
+        rows, skipped = rows
+        stored = Airplane.objects.exclude(registration=None).values_list("registration", "pk", *SEAT_FIELDS)
+        changed = {
+            pk: (registration, dict(zip(SEAT_FIELDS, seats))) for registration, pk, *seats in stored
+            if registration in rows
+            and any(rows[registration][field] != seat for field, seat in zip(SEAT_FIELDS, seats))
+        }
+        booked = set(Flight.with_bookings().filter(airplane__in=changed).values_list("airplane_id", flat=True))
+        for pk in booked:
+            registration, seats = changed[pk]
+            capacity = seats["economy_seats"] + seats["business_seats"] + seats["first_class_seats"]
+            rows[registration].update(seats, capacity=capacity)
+        if booked:
+            registrations = sorted(changed[pk][0] for pk in booked)
+            self.stdout.write(self.style.WARNING(
+                f"Kept the seat configuration of {len(booked)} airplanes with booked flights: "
+                f"{', '.join(registrations[:20])}{' ...' if len(registrations) > 20 else ''}"
+            ))
+        return (rows, skipped), [pk for pk in changed if pk not in booked]
+
+    def country_rows(self, path):
+        rows, skipped = {}, 0
+        for row in read_csv(path):
+            code, name = (row.get("code") or "").strip().upper(), (row.get("name") or "").strip()
+            if len(code) != 2 or not name:
+                skipped += 1
+                continue
+            rows[code] = {"name": name}
+        return rows, skipped
+
+    def airport_rows(self, path):
+        rows, skipped = {}, 0
+        for row in read_csv(path):
+            ident, name = (row.get("ident") or "").strip().upper(), (row.get("name") or "").strip()
+            airport_type = (row.get("type") or "").strip()
+            if not (airport_type in self.airport_types if self.airport_types else airport_type != "closed"):
+                continue
+            country = self.countries.get((row.get("iso_country") or "").strip().upper())
+            if not ident or not name or country is None:
+                skipped += 1
+                continue
+            rows[ident] = {"name": name, "city": (row.get("municipality") or "").strip(), "country_id": country}
+        return rows, skipped
+
+    def airline_rows(self, path):
+        rows, skipped = {}, 0
+        for row in read_csv(path):
+            code, name = (row.get("code") or "").strip().upper(), (row.get("name") or "").strip()
+            airport = self.airports.get((row.get("airport") or "").strip().upper())
+            if not code or not name or airport is None:
+                skipped += 1
+                continue
+            rows[code] = {"name": name, "airport_id": airport}
+        return rows, skipped
+
+    def airplane_rows(self, path):
+        rows, skipped = {}, 0
+        defaults = {field.name: field.default for field in Airplane._meta.concrete_fields if field.name in SEAT_FIELDS}
+        for row in read_csv(path):
+            registration, model = (row.get("registration") or "").strip().upper(), (row.get("model") or "").strip()
+            airline = self.airlines.get((row.get("airline") or "").strip().upper())
+            try:
+                seats = {field: int(row[field]) if row.get(field) else defaults[field] for field in SEAT_FIELDS}
+            except ValueError:
+                seats = None
+            if (
+                not registration or not model or airline is None or seats is None or min(seats.values()) < 0
+                or not all(1 <= seats[field] <= len(SEAT_LETTERS) for field in SEAT_FIELDS if field.endswith("_per_row"))
+            ):
+                skipped += 1
+                continue
+            capacity = seats["economy_seats"] + seats["business_seats"] + seats["first_class_seats"]
+            rows[registration] = {"model": model, "airline_id": airline, **seats, "capacity": capacity}
+        return rows, skipped
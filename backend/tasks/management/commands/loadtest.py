@@ -0,0 +1,191 @@
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.models import User
+from ._bench import bench_fixture, percentile, send, server_process, Timer
+
+SERVERS = {
+    "wsgi": ["gunicorn", "conf.wsgi:application"],
+    "asgi": ["uvicorn", "conf.asgi:application", "--no-access-log"],
+}
+STEPS = ("register", "login", "search", "order", "buy", "cancel")
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run scripted user journeys (register, login, search flights, order, buy, cancel) against a local "
+        "server and write throughput, latency percentiles and error rates per endpoint to a JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+        parser.add_argument("--journeys", type=int, default=5, help="Search-and-book journeys per user")
+        parser.add_argument("--searches", type=int, default=3, help="Flight searches per journey")
+        parser.add_argument("--flights", type=int, default=5, help="Bookable flights on the searched route")
+        parser.add_argument("--server", default="wsgi", choices=[*SERVERS, "none"],
+                            help="Server to start; 'none' targets one already listening on --host/--port")
+        parser.add_argument("--workers", type=int, default=2, help="Server processes")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the journeys' flight choices")
+        parser.add_argument("--output", default="loadtest-report.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["journeys"] < 1:
+            raise CommandError("--users and --journeys must be at least 1")
+        self.host, self.port = options["host"], options["port"]
+        self.options = options
+        self.random = random.Random(options["seed"])
+        self.samples = defaultdict(list)
+        self.journeys = Counter()
+
+        with bench_fixture() as fixture:
+            self.fixture = fixture
+            seats = options["users"] * options["journeys"]
+            self.flights = [fixture.flight(economy=seats) for _ in range(options["flights"])]
+            try:
+                if options["server"] == "none":
+                    elapsed = asyncio.run(self.run())
+                else:
+                    with server_process(SERVERS[options["server"]], self.host, self.port, options["workers"]):
+                        elapsed = asyncio.run(self.run())
+            finally:
+                User.objects.filter(email__startswith=f"loadtest-{fixture.tag}-").delete()
+
+        report = self.build_report(elapsed)
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.print_report(report)
+        self.stdout.write(self.style.SUCCESS(f"\nReport written to {options['output']}"))
+
+    async def run(self):
+        with Timer() as timer:
+            await asyncio.gather(*(self.user(index) for index in range(self.options["users"])))
+        return timer.elapsed
+
+    async def call(self, step, method, path, body=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        payload = json.dumps(body).encode() if body is not None else b""
+        started = time.perf_counter()
+        try:
+            status, content = await send(self.host, self.port, method, path, headers, payload)
+        except OSError:
+            status, content = 0, b""
+        self.samples[step].append(((time.perf_counter() - started) * 1000, status))
+        if not 200 <= status < 300:
+            raise JourneyFailed(step)
+        return json.loads(content) if content else None
+
+    async def user(self, index):
+        email = f"loadtest-{self.fixture.tag}-{index}@example.com"
+        password = f"Lt-{self.fixture.tag}-Passw0rd!"
+        try:
+            await self.call("register", "POST", "/api/accounts/register/", {
+                "email": email, "username": email, "first_name": "Load", "last_name": "Test",
+                "date_of_birth": "1990-01-01", "password": password, "password_confirm": password,
+            })
+            login = await self.call("login", "POST", "/api/accounts/login/", {"email": email, "password": password})
+        except JourneyFailed:
+            self.journeys["failed"] += self.options["journeys"]
+            return
+        token = login["tokens"]["access"]
+
+        for _ in range(self.options["journeys"]):
+            try:
+                await self.journey(token)
+                self.journeys["completed"] += 1
+            except JourneyFailed:
+                self.journeys["failed"] += 1
+
+    async def journey(self, token):
+        search = (
+            f"/api/flight/flights/?departure_airport={self.fixture.origin.pk}"
+            f"&arrival_airport={self.fixture.destination.pk}&pagination=cursor"
+        )
+        for _ in range(self.options["searches"]):
+            results = (await self.call("search", "GET", search, token=token))["results"]
+        if not results:
+            raise JourneyFailed("search")
+        flight = self.random.choice(results)
+        order = await self.call("order", "POST", "/api/flight/orders/", {
+            "flight_id": flight["id"], "tickets": [{"seat_class": "economy", "direction": "outbound"}],
+        }, token=token)
+        await self.call("buy", "POST", f"/api/flight/orders/{order['id']}/buy/", token=token)
+        await self.call("cancel", "POST", f"/api/flight/orders/{order['id']}/cancel/", token=token)
+
+    def build_report(self, elapsed):
+        endpoints = {}
+        for step in STEPS:
+            samples = self.samples.get(step, [])
+            latencies = [latency for latency, _ in samples]
+            errors = sum(not 200 <= status < 300 for _, status in samples)
+            endpoints[step] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+                "rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "max_ms": round(max(latencies, default=0.0), 2),
+                "statuses": {str(status): count for status, count in sorted(Counter(s for _, s in samples).items())},
+            }
+        requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+        errors = sum(endpoint["errors"] for endpoint in endpoints.values())
+        options = {name: self.options[name] for name in (
+            "users", "journeys", "searches", "flights", "server", "workers", "seed"
+        )}
+        return {
+            "finished_at": timezone.now().isoformat(),
+            "revision": self.revision(),
+            "environment": {
+                "python": platform.python_version(), "django": django.get_version(),
+                "database": settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1],
+            },
+            "options": options,
+            "duration_s": round(elapsed, 3),
+            "totals": {
+                "requests": requests, "errors": errors, "error_rate": round(errors / requests, 4) if requests else 0.0,
+                "rps": round(requests / elapsed, 2),
+            },
+            "journeys": {"completed": self.journeys["completed"], "failed": self.journeys["failed"]},
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def revision():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_report(self, report):
+        self.stdout.write("endpoint  requests    req/s    p50 ms    p95 ms    p99 ms  error rate")
+        for step, row in report["endpoints"].items():
+            self.stdout.write(
+                f"{step:<9} {row['requests']:>8} {row['rps']:>8.1f} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate']:>11.2%}"
+            )
+        totals, journeys = report["totals"], report["journeys"]
+        self.stdout.write(
+            f"{'total':<9} {totals['requests']:>8} {totals['rps']:>8.1f} "
+            f"{'':>29} {totals['error_rate']:>11.2%}\n"
+            f"journeys: {journeys['completed']} completed, {journeys['failed']} failed in {report['duration_s']:.1f} s"
+        )
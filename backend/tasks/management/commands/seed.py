@@ -0,0 +1,429 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+
+from tasks import caching
+from tasks.fares import CLASS_MULTIPLIERS, SEAT_CLASSES
+from tasks.models import Country, Airport, Airline, Airplane, Flight, Order, Ticket
+from tasks.routing import route_index
+from tasks.seatmap import SeatLayout, SeatMap
+from users.models import User
+from ._bench import Timer
+
+SCALES = {
+    "small": {"countries": 10, "airports": 60, "airlines": 20, "airplanes": 120, "users": 2_000,
+              "flights": 10_000, "orders": 40_000},
+    "medium": {"countries": 60, "airports": 600, "airlines": 120, "airplanes": 1_500, "users": 50_000,
+               "flights": 250_000, "orders": 1_000_000},
+    "large": {"countries": 200, "airports": 3_000, "airlines": 500, "airplanes": 8_000, "users": 500_000,
+              "flights": 2_000_000, "orders": 8_000_000},
+}
+# model, economy, business, first class seats, economy seats per row, share of the fleet
+FLEET = (
+    ("Airbus A320", 150, 12, 0, 6, 0.30),
+    ("Boeing 737-800", 162, 12, 0, 6, 0.25),
+    ("Airbus A321", 185, 16, 0, 6, 0.15),
+    ("Embraer E190", 96, 0, 0, 4, 0.10),
+    ("Boeing 787-9", 246, 28, 8, 9, 0.10),
+    ("Airbus A350-900", 270, 40, 8, 9, 0.07),
+    ("Boeing 777-300ER", 300, 42, 8, 10, 0.03),
+)
+SYLLABLES = (
+    "ka", "ri", "lo", "ven", "ta", "mar", "sol", "dor", "el", "ni", "ber", "gan", "to", "vi", "lan", "sar",
+    "mo", "ra", "kel", "zin", "pa", "thu", "ol", "an", "is", "gra", "fen", "do", "lu", "mir",
+)
+# Departures per hour of day: morning and evening banks.
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 2, 4, 8, 10, 10, 8, 6, 6, 6, 6, 6, 7, 8, 10, 10, 8, 6, 4, 2, 1], dtype=float)
+TICKETS_PER_ORDER = (np.array([1, 2, 3, 4]), np.array([0.60, 0.25, 0.08, 0.07]))
+CLASS_SHARES = np.array([0.88, 0.09, 0.03])
+PAST_DAYS, FUTURE_DAYS = 180, 365
+# Flights, with their orders and tickets, are generated and written this many at a time. It is fixed so
+# that a seed always produces the same rows.
+CHUNK = 5000
+UNUSABLE_PASSWORD = "!seed"
+BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Each seed writes its "S" + two base36 digits tag into codes and flight numbers, which leaves no room for
+# more, and ids from its own block of every table: seed N starts at (N + 1) * ID_BLOCK + 1. Sequences are
+# left alone, so on PostgreSQL other rows keep ids below the first block. SQLite and MySQL continue after
+# the highest id instead, inside the last seeded block, and a later run of that seed refuses to overwrite them.
+SEEDS = 36 ** 2
+ID_BLOCK = 10 ** 10
+
+
+def base36(number, width):
+    digits = ""
+    while number:
+        number, remainder = divmod(number, 36)
+        digits = BASE36[remainder] + digits
+    return digits.rjust(width, "0")
+
+
+class TableWriter:
+    """
+    Appends rows to a model's table with explicit ids from a block of
+    ``ID_BLOCK`` ids, bypassing ``save()`` and signals: COPY on PostgreSQL,
+    one executemany elsewhere. Rows are dicts keyed by every concrete
+    field's attname.
+    """
+
+    def __init__(self, model, block):
+        self.model = model
+        self.fields = model._meta.concrete_fields
+        self.first_id = block * ID_BLOCK + 1
+        self.next_id = self.first_id
+        self.written = 0
+        self.elapsed = 0.0
+
+    def in_use(self):
+        return self.model.objects.filter(pk__gte=self.first_id, pk__lt=self.first_id + ID_BLOCK).exists()
+
+    def ids(self, count):
+        start = self.next_id
+        self.next_id += count
+        if self.next_id > self.first_id + ID_BLOCK:
+            raise CommandError(f"More than {ID_BLOCK} {self.model._meta.verbose_name_plural} for one seed.")
+        return range(start, start + count)
+
+    def write(self, rows):
+        if not rows:
+            return
+        with Timer() as timer:
+            if connection.vendor == "postgresql":
+                self.copy(rows)
+            else:
+                self.insert(rows)
+        self.written += len(rows)
+        self.elapsed += timer.elapsed
+
+    def copy(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self.copy_value(row[field.attname]) for field in self.fields])
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in self.fields)
+        sql = f"COPY {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):
+                buffer.seek(0)
+                raw.copy_expert(sql, buffer)
+            else:
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    @staticmethod
+    def copy_value(value):
+        # An unquoted empty CSV field is NULL; the generator never writes empty strings.
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, bytes):
+            return "\\x" + value.hex()
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return value
+
+    def insert(self, rows):
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in self.fields)
+        placeholders = ", ".join(["%s"] * len(self.fields))
+        sql = f"INSERT INTO {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(row[field.attname], connection) for field in self.fields] for row in rows
+            ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset of countries, airports, airlines, airplanes, users, flights, "
+        "orders and tickets with bulk writes (COPY on PostgreSQL), keeping seat counters and seat maps "
+        "consistent with the issued tickets"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="small")
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help=f"0 to {SEEDS - 1}; same seed, scale and start date: same rows and ids, whatever else is stored",
+        )
+        parser.add_argument(
+            "--start-date", type=date.fromisoformat, default=None,
+            help="Day the generated schedule is centred on (YYYY-MM-DD); defaults to today",
+        )
+        for name in SCALES["small"]:
+            parser.add_argument(f"--{name}", type=int, help=f"Override the preset's number of {name}")
+        parser.add_argument("--replace", action="store_true", help="Delete rows of an earlier run with this seed first")
+
+    def handle(self, *args, **options):
+        self.counts = {name: options[name] or preset for name, preset in SCALES[options["scale"]].items()}
+        if min(self.counts.values()) < 1 or self.counts["airports"] < 2:
+            raise CommandError("Every count must be at least 1, and there must be at least 2 airports.")
+        if not 0 <= options["seed"] < SEEDS:
+            raise CommandError(f"--seed must be between 0 and {SEEDS - 1}.")
+        self.seed = options["seed"]
+        self.tag = "S" + base36(self.seed, 2)
+        self.slug_prefix = f"seed-{self.tag.lower()}-"
+        start = options["start_date"] or date.today()
+        self.now = datetime(start.year, start.month, start.day, 12, tzinfo=dt_timezone.utc)
+
+        if Country.objects.filter(slug__startswith=self.slug_prefix).exists():
+            if not options["replace"]:
+                raise CommandError(f"Seed {self.seed} was already generated; pass --replace to regenerate it.")
+            self.delete_previous()
+
+        self.writers = {model: TableWriter(model, self.seed + 1) for model in (
+            Country, Airport, Airline, Airplane, User, Flight, Order, Ticket
+        )}
+        taken = [model._meta.db_table for model, writer in self.writers.items() if writer.in_use()]
+        if taken:
+            raise CommandError(
+                f"Seed {self.seed}'s ids are already used by rows not generated with it in: {', '.join(taken)}."
+            )
+        with Timer() as timer:
+            with transaction.atomic():
+                self.reference_data()
+            self.users()
+            self.flights(options["verbosity"])
+
+        # Nothing above sends signals: every process rebuilds its route index and cached payloads.
+        route_index.publish_many(None)
+        caching.invalidate_all()
+
+        self.stdout.write(f"{'table':<10} {'rows':>10} {'rows/s':>10}")
+        for model, writer in self.writers.items():
+            rate = writer.written / writer.elapsed if writer.elapsed else 0
+            self.stdout.write(f"{model._meta.db_table:<10} {writer.written:>10} {rate:>10.0f}")
+        total = sum(writer.written for writer in self.writers.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {total} rows in {timer.elapsed:.1f}s ({total / timer.elapsed:.0f} rows/s)"
+        ))
+
+    def rng(self, *stream):
+        return np.random.default_rng([self.seed, *stream])
+
+    @staticmethod
+    def name(rng, syllables=(2, 4)):
+        return "".join(rng.choice(SYLLABLES, rng.integers(*syllables))).capitalize()
+
+    def reference_data(self):
+        rng = self.rng(0)
+        countries = self.writers[Country].ids(self.counts["countries"])
+        self.writers[Country].write([
+            {"id": pk, "slug": f"{self.slug_prefix}country-{index}", "name": self.name(rng), "code": None}
+            for index, pk in enumerate(countries)
+        ])
+
+        # Airport traffic follows a Zipf-like curve: a few hubs and a long tail.
+        airports = self.writers[Airport].ids(self.counts["airports"])
+        self.airport_ids = np.array(airports)
+        popularity = 1 / np.arange(1, len(airports) + 1) ** 1.1
+        self.airport_weights = popularity / popularity.sum()
+        airport_countries = rng.choice(np.array(countries), len(airports))
+        rows = []
+        for index, pk in enumerate(airports):
+            city = self.name(rng)
+            rows.append({
+                "id": pk, "slug": f"{self.slug_prefix}airport-{index}", "name": f"{city} International",
+                "city": city, "country_id": int(airport_countries[index]), "code": f"{self.tag}A{base36(index, 4)}",
+            })
+        self.writers[Airport].write(rows)
+
+        airlines = self.writers[Airline].ids(self.counts["airlines"])
+        bases = rng.choice(self.airport_ids, len(airlines), p=self.airport_weights)
+        self.writers[Airline].write([
+            {"id": pk, "slug": f"{self.slug_prefix}airline-{index}",
+             "name": f"{self.name(rng)} {rng.choice(['Air', 'Airlines', 'Airways'])}",
+             "airport_id": int(bases[index]), "code": f"{self.tag}{base36(index, 5)}"}
+            for index, pk in enumerate(airlines)
+        ])
+
+        airplanes = self.writers[Airplane].ids(self.counts["airplanes"])
+        shares = np.array([entry[-1] for entry in FLEET])
+        types = rng.choice(len(FLEET), len(airplanes), p=shares / shares.sum())
+        operators = rng.choice(np.array(airlines), len(airplanes))
+        rows = []
+        self.airplanes = []
+        for index, pk in enumerate(airplanes):
+            model, economy, business, first_class, per_row, _ = FLEET[types[index]]
+            rows.append({
+                "id": pk, "slug": f"{self.slug_prefix}airplane-{index}", "model": model,
+                "capacity": economy + business + first_class, "airline_id": int(operators[index]),
+                "registration": f"{self.tag}-{base36(index, 5)}", "economy_seats": economy,
+                "business_seats": business, "first_class_seats": first_class, "economy_seats_per_row": per_row,
+                "business_seats_per_row": 4, "first_class_seats_per_row": 4,
+            })
+            self.airplanes.append((pk, types[index]))
+        self.writers[Airplane].write(rows)
+        self.layouts = [
+            SeatLayout([("first_class", first, 4), ("business", business, 4), ("economy", economy, per_row)])
+            for _, economy, business, first, per_row, _ in FLEET
+        ]
+
+    def users(self):
+        ids = self.writers[User].ids(self.counts["users"])
+        self.user_ids = np.array(ids)
+        for block, start in enumerate(range(0, len(ids), CHUNK)):
+            rng = self.rng(1, block)
+            chunk = ids[start:start + CHUNK]
+            birthdays = rng.integers(18 * 365, 80 * 365, len(chunk))
+            rows = []
+            for offset, pk in enumerate(chunk):
+                username = f"{self.tag.lower()}-{start + offset}"
+                rows.append({
+                    "id": pk, "password": UNUSABLE_PASSWORD, "last_login": None, "is_superuser": False,
+                    "username": username, "first_name": self.name(rng, (2, 3)), "last_name": self.name(rng),
+                    "email": f"{username}@seed.example.com", "is_staff": False, "is_active": True,
+                    "date_joined": self.now - timedelta(days=int(rng.integers(1, 1500))),
+                    "date_of_birth": (self.now - timedelta(days=int(birthdays[offset]))).date(),
+                    "google_id": None, "role": User.UserRoles.CLIENT,
+                })
+            with transaction.atomic():
+                self.writers[User].write(rows)
+
+    def flights(self, verbosity):
+        total = self.counts["flights"]
+        orders_per_flight = self.counts["orders"] / total
+        with Timer() as timer:
+            for block, start in enumerate(range(0, total, CHUNK)):
+                flights, orders, tickets = self.flight_chunk(self.rng(2, block), start, min(CHUNK, total - start),
+                                                             orders_per_flight)
+                with transaction.atomic():
+                    self.writers[Flight].write(flights)
+                    self.writers[Order].write(orders)
+                    self.writers[Ticket].write(tickets)
+                reset_queries()  # DEBUG keeps every statement otherwise
+                if verbosity > 1:
+                    done = start + len(flights)
+                    self.stdout.write(f"{done} flights ({done / timer.lap():.0f} flights/s)")
+
+    def flight_chunk(self, rng, start, count, orders_per_flight):
+        ids = self.writers[Flight].ids(count)
+        airplanes = rng.integers(0, len(self.airplanes), count)
+        origins = rng.choice(len(self.airport_ids), count, p=self.airport_weights)
+        destinations = rng.choice(len(self.airport_ids), count, p=self.airport_weights)
+        same = origins == destinations
+        destinations[same] = (destinations[same] + rng.integers(1, len(self.airport_ids), same.sum())) % len(self.airport_ids)
+        days = rng.integers(-PAST_DAYS, FUTURE_DAYS, count)
+        minutes = rng.choice(24, count, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum()) * 60 + rng.integers(0, 12, count) * 5
+        durations = (np.clip(rng.lognormal(np.log(150), 0.5, count), 45, 960) // 5 * 5).astype(int)
+        fares = np.round(40 + durations * 0.6 * rng.lognormal(0, 0.25, count), 2)
+        outcomes = rng.random(count)
+        # Demand varies per flight around the preset's orders per flight.
+        bookings = rng.poisson(orders_per_flight * rng.gamma(2.0, 0.5, count))
+
+        flights, orders, tickets = [], [], []
+        midnight = self.now.replace(hour=0)
+        for index, pk in enumerate(ids):
+            airplane_id, fleet_type = self.airplanes[airplanes[index]]
+            _, economy, business, first_class, _, _ = FLEET[fleet_type]
+            departure = midnight + timedelta(days=int(days[index]), minutes=int(minutes[index]))
+            past = departure < self.now
+            if outcomes[index] < 0.03:
+                status = Flight.FlightStatus.CANCELLED
+            elif past:
+                status = Flight.FlightStatus.DEPARTED
+            else:
+                status = Flight.FlightStatus.DELAYED if outcomes[index] < 0.06 else Flight.FlightStatus.SCHEDULED
+            flight = {
+                "id": pk, "flight_number": f"{self.tag}{base36(start + index, 7)}", "airplane_id": airplane_id,
+                "departure_airport_id": int(self.airport_ids[origins[index]]),
+                "arrival_airport_id": int(self.airport_ids[destinations[index]]),
+                "departure_time": departure, "arrival_time": departure + timedelta(minutes=int(durations[index])),
+                "status": status, "economy_seats": economy, "business_seats": business,
+                "first_class_seats": first_class, "seat_map": None, "base_fare": Decimal(str(fares[index])),
+            }
+            self.book(rng, flight, self.layouts[fleet_type], int(bookings[index]), past, orders, tickets)
+            flights.append(flight)
+        return flights, orders, tickets
+
+    def book(self, rng, flight, layout, count, past, orders, tickets):
+        """Add ``count`` one-way orders on ``flight``, seating confirmed ones in the layout's preference order."""
+        if not count:
+            return
+        seat_map = SeatMap(layout)
+        assigned = dict.fromkeys(SEAT_CLASSES, 0)
+        sizes = rng.choice(TICKETS_PER_ORDER[0], count, p=TICKETS_PER_ORDER[1])
+        classes = rng.choice(len(SEAT_CLASSES), count, p=CLASS_SHARES)
+        outcomes = rng.random(count)
+        lead_days = rng.uniform(0.5, 120, count)
+        markups = rng.uniform(1.0, 1.6, count)
+        order_ids = self.writers[Order].ids(count)
+        cancelled_flight = flight["status"] == Flight.FlightStatus.CANCELLED
+
+        for index, order_id in enumerate(order_ids):
+            seat_class = SEAT_CLASSES[classes[index]]
+            if flight[Flight.SEAT_FIELDS[seat_class]] < sizes[index]:
+                seat_class = Flight.SeatClass.ECONOMY
+            if cancelled_flight or outcomes[index] < 0.15:
+                status = Order.OrderStatus.CANCELLED
+            elif past or outcomes[index] < 0.88:
+                status = Order.OrderStatus.CONFIRMED
+            else:
+                status = Order.OrderStatus.BOOKED
+            field = Flight.SEAT_FIELDS[seat_class]
+            if status == Order.OrderStatus.CONFIRMED and flight[field] < sizes[index]:
+                status = Order.OrderStatus.CANCELLED
+
+            multiplier = float(CLASS_MULTIPLIERS[SEAT_CLASSES.index(seat_class)])
+            price = Decimal(str(round(float(flight["base_fare"]) * multiplier * markups[index], 2)))
+            created_at = min(
+                flight["departure_time"] - timedelta(days=float(lead_days[index])),
+                self.now - timedelta(minutes=int(lead_days[index] * 60)),
+            )
+            tickets_data = None
+            if status == Order.OrderStatus.BOOKED:
+                tickets_data = [{"seat_class": seat_class, "direction": "outbound", "price": str(price)}] * int(sizes[index])
+            elif status == Order.OrderStatus.CONFIRMED:
+                preference = layout.preference[seat_class]
+                for seat in preference[assigned[seat_class]:assigned[seat_class] + sizes[index]]:
+                    tickets.append({
+                        "id": self.writers[Ticket].next_id, "order_id": order_id,
+                        "seat_number": seat_map.take(layout.labels[seat], seat_class), "seat_class": seat_class,
+                        "direction": Ticket.TicketDirection.OUTBOUND, "price": price, "created_at": created_at,
+                    })
+                    self.writers[Ticket].next_id += 1
+                assigned[seat_class] += sizes[index]
+                flight[field] -= sizes[index]
+
+            orders.append({
+                "id": order_id, "user_id": int(self.user_ids[rng.integers(len(self.user_ids))]),
+                "flight_id": flight["id"], "return_flight_id": None, "ticket_type": Order.TicketType.ONE_WAY,
+                "status": status, "total_price": price * int(sizes[index]), "created_at": created_at,
+                "tickets_data": tickets_data, "quoted_fares": None,
+            })
+        if any(assigned.values()):
+            flight["seat_map"] = seat_map.to_bytes()
+
+    def delete_previous(self):
+        """Delete an earlier run's rows with plain DELETEs: the ORM would load and signal every flight."""
+        flights = Flight.objects.filter(flight_number__startswith=self.tag)
+        users = User.objects.filter(email__endswith="@seed.example.com", username__startswith=f"{self.tag.lower()}-")
+        orders = Order.objects.filter(flight__in=flights.values("pk")) | Order.objects.filter(user__in=users.values("pk"))
+        airports = Airport.objects.filter(slug__startswith=self.slug_prefix)
+        with transaction.atomic():
+            for model, queryset in (
+                (Ticket, Ticket.objects.filter(order__in=orders.values("pk"))),
+                (Order, orders),
+                (Flight, flights),
+                (Airplane, Airplane.objects.filter(slug__startswith=self.slug_prefix)),
+                (Airline, Airline.objects.filter(airport__in=airports.values("pk"))),
+                (Airport, airports),
+                (Country, Country.objects.filter(slug__startswith=self.slug_prefix)),
+                (User, users),
+            ):
+                sql, params = queryset.values("pk").query.sql_with_params()
+                table, pk = model._meta.db_table, model._meta.pk.column
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {connection.ops.quote_name(table)} WHERE {connection.ops.quote_name(pk)} IN "
+                        f"(SELECT * FROM ({sql}) AS doomed)", params
+                    )
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-16 12:00
+
+import django.core.validators
+from django.db import migrations, models
+
+from tasks.seatmap import SeatLayout, SeatMap
+
+
+def backfill_seat_maps(apps, schema_editor):
+    Flight = apps.get_model('tasks', 'Flight')
+    Ticket = apps.get_model('tasks', 'Ticket')
+
+    taken = {}
+    tickets = Ticket.objects.filter(order__status='confirmed').values_list(
+        'direction', 'seat_number', 'order__flight_id', 'order__return_flight_id'
+    )
+    for direction, seat_number, flight_id, return_flight_id in tickets.iterator():
+        target = return_flight_id if direction == 'return' else flight_id
+        if target:
+            taken.setdefault(target, []).append(seat_number)
+
+    for flight in Flight.objects.filter(pk__in=taken).select_related('airplane').iterator():
+        seat_map = SeatMap(SeatLayout.for_airplane(flight.airplane))
+        for seat_number in taken[flight.pk]:
+            if seat_number and str(seat_number).upper() in seat_map.layout.index and not seat_map.is_taken(seat_number):
+                seat_map.take(seat_number)
+        Flight.objects.filter(pk=flight.pk).update(seat_map=seat_map.to_bytes())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_order_tickets_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airplane',
+            name='business_seats_per_row',
+            field=models.PositiveSmallIntegerField(default=4, help_text='Seats per business row', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)]),
+        ),
+        migrations.AddField(
+            model_name='airplane',
+            name='economy_seats_per_row',
+            field=models.PositiveSmallIntegerField(default=6, help_text='Seats per economy row', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)]),
+        ),
+        migrations.AddField(
+            model_name='airplane',
+            name='first_class_seats_per_row',
+            field=models.PositiveSmallIntegerField(default=4, help_text='Seats per first class row', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)]),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='seat_map',
+            field=models.BinaryField(blank=True, help_text='Seat occupancy bitmap', null=True),
+        ),
+        migrations.RunPython(backfill_seat_maps, migrations.RunPython.noop),
+    ]
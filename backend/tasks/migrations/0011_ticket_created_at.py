@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 12:30
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_order_created_at(apps, schema_editor):
+    Order = apps.get_model('tasks', 'Order')
+    Ticket = apps.get_model('tasks', 'Ticket')
+    Ticket.objects.update(
+        created_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_seat_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_order_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 14:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='base_fare',
+            field=models.DecimalField(decimal_places=2, default=100, help_text='Economy fare of an empty flight booked well ahead', max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='quoted_fares',
+            field=models.JSONField(blank=True, help_text='Fares per flight and seat class when booked', null=True),
+        ),
+    ]
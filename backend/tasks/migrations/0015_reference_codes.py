@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-16 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_fares'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airline',
+            name='code',
+            field=models.CharField(blank=True, help_text='ICAO airline code', max_length=8, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='airplane',
+            name='registration',
+            field=models.CharField(blank=True, help_text='Tail number', max_length=16, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='airport',
+            name='code',
+            field=models.CharField(blank=True, help_text='ICAO or OurAirports ident', max_length=16, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='code',
+            field=models.CharField(blank=True, help_text='ISO 3166-1 alpha-2 code', max_length=2, null=True, unique=True),
+        ),
+    ]
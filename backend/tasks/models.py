@@ -1,19 +1,50 @@
+from collections import Counter
+from functools import reduce
+from itertools import islice
+from operator import or_
+
 from django.db import models, transaction
-from django.utils.text import slugify
+from django.db.models import F, Q, Case, When, Value, OuterRef, Subquery
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils.functional import cached_property
 from users.models import User
 from django.core.exceptions import ValidationError
+from .seatmap import SeatLayout, SeatMap, SEAT_LETTERS
+from .slugs import unique_slug
+from .caching import invalidate_flight_payloads
+from . import holds
+
+
+SEAT_CONFIG_LOCKED = (
+    "Seat configuration can't change while flights of this airplane have bookings; "
+    "their seat numbers are tied to the current layout."
+)
+
+
+class SeatsUnavailable(ValueError):
+    def __init__(self, flight_id, seat_class):
+        self.flight_id = flight_id
+        self.seat_class = seat_class
+        super().__init__(f"No {seat_class} seats available.")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 class Country(models.Model):
     slug = models.SlugField(unique=True, null=True, blank=True)
     name = models.CharField(max_length=255, verbose_name='Country name')
+    code = models.CharField(max_length=2, unique=True, null=True, blank=True, help_text="ISO 3166-1 alpha-2 code")
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name, self.code)
         super().save(*args, **kwargs)
 
     class Meta:
@@ -27,13 +58,14 @@ class Airport(models.Model):
     name = models.CharField(max_length=255, verbose_name='Airport name')
     city = models.CharField(max_length=255, verbose_name="City name")
     country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='airports')
+    code = models.CharField(max_length=16, unique=True, null=True, blank=True, help_text="ICAO or OurAirports ident")
 
     def __str__(self):
         return f"Airport {self.name} ({self.city})"
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name, self.code)
         super().save(*args, **kwargs)
 
     class Meta:
@@ -46,13 +78,14 @@ class Airline(models.Model):
     slug = models.SlugField(unique=True, blank=True, null=True)
     name = models.CharField(max_length=100, verbose_name="Airline name")
     airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="airlines")
+    code = models.CharField(max_length=8, unique=True, null=True, blank=True, help_text="ICAO airline code")
 
     def __str__(self):
         return f"Airline {self.name}"
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name, self.code)
         super().save(*args, **kwargs)
 
     class Meta:
@@ -66,28 +99,74 @@ class Airplane(models.Model):
     model = models.CharField(max_length=100)
     capacity = models.PositiveIntegerField(null=True, blank=True)
     airline = models.ForeignKey(Airline, on_delete=models.CASCADE, related_name="airplanes")
+    registration = models.CharField(max_length=16, unique=True, null=True, blank=True, help_text="Tail number")
     economy_seats = models.PositiveIntegerField(default=0, help_text="Number of economy class seats")
     business_seats = models.PositiveIntegerField(default=0, help_text="Number of business class seats")
     first_class_seats = models.PositiveIntegerField(default=0, help_text="Number of first class seats")
+    economy_seats_per_row = models.PositiveSmallIntegerField(
+        default=6, validators=[MinValueValidator(1), MaxValueValidator(len(SEAT_LETTERS))],
+        help_text="Seats per economy row"
+    )
+    business_seats_per_row = models.PositiveSmallIntegerField(
+        default=4, validators=[MinValueValidator(1), MaxValueValidator(len(SEAT_LETTERS))],
+        help_text="Seats per business row"
+    )
+    first_class_seats_per_row = models.PositiveSmallIntegerField(
+        default=4, validators=[MinValueValidator(1), MaxValueValidator(len(SEAT_LETTERS))],
+        help_text="Seats per first class row"
+    )
 
     def __str__(self):
         return f"Airplane {self.model} of {self.airline.name}"
 
+    SEAT_CONFIG_FIELDS = (
+        'economy_seats', 'business_seats', 'first_class_seats',
+        'economy_seats_per_row', 'business_seats_per_row', 'first_class_seats_per_row',
+    )
+
+    def clean(self):
+        if self.seat_config_changed() and self.has_bookings():
+            raise ValidationError(SEAT_CONFIG_LOCKED)
+
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.model)
+            self.slug = unique_slug(self, self.model, self.registration)
         self.capacity = self.economy_seats + self.business_seats + self.first_class_seats
+        resized = self.seat_config_changed()
+        if resized and self.has_bookings():
+            raise ValidationError(SEAT_CONFIG_LOCKED)
         super().save(*args, **kwargs)
+        if resized:
+            # Nothing is booked, so the flights simply start over on the new layout.
+            Flight.reset_seats(Flight.objects.filter(airplane=self))
+
+    def seat_config_changed(self):
+        if self._state.adding or self.pk is None:
+            return False
+        stored = Airplane.objects.filter(pk=self.pk).values(*self.SEAT_CONFIG_FIELDS).first()
+        return stored is not None and any(stored[field] != getattr(self, field) for field in self.SEAT_CONFIG_FIELDS)
+
+    def has_bookings(self):
+        return Flight.with_bookings().filter(airplane=self).exists()
 
     def get_total_seats(self):
         return self.economy_seats + self.business_seats + self.first_class_seats
 
+    def get_seat_layout(self):
+        return SeatLayout.for_airplane(self)
+
     def get_seat_configuration(self):
-        return {
-            'economy': {'total_seats': self.economy_seats},
-            'business': {'total_seats': self.business_seats},
-            'first_class': {'total_seats': self.first_class_seats}
-        }
+        cabins = {cabin['seat_class']: cabin for cabin in self.get_seat_layout().cabins}
+        configuration = {}
+        for seat_class in ('economy', 'business', 'first_class'):
+            cabin = cabins.get(seat_class)
+            configuration[seat_class] = {
+                'total_seats': getattr(self, f'{seat_class}_seats'),
+                'seats_per_row': getattr(self, f'{seat_class}_seats_per_row'),
+                'rows': [cabin['first_row'], cabin['last_row']] if cabin else None,
+                'letters': cabin['letters'] if cabin else '',
+            }
+        return configuration
 
     class Meta:
         db_table = 'airplane'
@@ -122,46 +201,218 @@ class Flight(models.Model):
     economy_seats = models.PositiveIntegerField(default=0)
     business_seats = models.PositiveIntegerField(default=0)
     first_class_seats = models.PositiveIntegerField(default=0)
+    seat_map = models.BinaryField(null=True, blank=True, editable=False, help_text="Seat occupancy bitmap")
+    base_fare = models.DecimalField(
+        max_digits=10, decimal_places=2, default=100, validators=[MinValueValidator(0)],
+        help_text="Economy fare of an empty flight booked well ahead"
+    )
 
     def __str__(self):
         return f"{self.flight_number}: {self.departure_airport.city} -> {self.arrival_airport.city}"
 
+    def clean(self):
+        if self.airplane_changed() and self.has_bookings():
+            raise ValidationError({'airplane': SEAT_CONFIG_LOCKED})
+
     def save(self, *args, **kwargs):
         if not self.pk and self.airplane_id:
-            airplane = self.airplane
-            self.economy_seats = airplane.economy_seats
-            self.business_seats = airplane.business_seats
-            self.first_class_seats = airplane.first_class_seats
+            self.fit_to_airplane()
+        elif not self._state.adding and kwargs.get('update_fields') is None:
+            # The seat map is only ever written under a row lock by assign_seats/release_seat_numbers.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'seat_map'
+            ]
+            if self.airplane_changed():
+                if self.has_bookings():
+                    raise ValidationError({'airplane': SEAT_CONFIG_LOCKED})
+                self.fit_to_airplane()
+                kwargs['update_fields'].append('seat_map')
         super().save(*args, **kwargs)
 
+    def fit_to_airplane(self):
+        airplane = self.airplane
+        for field in self.SEAT_FIELDS.values():
+            setattr(self, field, getattr(airplane, field))
+        self.seat_map = None
+        self.__dict__.pop('seat_layout', None)
+
+    def airplane_changed(self):
+        if self._state.adding or self.pk is None:
+            return False
+        stored = Flight.objects.filter(pk=self.pk).values_list('airplane_id', flat=True).first()
+        return stored is not None and stored != self.airplane_id
+
+    def has_bookings(self):
+        return Flight.with_bookings().filter(pk=self.pk).exists()
+
+    @classmethod
+    def with_bookings(cls):
+        """Flights with an order that isn't cancelled, outbound or return."""
+        active = Order.objects.exclude(status=Order.OrderStatus.CANCELLED)
+        return cls.objects.filter(Q(pk__in=active.values('flight_id')) | Q(pk__in=active.values('return_flight_id')))
+
+    @classmethod
+    def reset_seats(cls, flights):
+        """
+        Put ``flights`` back to their airplane's full capacity and an empty
+        seat map in one UPDATE. Only for flights without bookings.
+        """
+        capacity = Airplane.objects.filter(pk=OuterRef('airplane_id'))
+        updated = flights.update(
+            seat_map=None, **{field: Subquery(capacity.values(field)) for field in cls.SEAT_FIELDS.values()}
+        )
+        if updated:
+            invalidate_flight_payloads(flights.values_list('pk', flat=True))
+        return updated
+
+    @cached_property
+    def seat_layout(self):
+        return self.airplane.get_seat_layout()
+
+    def get_seat_map(self):
+        return SeatMap(self.seat_layout, self.seat_map)
+
+    @classmethod
+    def assign_seats(cls, flight_id, seats):
+        """
+        Mark seats as taken on the flight's seat map and return their labels.
+
+        ``seats`` is a list of ``(seat_class, seat_number)`` pairs; a blank
+        seat number gets the best free seat of that class once every explicit
+        seat is taken. Must run inside a transaction: the flight row is locked
+        until it commits.
+        """
+        flight = cls.objects.select_for_update(of=('self',)).select_related('airplane').get(pk=flight_id)
+        seat_map = flight.get_seat_map()
+        labels = [
+            seat_map.take(seat_number, seat_class) if seat_number else None
+            for seat_class, seat_number in seats
+        ]
+        labels = [
+            label or seat_map.assign(seat_class)
+            for label, (seat_class, _) in zip(labels, seats)
+        ]
+        cls.objects.filter(pk=flight_id).update(seat_map=seat_map.to_bytes())
+        return labels
+
+    @classmethod
+    def release_seat_numbers(cls, flight_id, seat_numbers):
+        flight = cls.objects.select_for_update(of=('self',)).select_related('airplane').get(pk=flight_id)
+        seat_map = flight.get_seat_map()
+        for seat_number in seat_numbers:
+            seat_map.release(seat_number)
+        cls.objects.filter(pk=flight_id).update(seat_map=seat_map.to_bytes())
+
+    SEAT_FIELDS = {
+        SeatClass.ECONOMY: 'economy_seats',
+        SeatClass.BUSINESS: 'business_seats',
+        SeatClass.FIRST_CLASS: 'first_class_seats',
+    }
+
+    @classmethod
+    def seat_field(cls, seat_class):
+        try:
+            return cls.SEAT_FIELDS[seat_class]
+        except KeyError:
+            raise ValueError(f"Unknown seat class: {seat_class}")
+
     def get_available_seats(self, seat_class):
-        if seat_class == self.SeatClass.ECONOMY:
-            return self.economy_seats
-        elif seat_class == self.SeatClass.BUSINESS:
-            return self.business_seats
-        elif seat_class == self.SeatClass.FIRST_CLASS:
-            return self.first_class_seats
-        return 0
+        field = self.SEAT_FIELDS.get(seat_class)
+        return getattr(self, field) if field else 0
 
     def book_seat(self, seat_class):
-        if seat_class == self.SeatClass.ECONOMY and self.economy_seats > 0:
-            self.economy_seats -= 1
-            self.save(update_fields=['economy_seats'])
-            return True
-        elif seat_class == self.SeatClass.BUSINESS and self.business_seats > 0:
-            self.business_seats -= 1
-            self.save(update_fields=['business_seats'])
-            return True
-        elif seat_class == self.SeatClass.FIRST_CLASS and self.first_class_seats > 0:
-            self.first_class_seats -= 1
-            self.save(update_fields=['first_class_seats'])
-            return True
-        return False
+        field = self.SEAT_FIELDS.get(seat_class)
+        if not field:
+            return False
+        updated = Flight.objects.filter(pk=self.pk, **{f'{field}__gt': 0}).update(**{field: F(field) - 1})
+        if not updated:
+            return False
+        setattr(self, field, getattr(self, field) - 1)
+        invalidate_flight_payloads([self.pk])
+        return True
+
+    @classmethod
+    def _seats_per_flight(cls, seats):
+        per_flight = {}
+        for (flight_id, seat_class), count in seats.items():
+            per_flight.setdefault(flight_id, {})[cls.seat_field(seat_class)] = count
+        return per_flight
+
+    @classmethod
+    def _seat_changes(cls, per_flight, apply):
+        changes = {}
+        for field in cls.SEAT_FIELDS.values():
+            whens = [
+                When(pk=flight_id, then=Value(fields[field]))
+                for flight_id, fields in per_flight.items() if field in fields
+            ]
+            if whens:
+                changes[field] = apply(field, Case(*whens, default=Value(0), output_field=models.IntegerField()))
+        return changes
+
+    @classmethod
+    def reserve_seats(cls, seats, reserved=None):
+        """
+        Take seats for a whole order in one conditional UPDATE.
+
+        ``seats`` maps ``(flight_id, seat_class)`` to a seat count. A flight row
+        only matches while every requested class still has enough seats, so
+        concurrent buyers can't oversell; if any flight misses, nothing is
+        taken and ``SeatsUnavailable`` is raised. ``reserved`` has the same
+        shape and counts seats that must stay free (other orders' holds).
+        """
+        seats = {key: count for key, count in seats.items() if count > 0}
+        if not seats:
+            return
+        reserved = reserved or {}
+
+        per_flight = cls._seats_per_flight(seats)
+        needed = {key: count + reserved.get(key, 0) for key, count in seats.items()}
+        condition = reduce(or_, (
+            Q(pk=flight_id, **{f'{field}__gte': count for field, count in fields.items()})
+            for flight_id, fields in cls._seats_per_flight(needed).items()
+        ))
+        changes = cls._seat_changes(per_flight, lambda field, delta: F(field) - delta)
+
+        try:
+            with transaction.atomic():
+                if cls.objects.filter(condition).update(**changes) != len(per_flight):
+                    raise SeatsUnavailable(*next(iter(seats)))
+                invalidate_flight_payloads(per_flight)
+        except SeatsUnavailable:
+            current = cls.objects.filter(pk__in=per_flight).values('pk', *cls.SEAT_FIELDS.values())
+            current = {row.pop('pk'): row for row in current}
+            for (flight_id, seat_class), count in needed.items():
+                if current.get(flight_id, {}).get(cls.seat_field(seat_class), 0) < count:
+                    raise SeatsUnavailable(flight_id, seat_class) from None
+            raise
+
+    @classmethod
+    def release_seats(cls, seats):
+        """Give back seats taken by ``reserve_seats``, one UPDATE for all flights."""
+        seats = {key: count for key, count in seats.items() if count > 0}
+        if not seats:
+            return
+        per_flight = cls._seats_per_flight(seats)
+        cls.objects.filter(pk__in=per_flight).update(
+            **cls._seat_changes(per_flight, lambda field, delta: F(field) + delta)
+        )
+        invalidate_flight_payloads(per_flight)
 
     class Meta:
         db_table = 'flight'
         verbose_name = 'Flight'
         verbose_name_plural = 'Flights'
+        indexes = [
+            models.Index(fields=['departure_airport', 'arrival_airport', 'departure_time'], name='flight_route_departure_idx'),
+            models.Index(fields=['arrival_airport', 'departure_time'], name='flight_arrival_departure_idx'),
+            models.Index(fields=['departure_time', 'id'], name='flight_departure_keyset_idx'),
+            models.Index(
+                fields=['departure_time', 'id'], name='flight_scheduled_idx',
+                condition=Q(status='scheduled'),
+            ),
+        ]
 
 
 class Order(models.Model):
@@ -188,6 +439,7 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     tickets_data = models.JSONField(null=True, blank=True, help_text="Stored ticket data for later creation")
+    quoted_fares = models.JSONField(null=True, blank=True, help_text="Fares per flight and seat class when booked")
 
     def clean(self):
         if self.ticket_type == self.TicketType.ROUND_TRIP and not self.return_flight:
@@ -221,68 +473,196 @@ class Order(models.Model):
         if not self.tickets_data:
             raise ValueError("No ticket data found for this order")
 
+        requested = self.requested_seats()
+        # Seats held by other booked orders stay free; this order's own hold is consumed.
+        reserved = holds.held_seats(flight_id for flight_id, _ in requested) - holds.order_holds([self.pk])
+
         with transaction.atomic():
-            for ticket_data in self.tickets_data:
-                direction = ticket_data.get('direction', 'outbound')
-                target_flight = self.return_flight if direction == 'return' else self.flight
-                
-                if not target_flight:
-                    raise ValueError(f"No flight available for {direction} direction.")
-                
-                available_seats = target_flight.get_available_seats(ticket_data['seat_class'])
-                if available_seats <= 0:
-                    flight_name = "return flight" if direction == 'return' else "outbound flight"
-                    raise ValueError(f"{flight_name}: No {ticket_data['seat_class']} seats available.")
-                
-                if not target_flight.book_seat(ticket_data['seat_class']):
-                    flight_name = "return flight" if direction == 'return' else "outbound flight"
-                    raise ValueError(f"{flight_name}: Failed to book {ticket_data['seat_class']} seat.")
-                
-                Ticket.objects.create(
-                    order=self,
-                    seat_number=ticket_data['seat_number'],
-                    seat_class=ticket_data['seat_class'],
-                    direction=Ticket.TicketDirection.OUTBOUND if direction == 'outbound' else Ticket.TicketDirection.RETURN,
-                    price=ticket_data['price']
-                )
-            
-            self.tickets_data = None
-            self.status = self.OrderStatus.CONFIRMED
-            self.save()
-        
+            if not Order.objects.filter(pk=self.pk, status=self.OrderStatus.BOOKED).update(
+                status=self.OrderStatus.CONFIRMED, tickets_data=None
+            ):
+                raise ValueError("Only booked orders can be bought")
+
+            try:
+                Flight.reserve_seats(requested, reserved)
+            except SeatsUnavailable as e:
+                raise ValueError(f"{self.flight_name(e.flight_id)}: No {e.seat_class} seats available.") from e
+
+            for flight in filter(None, (self.flight, self.return_flight)):
+                for seat_class, field in Flight.SEAT_FIELDS.items():
+                    setattr(flight, field, getattr(flight, field) - requested[(flight.pk, seat_class)])
+
+            tickets = []
+            for direction in (Ticket.TicketDirection.OUTBOUND, Ticket.TicketDirection.RETURN):
+                target_flight = self.return_flight if direction == Ticket.TicketDirection.RETURN else self.flight
+                direction_data = [
+                    ticket_data for ticket_data in self.tickets_data
+                    if ticket_data.get('direction', 'outbound') == direction
+                ]
+                if not direction_data:
+                    continue
+
+                try:
+                    seat_numbers = Flight.assign_seats(target_flight.pk, [
+                        (ticket_data['seat_class'], ticket_data.get('seat_number')) for ticket_data in direction_data
+                    ])
+                except ValueError as e:
+                    raise ValueError(f"{direction} flight: {e}") from e
+
+                tickets += [
+                    Ticket(
+                        order=self,
+                        seat_number=seat_number,
+                        seat_class=ticket_data['seat_class'],
+                        direction=direction,
+                        price=ticket_data['price']
+                    )
+                    for ticket_data, seat_number in zip(direction_data, seat_numbers)
+                ]
+
+            Ticket.objects.bulk_create(tickets)
+            transaction.on_commit(lambda: holds.release([self.pk]))
+
+        self.tickets_data = None
+        self.status = self.OrderStatus.CONFIRMED
         return True
 
+    def flight_name(self, flight_id):
+        return "return flight" if self.return_flight_id == flight_id else "outbound flight"
+
+    def requested_seats(self):
+        """Count ``tickets_data`` as ``(flight_id, seat_class) -> seats``."""
+        requested = Counter()
+        for ticket_data in self.tickets_data or []:
+            direction = ticket_data.get('direction', 'outbound')
+            target_flight = self.return_flight if direction == 'return' else self.flight
+
+            if not target_flight:
+                raise ValueError(f"No flight available for {direction} direction.")
+
+            requested[(target_flight.pk, ticket_data['seat_class'])] += 1
+        return requested
+
+    def hold_seats(self):
+        """
+        Hold the requested seats in the cache until the order expires, so a
+        booking is only accepted while ``buy()`` can still seat it.
+        """
+        available = {
+            (flight.pk, seat_class): flight.get_available_seats(seat_class)
+            for flight in filter(None, (self.flight, self.return_flight)) for seat_class in Flight.SEAT_FIELDS
+        }
+        short = holds.place(self.pk, self.requested_seats(), available)
+        if short is not None:
+            flight_id, seat_class = short
+            raise SeatsUnavailable(flight_id, seat_class)
+
     def cancel(self):
-        if self.status == self.OrderStatus.CANCELLED:
+        if self.status == self.OrderStatus.CANCELLED or not Order.cancel_many([self.pk]):
             raise ValueError("Order is already cancelled")
 
-        with transaction.atomic():
-            if self.status == self.OrderStatus.CONFIRMED:
-                for ticket in self.tickets.all():
-                    if ticket.direction == ticket.TicketDirection.OUTBOUND:
-                        if ticket.seat_class == Flight.SeatClass.ECONOMY:
-                            self.flight.economy_seats += 1
-                        elif ticket.seat_class == Flight.SeatClass.BUSINESS:
-                            self.flight.business_seats += 1
-                        elif ticket.seat_class == Flight.SeatClass.FIRST_CLASS:
-                            self.flight.first_class_seats += 1
-                        self.flight.save()
-                    elif ticket.direction == ticket.TicketDirection.RETURN and self.return_flight:
-                        if ticket.seat_class == Flight.SeatClass.ECONOMY:
-                            self.return_flight.economy_seats += 1
-                        elif ticket.seat_class == Flight.SeatClass.BUSINESS:
-                            self.return_flight.business_seats += 1
-                        elif ticket.seat_class == Flight.SeatClass.FIRST_CLASS:
-                            self.return_flight.first_class_seats += 1
-                        self.return_flight.save()
-            elif self.status == self.OrderStatus.BOOKED:
-                self.tickets_data = None
-
-            self.status = self.OrderStatus.CANCELLED
-            self.save()
-        
+        self.tickets_data = None
+        self.status = self.OrderStatus.CANCELLED
         return True
 
+    @classmethod
+    def cancel_many(cls, order_ids, chunk_size=500):
+        """
+        Cancel orders in chunked transactions and return how many were
+        cancelled. Seats of confirmed orders are released with one counter
+        UPDATE per chunk and one seat map write per flight.
+        """
+        cancelled = 0
+        for chunk in chunked(order_ids, chunk_size):
+            with transaction.atomic():
+                locked = dict(
+                    cls.objects.select_for_update().filter(pk__in=chunk)
+                    .exclude(status=cls.OrderStatus.CANCELLED).values_list('pk', 'status')
+                )
+                if not locked:
+                    continue
+                cls.objects.filter(pk__in=locked).update(status=cls.OrderStatus.CANCELLED, tickets_data=None)
+                cancelled += len(locked)
+                transaction.on_commit(lambda pks=list(locked): holds.release(pks))
+
+                confirmed = [pk for pk, status in locked.items() if status == cls.OrderStatus.CONFIRMED]
+                released = Counter()
+                seat_numbers = {}
+                tickets = Ticket.objects.filter(order_id__in=confirmed).values_list(
+                    'order__flight_id', 'order__return_flight_id', 'direction', 'seat_class', 'seat_number'
+                )
+                for flight_id, return_flight_id, direction, seat_class, seat_number in tickets.iterator():
+                    target = return_flight_id if direction == Ticket.TicketDirection.RETURN else flight_id
+                    if not target:
+                        continue
+                    released[(target, seat_class)] += 1
+                    seat_numbers.setdefault(target, []).append(seat_number)
+
+                Flight.release_seats(released)
+                for flight_id, numbers in seat_numbers.items():
+                    Flight.release_seat_numbers(flight_id, numbers)
+        return cancelled
+
+    @classmethod
+    def confirm_many(cls, order_ids, chunk_size=500):
+        """
+        Buy booked orders in chunked transactions, reserving seats and issuing
+        tickets for a whole chunk at once. A chunk that can't be seated in full
+        falls back to ``buy()`` per order. Returns ``(confirmed, failed)``.
+        """
+        confirmed = failed = 0
+        for chunk in chunked(order_ids, chunk_size):
+            try:
+                with transaction.atomic():
+                    rows = list(
+                        cls.objects.select_for_update().filter(pk__in=chunk, status=cls.OrderStatus.BOOKED)
+                        .exclude(tickets_data=None).values_list('pk', 'flight_id', 'return_flight_id', 'tickets_data')
+                    )
+                    requested = Counter()
+                    per_flight = {}
+                    for pk, flight_id, return_flight_id, tickets_data in rows:
+                        for ticket_data in tickets_data:
+                            direction = ticket_data.get('direction', 'outbound')
+                            target = return_flight_id if direction == 'return' else flight_id
+                            if not target:
+                                raise ValueError(f"No flight available for {direction} direction.")
+                            requested[(target, ticket_data['seat_class'])] += 1
+                            per_flight.setdefault(target, []).append((pk, direction, ticket_data))
+
+                    pks = [row[0] for row in rows]
+                    reserved = holds.held_seats(flight_id for flight_id, _ in requested) - holds.order_holds(pks)
+                    Flight.reserve_seats(requested, reserved)
+                    tickets = []
+                    for flight_id, items in per_flight.items():
+                        seat_numbers = Flight.assign_seats(flight_id, [
+                            (ticket_data['seat_class'], ticket_data.get('seat_number')) for _, _, ticket_data in items
+                        ])
+                        tickets += [
+                            Ticket(
+                                order_id=pk,
+                                seat_number=seat_number,
+                                seat_class=ticket_data['seat_class'],
+                                direction=Ticket.TicketDirection.RETURN if direction == 'return' else Ticket.TicketDirection.OUTBOUND,
+                                price=ticket_data['price']
+                            )
+                            for (pk, direction, ticket_data), seat_number in zip(items, seat_numbers)
+                        ]
+                    Ticket.objects.bulk_create(tickets, batch_size=1000)
+                    cls.objects.filter(pk__in=pks).update(status=cls.OrderStatus.CONFIRMED, tickets_data=None)
+                    transaction.on_commit(lambda: holds.release(pks))
+                confirmed += len(rows)
+            except ValueError:
+                orders = cls.objects.select_related('flight', 'return_flight').filter(
+                    pk__in=chunk, status=cls.OrderStatus.BOOKED
+                )
+                for order in orders:
+                    try:
+                        order.buy()
+                        confirmed += 1
+                    except ValueError:
+                        failed += 1
+        return confirmed, failed
+
     def __str__(self):
         return f"Order {self.id} - {self.user.email} - {self.flight.flight_number} ({self.get_ticket_type_display()})"
 
@@ -290,6 +670,11 @@ class Order(models.Model):
         db_table = 'order'
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='order_created_keyset_idx'),
+        ]
 
 
 class Ticket(models.Model):
@@ -302,6 +687,7 @@ class Ticket(models.Model):
     seat_class = models.CharField(max_length=20, choices=Flight.SeatClass.choices)
     direction = models.CharField(max_length=10, choices=TicketDirection.choices, default=TicketDirection.OUTBOUND)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     @property
     def flight(self):
@@ -316,3 +702,7 @@ class Ticket(models.Model):
         db_table = 'ticket'
         verbose_name = 'Ticket'
         verbose_name_plural = 'Tickets'
+        indexes = [
+            models.Index(fields=['order', 'direction'], name='ticket_order_direction_idx'),
+            models.Index(fields=['created_at', 'id'], name='ticket_created_keyset_idx'),
+        ]
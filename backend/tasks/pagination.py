@@ -0,0 +1,233 @@
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which would repeat rows.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    ``?pagination=cursor`` (or any ``?cursor=``) switches to keyset pages:
+    rows are fetched with ``WHERE (ordering columns) > (last row seen)``
+    instead of OFFSET, and no COUNT(*) runs unless ``?count=true``. The
+    ordering comes from ``OrderingFilter`` when ``?ordering=`` is given,
+    otherwise from ``view.keyset_ordering``, and always ends with ``id``.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        page = self.get_keyset_page(queryset, request, view)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.set_page_rows(list(page[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Keyset ``paginate_queryset`` for async views, read with the async ORM."""
+        self.keyset = True
+        page = self.get_keyset_page(queryset, request, view)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.set_page_rows([row async for row in page[:self.page_size + 1]])
+
+    def get_keyset_page(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(request, queryset, view)
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+
+        ordering = [self._invert(field) for field in self.ordering] if self.reverse else self.ordering
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, self.cursor_values))
+        return queryset.order_by(*(self._order_expression(queryset.model, field) for field in ordering))
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param) in ("1", "true", "yes")
+
+    def set_page_rows(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        started = self.cursor_values is not None
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = started, has_more
+        else:
+            self.has_next, self.has_previous = has_more, started
+
+        self.page_rows = rows
+        return rows
+
+    def get_keyset_ordering(self, request, queryset, view):
+        ordering = None
+        if view is not None and request.query_params.get("ordering"):
+            for backend in getattr(view, "filter_backends", ()):
+                if issubclass(backend, OrderingFilter):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    break
+        ordering = [field for field in (ordering or getattr(view, "keyset_ordering", ("-id",))) if field]
+        if ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _order_expression(model, field):
+        name, descending = field.lstrip("-"), field.startswith("-")
+        if not model._meta.get_field(name).null:
+            # A NULLS modifier SQLite's index order doesn't match would force a sort.
+            return F(name).desc() if descending else F(name).asc()
+        return F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+
+    @staticmethod
+    def _after(model, ordering, values):
+        # Lexicographic "row comes after values", with NULLs last ascending
+        # and first descending to match _order_expression.
+        clauses = []
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name, descending = field.lstrip("-"), field.startswith("-")
+            nullable = model._meta.get_field(name).null
+            if value is None:
+                same = Q(**{f"{name}__isnull": True})
+                after = Q(**{f"{name}__isnull": False}) if descending else None
+            else:
+                same = Q(**{name: value})
+                after = Q(**{f"{name}__lt" if descending else f"{name}__gt": value})
+                if nullable and not descending:
+                    after |= Q(**{f"{name}__isnull": True})
+            if after is not None:
+                clauses.append(equal & after)
+            equal &= same
+        return reduce(or_, clauses) if clauses else Q(pk__in=[])
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values, reverse = data["v"], bool(data.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, field.lstrip("-")) for field in self.ordering]
+        data = json.dumps({"v": values, "r": reverse}, cls=CursorEncoder, separators=(",", ":"))
+        url = replace_query_param(self.base_url, self.cursor_query_param, base64.urlsafe_b64encode(data.encode()).decode())
+        return remove_query_param(url, self.mode_query_param)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.encode_cursor(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(self.get_keyset_data(data))
+
+    def get_keyset_data(self, data):
+        response = {"next": self.get_next_link(), "previous": self.get_previous_link()}
+        if self.count is not None:
+            response["count"] = self.count
+        response["results"] = data
+        return response
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                "name": self.mode_query_param, "required": False, "in": "query",
+                "description": "Set to 'cursor' for keyset pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param, "required": False, "in": "query",
+                "description": "Keyset pagination cursor from a next/previous link.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.count_query_param, "required": False, "in": "query",
+                "description": "Include an exact count in keyset mode.",
+                "schema": {"type": "boolean"},
+            },
+        ]
+        return parameters
+
+
+def estimated_count(model, using="default"):
+    """The planner's row estimate for ``model``'s table on PostgreSQL, else ``None``."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed.
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator that takes the row count of an unfiltered
+    table from the planner statistics instead of COUNT(*) once the table
+    holds more than ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows. Filtered
+    lists, small tables and other databases are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where and not query.combinator and not query.is_sliced:
+            estimate = estimated_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,236 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Flight
+
+VERSION_KEY = "tasks:route-index:version"
+CHANGE_KEY = "tasks:route-index:change:{}"
+CHANGE_TTL = 60 * 60
+MAX_REPLAY = 500
+MAX_AGE = timedelta(hours=1)
+# Searches repeated by find_itineraries while candidates include flights that can't be booked.
+MAX_SEARCH_ROUNDS = 4
+
+BOOKABLE_STATUSES = (Flight.FlightStatus.SCHEDULED, Flight.FlightStatus.DELAYED)
+
+Edge = namedtuple("Edge", "departure_time flight_id arrival_time origin destination")
+
+
+def min_connection():
+    return timedelta(minutes=settings.ROUTE_MIN_CONNECTION_MINUTES)
+
+
+def max_connection():
+    return timedelta(hours=settings.ROUTE_MAX_CONNECTION_HOURS)
+
+
+class RouteIndex:
+    """
+    Time-expanded adjacency index of bookable flights, per process.
+    Flights without a free seat in any class are left out.
+
+    Departures are kept per airport sorted by time, so expanding a connection
+    is a bisect instead of a query. Flight saves/deletes are applied locally and
+    published to the shared cache as a numbered change log that other
+    processes replay; a gap in the log falls back to a full rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._departures = None
+        self._edges = {}
+        self.version = None
+        self.built_at = None
+
+    def _edge_from_row(self, row):
+        flight_id, origin, destination, departure_time, arrival_time, status, *seats = row
+        if status not in BOOKABLE_STATUSES or departure_time < timezone.now() or not any(seats):
+            return None
+        return Edge(departure_time, flight_id, arrival_time, origin, destination)
+
+    def _rows(self, queryset):
+        return queryset.values_list(
+            "id", "departure_airport_id", "arrival_airport_id", "departure_time", "arrival_time", "status",
+            *Flight.SEAT_FIELDS.values(),
+        )
+
+    def rebuild(self):
+        version = cache.get(VERSION_KEY)
+        departures, edges = {}, {}
+        queryset = Flight.objects.filter(status__in=BOOKABLE_STATUSES, departure_time__gte=timezone.now())
+        for row in self._rows(queryset).iterator():
+            edge = self._edge_from_row(row)
+            if edge is None:
+                continue
+            edges[edge.flight_id] = edge
+            departures.setdefault(edge.origin, []).append(edge)
+        for airport_edges in departures.values():
+            airport_edges.sort()
+        with self._lock:
+            self._departures, self._edges, self.version = departures, edges, version
+            self.built_at = timezone.now()
+
+    def _remove(self, flight_id):
+        edge = self._edges.pop(flight_id, None)
+        if edge is None:
+            return
+        airport_edges = self._departures.get(edge.origin, [])
+        position = bisect_left(airport_edges, edge)
+        if position < len(airport_edges) and airport_edges[position] == edge:
+            del airport_edges[position]
+
+    def refresh(self, flight_ids):
+        flight_ids = set(flight_ids)
+        rows = {row[0]: row for row in self._rows(Flight.objects.filter(pk__in=flight_ids))}
+        with self._lock:
+            if self._departures is None:
+                return
+            for flight_id in flight_ids:
+                self._remove(flight_id)
+                edge = self._edge_from_row(rows[flight_id]) if flight_id in rows else None
+                if edge:
+                    self._edges[flight_id] = edge
+                    insort(self._departures.setdefault(edge.origin, []), edge)
+
+    def publish(self, flight_id):
+        self.publish_many([flight_id])
+
+    def publish_many(self, flight_ids):
+        """
+        Apply and publish changes to ``flight_ids``; ``None`` (or more ids
+        than other processes would replay) publishes a gap in the change log
+        so every process rebuilds instead.
+        """
+        flight_ids = None if flight_ids is None else list(flight_ids)
+        if flight_ids == []:
+            return
+        rebuild = flight_ids is None or len(flight_ids) > MAX_REPLAY
+        if rebuild:
+            if self._departures is not None:
+                self.rebuild()
+        else:
+            self.refresh(flight_ids)
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            version = cache.incr(VERSION_KEY, MAX_REPLAY + 1 if rebuild else len(flight_ids))
+        except ValueError:
+            return
+        if not rebuild:
+            first = version - len(flight_ids) + 1
+            cache.set_many(
+                {CHANGE_KEY.format(first + offset): flight_id for offset, flight_id in enumerate(flight_ids)},
+                timeout=CHANGE_TTL,
+            )
+
+    def sync(self):
+        if self._departures is None or timezone.now() - self.built_at > MAX_AGE:
+            self.rebuild()
+            return
+        remote = cache.get(VERSION_KEY)
+        if remote is None or remote == self.version:
+            return
+        if self.version is None or remote < self.version or remote - self.version > MAX_REPLAY:
+            self.rebuild()
+            return
+        keys = [CHANGE_KEY.format(version) for version in range(self.version + 1, remote + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.rebuild()
+            return
+        self.refresh(changes.values())
+        self.version = remote
+
+    def departures_from(self, airport_id, earliest, latest, exclude=frozenset()):
+        airport_edges = self._departures.get(airport_id, ())
+        start = bisect_left(airport_edges, (earliest,))
+        for edge in airport_edges[start:]:
+            if edge.departure_time > latest:
+                break
+            if edge.flight_id not in exclude:
+                yield edge
+
+    def search(self, origin, destination, earliest, latest, max_legs=3, limit=5, exclude=frozenset()):
+        """
+        Return up to ``limit`` itineraries (tuples of ``Edge``) from ``origin``
+        to ``destination`` whose first leg departs between ``earliest`` and
+        ``latest``, earliest arrival first and fewer legs on ties. Flights in
+        ``exclude`` are never used.
+        """
+        self.sync()
+        min_gap, max_gap = min_connection(), max_connection()
+        settled = {}
+        heap = []
+        itineraries = []
+        with self._lock:
+            for edge in self.departures_from(origin, earliest, latest, exclude):
+                heapq.heappush(heap, (edge.arrival_time, 1, edge.departure_time, edge.flight_id, (edge,)))
+
+            while heap and len(itineraries) < limit:
+                arrival_time, legs, _, _, path = heapq.heappop(heap)
+                airport = path[-1].destination
+                if airport == destination:
+                    itineraries.append(path)
+                    continue
+                if legs >= max_legs or settled.get(airport, 0) >= limit:
+                    continue
+                settled[airport] = settled.get(airport, 0) + 1
+                visited = {origin, *(edge.destination for edge in path)}
+                for edge in self.departures_from(airport, arrival_time + min_gap, arrival_time + max_gap, exclude):
+                    if edge.destination not in visited:
+                        heapq.heappush(
+                            heap, (edge.arrival_time, legs + 1, path[0].departure_time, edge.flight_id, path + (edge,))
+                        )
+        return itineraries
+
+
+route_index = RouteIndex()
+
+
+def find_itineraries(queryset, origin, destination, earliest, latest, max_legs=3, limit=5,
+                     seat_class=None, passengers=1):
+    """
+    Search the index, then load only the flights on candidate itineraries.
+    Flights that are no longer bookable or lack seats are excluded and the
+    search runs again, so they can't crowd out itineraries ranked after them.
+    """
+    def has_seats(flight):
+        if seat_class:
+            return flight.get_available_seats(seat_class) >= passengers
+        return sum(getattr(flight, field) for field in Flight.SEAT_FIELDS.values()) >= passengers
+
+    flights, excluded = {}, set()
+    for _ in range(MAX_SEARCH_ROUNDS):
+        candidates = route_index.search(
+            origin, destination, earliest, latest, max_legs, limit * 3, frozenset(excluded)
+        )
+        flight_ids = {edge.flight_id for itinerary in candidates for edge in itinerary}
+        flights.update(queryset.filter(status__in=BOOKABLE_STATUSES).in_bulk(flight_ids - flights.keys()))
+        unusable = {
+            flight_id for flight_id in flight_ids if flight_id not in flights or not has_seats(flights[flight_id])
+        }
+        if not unusable:
+            break
+        excluded |= unusable
+
+    itineraries = []
+    for itinerary in candidates:
+        legs = [flights.get(edge.flight_id) for edge in itinerary]
+        if not all(legs) or not all(map(has_seats, legs)):
+            continue
+        itineraries.append({
+            "legs": legs,
+            "departure_time": legs[0].departure_time,
+            "arrival_time": legs[-1].arrival_time,
+            "connections": len(legs) - 1,
+            "duration_minutes": int((legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60),
+        })
+        if len(itineraries) == limit:
+            break
+    return itineraries
@@ -0,0 +1,131 @@
+import base64
+
+SEAT_LETTERS = "ABCDEFGHJK"
+CABIN_ORDER = ("first_class", "business", "economy")
+
+
+class SeatTaken(ValueError):
+    def __init__(self, seat_number):
+        self.seat_number = seat_number
+        super().__init__(f"Seat {seat_number} is already taken.")
+
+
+class SeatLayout:
+    """
+    Row/letter layout of an airplane, cabins front to back in ``CABIN_ORDER``.
+
+    Every seat gets a stable bit index in that order, which is what the
+    per-flight occupancy bitmap is keyed on.
+    """
+
+    def __init__(self, cabins):
+        self.labels = []
+        self.classes = []
+        self.index = {}
+        self.cabins = []
+        self.preference = {}
+
+        row = 1
+        for seat_class, total, per_row in cabins:
+            if not total:
+                continue
+            per_row = max(1, min(per_row or 1, len(SEAT_LETTERS)))
+            letters = SEAT_LETTERS[:per_row]
+            start = len(self.labels)
+            ranked = []
+            for offset in range(total):
+                seat_row, position = row + offset // per_row, offset % per_row
+                label = f"{seat_row}{letters[position]}"
+                self.index[label] = len(self.labels)
+                self.labels.append(label)
+                self.classes.append(seat_class)
+                ranked.append((seat_row, self._position_rank(position, per_row), len(self.labels) - 1))
+            last_row = row + (total - 1) // per_row
+            self.cabins.append({
+                "seat_class": seat_class,
+                "first_row": row,
+                "last_row": last_row,
+                "letters": letters,
+                "seats": total,
+                "start": start,
+            })
+            self.preference[seat_class] = [index for _, _, index in sorted(ranked)]
+            row = last_row + 1
+
+    @staticmethod
+    def _position_rank(position, per_row):
+        if position in (0, per_row - 1):
+            return 0
+        if per_row >= 4 and position in (per_row // 2 - 1, per_row // 2):
+            return 1
+        return 2
+
+    @classmethod
+    def for_airplane(cls, airplane):
+        return cls([
+            (seat_class, getattr(airplane, f"{seat_class}_seats"), getattr(airplane, f"{seat_class}_seats_per_row"))
+            for seat_class in CABIN_ORDER
+        ])
+
+    @property
+    def size(self):
+        return len(self.labels)
+
+    def seat_index(self, seat_number, seat_class=None):
+        index = self.index.get(str(seat_number).upper())
+        if index is None:
+            raise ValueError(f"Seat {seat_number} does not exist on this airplane.")
+        if seat_class and self.classes[index] != seat_class:
+            raise ValueError(f"Seat {seat_number} is not a {seat_class} seat.")
+        return index
+
+
+class SeatMap:
+    """Occupancy bitmap of a flight; bit ``i`` is ``bits[i >> 3] & (0x80 >> (i & 7))``."""
+
+    def __init__(self, layout, occupancy=None):
+        self.layout = layout
+        self.bits = bytearray(occupancy or b"")
+        size = (layout.size + 7) // 8
+        if len(self.bits) < size:
+            self.bits.extend(bytes(size - len(self.bits)))
+
+    def _taken(self, index):
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def _set(self, index, taken):
+        if taken:
+            self.bits[index >> 3] |= 0x80 >> (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(0x80 >> (index & 7)) & 0xFF
+
+    def is_taken(self, seat_number):
+        return self._taken(self.layout.seat_index(seat_number))
+
+    def take(self, seat_number, seat_class=None):
+        index = self.layout.seat_index(seat_number, seat_class)
+        if self._taken(index):
+            raise SeatTaken(self.layout.labels[index])
+        self._set(index, True)
+        return self.layout.labels[index]
+
+    def release(self, seat_number):
+        index = self.layout.index.get(str(seat_number).upper())
+        if index is not None:
+            self._set(index, False)
+
+    def assign(self, seat_class):
+        for index in self.layout.preference.get(seat_class, ()):
+            if not self._taken(index):
+                self._set(index, True)
+                return self.layout.labels[index]
+        raise ValueError(f"No free {seat_class} seat left on the seat map.")
+
+    def free_count(self, seat_class):
+        return sum(1 for index in self.layout.preference.get(seat_class, ()) if not self._taken(index))
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def to_base64(self):
+        return base64.b64encode(self.bits).decode("ascii")
@@ -1,13 +1,79 @@
+from collections import namedtuple
+
 from rest_framework import serializers
-from .models import Country, Airport, Airline, Airplane, Flight, Order, Ticket
+from rest_framework.permissions import SAFE_METHODS
+from .models import Country, Airport, Airline, Airplane, Flight, Order, Ticket, SeatsUnavailable, SEAT_CONFIG_LOCKED
+from . import fares, holds
 from users.serializers import UserProfileSerializer
 from django.db import transaction
-from .cancel_order import cancel_unpaid_order
+
+FlightRepresentation = namedtuple("FlightRepresentation", "fields expand compact")
+
+FLIGHT_RELATIONS = ("airplane", "departure_airport", "arrival_airport")
+
+
+def _param_set(request, name):
+    value = request.query_params.get(name, "")
+    return frozenset(item.strip() for item in value.split(",") if item.strip())
+
+
+def flight_representation(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return FlightRepresentation(frozenset(), frozenset(), False)
+    return FlightRepresentation(
+        fields=_param_set(request, "fields"),
+        expand=_param_set(request, "expand") & set(FLIGHT_RELATIONS),
+        compact=request.query_params.get("compact") in ("1", "true", "yes"),
+    )
+
+
+def seat_availability(flight, context):
+    availability = {
+        'economy': flight.economy_seats,
+        'business': flight.business_seats,
+        'first_class': flight.first_class_seats
+    }
+    # Views that cache payloads ask for raw counters and subtract holds per response.
+    if not context.get("raw_seat_availability"):
+        held = holds.held_seats([flight.pk])
+        for seat_class in availability:
+            availability[seat_class] = max(availability[seat_class] - held[(flight.pk, seat_class)], 0)
+    return availability
+
+
+class FlightListSerializer(serializers.ListSerializer):
+    """Price every flight of a page with one ``fares.quote()`` call before serializing them."""
+
+    def to_representation(self, data):
+        flights = list(data.all() if hasattr(data, "all") else data)
+        if "fares" in self.child.fields:
+            self.context["fares"] = fares.quote(flights)
+        return super().to_representation(flights)
+
+
+def flight_fares(flight, context):
+    quoted = context.get("fares", {}).get(flight.pk) or fares.quote([flight])[flight.pk]
+    return {seat_class: f"{fare:.2f}" for seat_class, fare in quoted.items()}
+
+
+class SparseFieldsetMixin:
+    """Drop top-level fields not listed in ``?fields=`` on read requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        fields = _param_set(request, "fields")
+        if fields:
+            for name in set(self.fields) - fields - {"id"}:
+                self.fields.pop(name)
+
 
 class CountrySerializer(serializers.ModelSerializer):
     class Meta:
         model = Country
-        fields = ["id", "slug", "name"]
+        fields = ["id", "slug", "name", "code"]
         read_only_fields = ["id", "slug"]
 
 
@@ -19,7 +85,7 @@ class AirportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Airport
-        fields = ["id", "slug", "name", "city", "country", "country_id"]
+        fields = ["id", "slug", "name", "city", "code", "country", "country_id"]
         read_only_fields = ["id", "slug"]
 
 
@@ -31,7 +97,7 @@ class AirlineSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Airline
-        fields = ["id", "slug", "name", "airport", "airport_id"]
+        fields = ["id", "slug", "name", "code", "airport", "airport_id"]
         read_only_fields = ["id", "slug"]
 
 
@@ -46,12 +112,21 @@ class AirplaneSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airplane
         fields = [
-            "id", "slug", "model", "capacity", "airline", "airline_id",
+            "id", "slug", "model", "registration", "capacity", "airline", "airline_id",
             "economy_seats", "business_seats", "first_class_seats",
+            "economy_seats_per_row", "business_seats_per_row", "first_class_seats_per_row",
             "total_seats", "seat_configuration"
         ]
         read_only_fields = ["id", "slug", "total_seats", "seat_configuration"]
         
+    def validate(self, attrs):
+        instance = self.instance
+        if instance and any(
+            field in attrs and attrs[field] != getattr(instance, field) for field in Airplane.SEAT_CONFIG_FIELDS
+        ) and instance.has_bookings():
+            raise serializers.ValidationError(SEAT_CONFIG_LOCKED)
+        return attrs
+
     def get_seat_configuration(self, obj):
         return obj.get_seat_configuration()
     
@@ -59,11 +134,12 @@ class AirplaneSerializer(serializers.ModelSerializer):
         return obj.get_total_seats()
 
 
-class FlightSerializer(serializers.ModelSerializer):
+class FlightSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     airplane = AirplaneSerializer(read_only=True)
     departure_airport = AirportSerializer(read_only=True)
     arrival_airport = AirportSerializer(read_only=True)
     seat_availability = serializers.SerializerMethodField()
+    fares = serializers.SerializerMethodField()
     
     airplane_id = serializers.PrimaryKeyRelatedField(
         queryset=Airplane.objects.all(), source="airplane", write_only=True
@@ -81,18 +157,183 @@ class FlightSerializer(serializers.ModelSerializer):
             "id", "flight_number", "airplane", "airplane_id", "departure_airport", 
             "departure_airport_id", "arrival_airport", "arrival_airport_id",
             "departure_time", "arrival_time", "status", "economy_seats", "business_seats", 
-            "first_class_seats", "seat_availability"
+            "first_class_seats", "seat_availability", "base_fare", "fares"
         ]
         read_only_fields = ("id", "economy_seats", "business_seats", "first_class_seats")
+        list_serializer_class = FlightListSerializer
+
+    def validate(self, attrs):
+        instance = self.instance
+        if (
+            instance and "airplane" in attrs and attrs["airplane"].pk != instance.airplane_id
+            and instance.has_bookings()
+        ):
+            raise serializers.ValidationError({"airplane_id": SEAT_CONFIG_LOCKED})
+        return attrs
 
     def get_seat_availability(self, obj):
-        return {
-            'economy': obj.economy_seats,
-            'business': obj.business_seats,
-            'first_class': obj.first_class_seats
+        return seat_availability(obj, self.context)
+
+    def get_fares(self, obj):
+        return flight_fares(obj, self.context)
+
+
+class CompactAirportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Airport
+        fields = ["id", "slug", "name", "city", "country"]
+        read_only_fields = fields
+
+
+class CompactAirlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Airline
+        fields = ["id", "slug", "name", "airport"]
+        read_only_fields = fields
+
+
+class CompactAirplaneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Airplane
+        fields = [
+            "id", "slug", "model", "capacity", "airline",
+            "economy_seats", "business_seats", "first_class_seats"
+        ]
+        read_only_fields = fields
+
+
+class CompactFlightSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Flight with related objects as ids; the view side-loads them once per
+    page in an ``included`` block. Relations listed in ``?expand=`` are
+    nested in full instead.
+    """
+    seat_availability = serializers.SerializerMethodField()
+    fares = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Flight
+        fields = [
+            "id", "flight_number", "airplane", "departure_airport", "arrival_airport",
+            "departure_time", "arrival_time", "status", "economy_seats", "business_seats",
+            "first_class_seats", "seat_availability", "fares"
+        ]
+        read_only_fields = fields
+        list_serializer_class = FlightListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = flight_representation(self.context.get("request")).expand
+        nested = {
+            "airplane": AirplaneSerializer,
+            "departure_airport": AirportSerializer,
+            "arrival_airport": AirportSerializer,
         }
-    
-    
+        for name in expand & set(self.fields):
+            self.fields[name] = nested[name](read_only=True)
+
+    def get_seat_availability(self, obj):
+        return seat_availability(obj, self.context)
+
+    def get_fares(self, obj):
+        return flight_fares(obj, self.context)
+
+
+def build_included(flights, representation):
+    """
+    Serialize every airplane, airline, airport and country referenced by
+    ``flights`` once, with one ``in_bulk`` query per model.
+    """
+    fields = representation.fields
+    wanted = [
+        name for name in FLIGHT_RELATIONS
+        if name not in representation.expand and (not fields or name in fields)
+    ]
+    airplane_ids = {flight.airplane_id for flight in flights} if "airplane" in wanted else set()
+    airport_ids = {
+        getattr(flight, f"{name}_id") for flight in flights for name in wanted if name != "airplane"
+    }
+
+    airplanes = Airplane.objects.in_bulk(airplane_ids)
+    airlines = Airline.objects.in_bulk({airplane.airline_id for airplane in airplanes.values()})
+    airport_ids |= {airline.airport_id for airline in airlines.values()}
+    airports = Airport.objects.in_bulk(airport_ids)
+    countries = Country.objects.in_bulk({airport.country_id for airport in airports.values()})
+
+    return {
+        "airplanes": CompactAirplaneSerializer(airplanes.values(), many=True).data,
+        "airlines": CompactAirlineSerializer(airlines.values(), many=True).data,
+        "airports": CompactAirportSerializer(airports.values(), many=True).data,
+        "countries": CountrySerializer(countries.values(), many=True).data,
+    }
+
+
+class FlightSeatMapSerializer(serializers.ModelSerializer):
+    seat_count = serializers.SerializerMethodField()
+    cabins = serializers.SerializerMethodField()
+    occupancy = serializers.SerializerMethodField()
+    seat_availability = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Flight
+        fields = ["id", "flight_number", "seat_count", "cabins", "occupancy", "seat_availability"]
+        read_only_fields = fields
+
+    def get_seat_count(self, obj):
+        return obj.seat_layout.size
+
+    def get_cabins(self, obj):
+        return obj.seat_layout.cabins
+
+    def get_occupancy(self, obj):
+        return obj.get_seat_map().to_base64()
+
+    def get_seat_availability(self, obj):
+        return seat_availability(obj, self.context)
+
+
+class RouteSearchSerializer(serializers.Serializer):
+    departure_airport = serializers.PrimaryKeyRelatedField(queryset=Airport.objects.all())
+    arrival_airport = serializers.PrimaryKeyRelatedField(queryset=Airport.objects.all())
+    date = serializers.DateField(required=False)
+    max_legs = serializers.IntegerField(min_value=1, max_value=4, default=3)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=5)
+    seat_class = serializers.ChoiceField(choices=Flight.SeatClass.choices, required=False)
+    passengers = serializers.IntegerField(min_value=1, max_value=9, default=1)
+
+    def validate(self, attrs):
+        if attrs['departure_airport'] == attrs['arrival_airport']:
+            raise serializers.ValidationError("Departure and arrival airports must be different.")
+        return attrs
+
+
+class FlightSearchSerializer(serializers.Serializer):
+    """Query parameters of the async flight search. Airports are plain ids, so validation runs no queries."""
+    departure_airport = serializers.IntegerField(required=False)
+    arrival_airport = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Flight.FlightStatus.choices, required=False)
+
+
+class RouteCalendarSerializer(serializers.Serializer):
+    departure_airport = serializers.PrimaryKeyRelatedField(queryset=Airport.objects.all())
+    arrival_airport = serializers.PrimaryKeyRelatedField(queryset=Airport.objects.all())
+    month = serializers.DateField(input_formats=["%Y-%m"], required=False)
+
+    def validate(self, attrs):
+        if attrs['departure_airport'] == attrs['arrival_airport']:
+            raise serializers.ValidationError("Departure and arrival airports must be different.")
+        return attrs
+
+
+class ItinerarySerializer(serializers.Serializer):
+    legs = FlightSerializer(many=True, read_only=True)
+    departure_time = serializers.DateTimeField(read_only=True)
+    arrival_time = serializers.DateTimeField(read_only=True)
+    connections = serializers.IntegerField(read_only=True)
+    duration_minutes = serializers.IntegerField(read_only=True)
+
+
 class TicketSerializer(serializers.ModelSerializer):
     flight = serializers.SerializerMethodField()
     
@@ -136,9 +377,11 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = [
             "id", "user", "flight", "flight_id", "return_flight", "return_flight_id",
             "ticket_type", "status", "total_price", "created_at", "tickets", "tickets_data",
-            "is_one_way", "is_round_trip"
+            "is_one_way", "is_round_trip", "quoted_fares"
         ]
-        read_only_fields = ("id", "user", "total_price", "created_at", "tickets", "is_one_way", "is_round_trip")
+        read_only_fields = (
+            "id", "user", "total_price", "created_at", "tickets", "is_one_way", "is_round_trip", "quoted_fares"
+        )
 
     def create(self, validated_data):
         user = self.context['request'].user
@@ -151,26 +394,56 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("At least one ticket is required.")
         
         total_price = 0
-        
+        quoted = fares.quote(filter(None, (flight, return_flight)))
+        priced_tickets = []
+        chosen_seats = set()
+
         for ticket_data in tickets_data:
             direction = ticket_data.get('direction', 'outbound')
             target_flight = return_flight if direction == 'return' else flight
             
             if not target_flight:
                 raise serializers.ValidationError(f"No flight available for {direction} direction.")
-            
-            available_seats = target_flight.get_available_seats(ticket_data['seat_class'])
-            if available_seats <= 0:
-                flight_name = "return flight" if direction == 'return' else "outbound flight"
-                raise serializers.ValidationError(f"{flight_name}: No {ticket_data['seat_class']} seats available.")
-            
-            total_price += ticket_data['price']
-        
-        order = Order.objects.create(
-            user=user, flight=flight, return_flight=return_flight,
-            ticket_type=ticket_type, status=Order.OrderStatus.BOOKED,
-            total_price=total_price, tickets_data=tickets_data
-        )
+
+            flight_name = "return flight" if direction == 'return' else "outbound flight"
+            fare = quoted[target_flight.pk].get(ticket_data.get('seat_class'))
+            if fare is None:
+                raise serializers.ValidationError(f"{flight_name}: Unknown seat class {ticket_data.get('seat_class')}.")
+
+            if ticket_data.get('seat_number'):
+                try:
+                    if target_flight.get_seat_map().is_taken(ticket_data['seat_number']):
+                        raise serializers.ValidationError(
+                            f"{flight_name}: Seat {ticket_data['seat_number']} is already taken."
+                        )
+                    target_flight.seat_layout.seat_index(ticket_data['seat_number'], ticket_data['seat_class'])
+                except ValueError as e:
+                    raise serializers.ValidationError(f"{flight_name}: {e}")
+                seat = (direction, str(ticket_data['seat_number']).upper())
+                if seat in chosen_seats:
+                    raise serializers.ValidationError(
+                        f"{flight_name}: Seat {ticket_data['seat_number']} is requested twice."
+                    )
+                chosen_seats.add(seat)
+
+            # Prices are always the server's quote, whatever the client sent.
+            priced_tickets.append({**ticket_data, 'price': str(fare)})
+            total_price += fare
         
-        cancel_unpaid_order.apply_async((order.id,), countdown=60)
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user, flight=flight, return_flight=return_flight,
+                ticket_type=ticket_type, status=Order.OrderStatus.BOOKED,
+                total_price=total_price, tickets_data=priced_tickets,
+                quoted_fares={
+                    str(flight_id): {seat_class: str(fare) for seat_class, fare in classes.items()}
+                    for flight_id, classes in quoted.items()
+                }
+            )
+            try:
+                order.hold_seats()
+            except SeatsUnavailable as e:
+                raise serializers.ValidationError(
+                    f"{order.flight_name(e.flight_id)}: No {e.seat_class} seats available."
+                )
         return order
\ No newline at end of file
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching
+from .models import Country, Airport, Airline, Airplane, Flight
+from .routing import route_index
+
+SEAT_ONLY_FIELDS = frozenset(Flight.SEAT_FIELDS.values()) | {'seat_map'}
+
+
+def _flight_state(instance):
+    return {field: getattr(instance, field) for field in caching.LIST_FIELDS}
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def publish_flight_change(sender, instance, **kwargs):
+    flight_id = instance.pk
+    transaction.on_commit(lambda: route_index.publish(flight_id))
+
+
+@receiver(pre_save, sender=Flight)
+def remember_flight_state(sender, instance, update_fields=None, **kwargs):
+    instance._cached_state = None
+    if instance._state.adding or (update_fields and SEAT_ONLY_FIELDS.issuperset(update_fields)):
+        return
+    instance._cached_state = Flight.objects.filter(pk=instance.pk).values(*caching.LIST_FIELDS).first()
+
+
+@receiver(post_save, sender=Flight)
+def invalidate_saved_flight(sender, instance, update_fields=None, **kwargs):
+    if update_fields and SEAT_ONLY_FIELDS.issuperset(update_fields):
+        caching.invalidate_flight_payloads([instance.pk])
+    else:
+        caching.invalidate_flight(instance.pk, getattr(instance, '_cached_state', None), _flight_state(instance))
+
+
+@receiver(post_delete, sender=Flight)
+def invalidate_deleted_flight(sender, instance, **kwargs):
+    caching.invalidate_flight(instance.pk, _flight_state(instance))
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=Airport)
+@receiver([post_save, post_delete], sender=Airline)
+@receiver([post_save, post_delete], sender=Airplane)
+def invalidate_reference_data(sender, **kwargs):
+    caching.invalidate_all()
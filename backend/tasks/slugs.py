@@ -0,0 +1,33 @@
+from django.utils.text import slugify
+
+
+class SlugAllocator:
+    """
+    Hands out unique slugs against a set of taken ones: ``central``,
+    ``central-2``, ``central-3``... truncated to fit ``max_length``.
+    """
+
+    def __init__(self, taken=(), max_length=50):
+        self.taken = set(taken)
+        self.max_length = max_length
+        self._next = {}
+
+    def allocate(self, value, fallback="item"):
+        base = (slugify(value) or slugify(fallback) or "item")[:self.max_length].strip("-")
+        slug, number = base, self._next.get(base, 2)
+        while slug in self.taken:
+            suffix = f"-{number}"
+            slug = f"{base[:self.max_length - len(suffix)].rstrip('-')}{suffix}"
+            number += 1
+        self._next[base] = number
+        self.taken.add(slug)
+        return slug
+
+
+def unique_slug(instance, value, fallback="item"):
+    """Allocate a slug for one ``instance``, reading only the slugs sharing its prefix."""
+    model = type(instance)
+    max_length = model._meta.get_field("slug").max_length
+    prefix = (slugify(value) or slugify(fallback) or "item")[:max_length - 4]
+    taken = model.objects.filter(slug__startswith=prefix).exclude(pk=instance.pk).values_list("slug", flat=True)
+    return SlugAllocator(taken, max_length).allocate(value, fallback)
@@ -1,3 +1,1631 @@
-from django.test import TestCase
+import base64
+import calendar
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from conf.db_router import PIN_COOKIE, PrimaryReplicaRouter, pin_key, replica_alias
+from conf.instrumentation import RequestMetrics, current_metrics, install, route_histograms
+from users.models import User
+from .models import Country, Airport, Airline, Airplane, Flight, Order, Ticket, SeatsUnavailable
+from . import caching, fares, holds
+from .cancel_order import cancel_unpaid_order, sweep_expired_orders
+from .calendars import route_calendar
+from .management.commands._bench import dechunk, percentile
+from .management.commands.seed import ID_BLOCK
+from .routing import find_itineraries, route_index
+from .pagination import EstimatedCountPaginator, estimated_count
+from .serializers import FlightRepresentation, build_included
+from .views import FlightViewSet
+
+
+class FlightDataMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(name="Ukraine")
+        cls.kyiv = Airport.objects.create(name="Boryspil", city="Kyiv", country=cls.country)
+        cls.lviv = Airport.objects.create(name="Danylo Halytskyi", city="Lviv", country=cls.country)
+        cls.airline = Airline.objects.create(name="Sky", airport=cls.kyiv)
+        cls.airplane = Airplane.objects.create(
+            model="A320", airline=cls.airline, economy_seats=120, business_seats=12, first_class_seats=4
+        )
+        cls.user = User.objects.create_user(email="client@example.com", username="client", password="secret")
+        cls.admin = User.objects.create_user(
+            email="admin@example.com", username="admin", password="secret", is_staff=True
+        )
+
+    @classmethod
+    def create_flight(cls, number, origin, destination, departs_in=timedelta(days=10)):
+        departure = timezone.now() + departs_in
+        return Flight.objects.create(
+            flight_number=number, airplane=cls.airplane,
+            departure_airport=origin, arrival_airport=destination,
+            departure_time=departure, arrival_time=departure + timedelta(hours=2),
+        )
+
+    @classmethod
+    def create_orders(cls, count, tickets_per_order, user=None):
+        orders = []
+        for _ in range(count):
+            outbound = cls.create_flight(f"OUT{Flight.objects.count()}", cls.kyiv, cls.lviv)
+            inbound = cls.create_flight(
+                f"RET{Flight.objects.count()}", cls.lviv, cls.kyiv, departs_in=timedelta(days=12)
+            )
+            order = Order.objects.create(
+                user=user or cls.user, flight=outbound, return_flight=inbound,
+                ticket_type=Order.TicketType.ROUND_TRIP, status=Order.OrderStatus.CONFIRMED, total_price=0,
+            )
+            Ticket.objects.bulk_create(
+                Ticket(
+                    order=order, seat_number=f"{seat + 1}A", seat_class=Flight.SeatClass.ECONOMY, price=100,
+                    direction=Ticket.TicketDirection.RETURN if seat % 2 else Ticket.TicketDirection.OUTBOUND,
+                )
+                for seat in range(tickets_per_order)
+            )
+            orders.append(order)
+        return orders
+
+
+class OrderQueryBudgetTests(FlightDataMixin, TestCase):
+    # COUNT(*), orders joined with both flights' airplane/airline/airports/countries, tickets prefetch.
+    LIST_QUERIES = 3
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_does_not_grow_with_orders(self):
+        self.create_orders(1, 1)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get("/api/flight/orders/")
+        self.assertEqual(response.status_code, 200)
+
+        self.create_orders(15, 2)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get("/api/flight/orders/")
+        self.assertEqual(response.data["count"], 16)
+
+    def test_list_query_count_does_not_grow_with_tickets(self):
+        self.create_orders(3, 9)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get("/api/flight/orders/")
+        self.assertEqual(sum(len(order["tickets"]) for order in response.data["results"]), 27)
+
+    def test_staff_list_uses_the_same_budget(self):
+        self.create_orders(5, 3)
+        self.create_orders(5, 3, user=self.admin)
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get("/api/flight/orders/")
+        self.assertEqual(response.data["count"], 10)
+
+    def test_detail_query_count(self):
+        order, = self.create_orders(1, 9)
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/flight/orders/{order.pk}/")
+        self.assertEqual(len(response.data["tickets"]), 9)
+        self.assertEqual(response.data["return_flight"]["airplane"]["airline"]["airport"]["country"]["name"], "Ukraine")
+
+    def test_keyset_page_skips_count(self):
+        self.create_orders(4, 2)
+        with self.assertNumQueries(self.LIST_QUERIES - 1):
+            response = self.client.get("/api/flight/orders/", {"pagination": "cursor"})
+        self.assertEqual(len(response.data["results"]), 4)
+
+    def test_buy_response_lists_issued_tickets(self):
+        flight = self.create_flight("BUY1", self.kyiv, self.lviv)
+        order = Order.objects.create(
+            user=self.user, flight=flight, total_price=200,
+            tickets_data=[
+                {"seat_class": Flight.SeatClass.ECONOMY, "price": 100},
+                {"seat_class": Flight.SeatClass.BUSINESS, "price": 100},
+            ],
+        )
+        response = self.client.post(f"/api/flight/orders/{order.pk}/buy/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["order"]["tickets"]), 2)
+        self.assertEqual(response.data["order"]["flight"]["economy_seats"], 119)
+
+
+class TicketQueryBudgetTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_does_not_grow_with_tickets(self):
+        self.create_orders(1, 1)
+        with self.assertNumQueries(2):
+            self.client.get("/api/flight/tickets/")
+
+        self.create_orders(6, 4)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/flight/tickets/")
+        self.assertEqual(response.data["count"], 25)
+        self.assertTrue(all(ticket["flight"]["departure_airport"] for ticket in response.data["results"]))
+
+    def test_detail_query_count(self):
+        order, = self.create_orders(1, 2)
+        ticket = order.tickets.get(direction=Ticket.TicketDirection.RETURN)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/flight/tickets/{ticket.pk}/")
+        self.assertEqual(response.data["flight"]["departure_airport"], "Lviv")
+
+
+
+class SeatReservationTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.outbound = self.create_flight("RES1", self.kyiv, self.lviv)
+        self.inbound = self.create_flight("RES2", self.lviv, self.kyiv, departs_in=timedelta(days=12))
+
+    def counters(self, flight):
+        flight.refresh_from_db()
+        return flight.economy_seats, flight.business_seats, flight.first_class_seats
+
+    def round_trip(self, outbound_class, return_class, seats=1):
+        return Order.objects.create(
+            user=self.user, flight=self.outbound, return_flight=self.inbound,
+            ticket_type=Order.TicketType.ROUND_TRIP, total_price=0,
+            tickets_data=[{"seat_class": outbound_class, "price": 100}] * seats + [
+                {"seat_class": return_class, "direction": "return", "price": 100}
+            ] * seats,
+        )
+
+    def test_reserve_is_all_or_nothing_across_flights(self):
+        with self.assertRaises(SeatsUnavailable) as caught:
+            Flight.reserve_seats({(self.outbound.pk, "economy"): 2, (self.inbound.pk, "first_class"): 5})
+        self.assertEqual((caught.exception.flight_id, caught.exception.seat_class), (self.inbound.pk, "first_class"))
+        self.assertEqual(self.counters(self.outbound), (120, 12, 4))
+        self.assertEqual(self.counters(self.inbound), (120, 12, 4))
+
+        Flight.reserve_seats({(self.outbound.pk, "economy"): 2, (self.inbound.pk, "first_class"): 4})
+        self.assertEqual(self.counters(self.outbound), (118, 12, 4))
+        self.assertEqual(self.counters(self.inbound), (120, 12, 0))
+
+    def test_reserved_seats_stay_free(self):
+        with self.assertRaises(SeatsUnavailable) as caught:
+            Flight.reserve_seats({(self.outbound.pk, "business"): 1}, {(self.outbound.pk, "business"): 12})
+        self.assertEqual((caught.exception.flight_id, caught.exception.seat_class), (self.outbound.pk, "business"))
+        Flight.reserve_seats({(self.outbound.pk, "business"): 1}, {(self.outbound.pk, "business"): 11})
+        self.assertEqual(self.counters(self.outbound), (120, 11, 4))
+
+    def test_buy_names_the_flight_and_class_that_ran_out(self):
+        order = self.round_trip("economy", "first_class", seats=5)
+        with self.assertRaisesMessage(ValueError, "return flight: No first_class seats available."):
+            order.buy()
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.OrderStatus.BOOKED)
+        self.assertEqual(self.counters(self.outbound), (120, 12, 4))
+        self.assertFalse(Ticket.objects.exists())
+
+        order = self.round_trip("business", "economy", seats=13)
+        with self.assertRaisesMessage(ValueError, "outbound flight: No business seats available."):
+            order.buy()
+
+    def test_an_order_is_bought_once(self):
+        order = self.round_trip("economy", "economy")
+        stale = Order.objects.get(pk=order.pk)
+        order.buy()
+        with self.assertRaisesMessage(ValueError, "Only booked orders can be bought"):
+            order.buy()
+        # A copy loaded before the purchase still sees "booked"; the conditional UPDATE refuses it.
+        with self.assertRaisesMessage(ValueError, "Only booked orders can be bought"):
+            stale.buy()
+        self.assertEqual(self.counters(self.outbound), (119, 12, 4))
+        self.assertEqual(self.counters(self.inbound), (119, 12, 4))
+        self.assertEqual(order.tickets.count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f"/api/flight/orders/{order.pk}/buy/")
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkOrderTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.outbound = self.create_flight("BLK1", self.kyiv, self.lviv)
+        self.inbound = self.create_flight("BLK2", self.lviv, self.kyiv, departs_in=timedelta(days=12))
+
+    def book(self, seat_class=Flight.SeatClass.ECONOMY, seats=1, round_trip=True):
+        tickets = [{"seat_class": seat_class, "price": 100}] * seats
+        if round_trip:
+            tickets += [{"seat_class": seat_class, "direction": "return", "price": 100}] * seats
+        order = Order.objects.create(
+            user=self.user, flight=self.outbound, return_flight=self.inbound if round_trip else None,
+            ticket_type=Order.TicketType.ROUND_TRIP if round_trip else Order.TicketType.ONE_WAY,
+            total_price=100 * len(tickets), tickets_data=tickets,
+        )
+        order.hold_seats()
+        return order
+
+    def counters(self, flight):
+        flight.refresh_from_db()
+        return flight.economy_seats, flight.business_seats, flight.first_class_seats
+
+    def statuses(self, orders):
+        return [Order.objects.get(pk=order.pk).status for order in orders]
+
+    def test_confirm_many_buys_a_chunk_at_once(self):
+        orders = [self.book() for _ in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Order.confirm_many([order.pk for order in orders]), (3, 0))
+
+        self.assertEqual(self.statuses(orders), [Order.OrderStatus.CONFIRMED] * 3)
+        self.assertFalse(Order.objects.exclude(tickets_data=None).exists())
+        self.assertEqual(self.counters(self.outbound), (117, 12, 4))
+        self.assertEqual(self.counters(self.inbound), (117, 12, 4))
+        self.assertEqual(
+            sorted(Ticket.objects.filter(direction=Ticket.TicketDirection.RETURN).values_list("seat_number", flat=True)),
+            ["5A", "5C", "5F"],
+        )
+        self.assertFalse(holds.held_seats([self.outbound.pk, self.inbound.pk]))
+
+    def test_confirm_many_query_count_does_not_grow_with_orders(self):
+        few = [self.book() for _ in range(2)]
+        many = [self.book() for _ in range(6)]
+        with CaptureQueriesContext(connection) as first:
+            Order.confirm_many([order.pk for order in few])
+        with CaptureQueriesContext(connection) as second:
+            Order.confirm_many([order.pk for order in many])
+        self.assertEqual(len(second), len(first))
+        self.assertEqual(Ticket.objects.count(), 16)
+
+    def test_confirm_many_falls_back_to_buying_each_order(self):
+        first = self.book(Flight.SeatClass.FIRST_CLASS, seats=3, round_trip=False)
+        # Unheld, so the chunk asks for 6 of 4 first class seats.
+        second = Order.objects.create(
+            user=self.user, flight=self.outbound, total_price=300,
+            tickets_data=[{"seat_class": Flight.SeatClass.FIRST_CLASS, "price": 100}] * 3,
+        )
+        third = self.book(round_trip=False)
+
+        self.assertEqual(Order.confirm_many([first.pk, second.pk, third.pk]), (2, 1))
+        self.assertEqual(
+            self.statuses([first, second, third]),
+            [Order.OrderStatus.CONFIRMED, Order.OrderStatus.BOOKED, Order.OrderStatus.CONFIRMED],
+        )
+        self.assertEqual(self.counters(self.outbound), (119, 12, 1))
+        self.assertFalse(second.tickets.exists())
+
+    def test_confirm_many_isolates_failures_to_their_chunk(self):
+        cheap = [self.book(round_trip=False) for _ in range(2)]
+        greedy = Order.objects.create(
+            user=self.user, flight=self.outbound, total_price=500,
+            tickets_data=[{"seat_class": Flight.SeatClass.FIRST_CLASS, "price": 100}] * 5,
+        )
+        self.assertEqual(Order.confirm_many([cheap[0].pk, cheap[1].pk, greedy.pk], chunk_size=2), (2, 1))
+        self.assertEqual(self.counters(self.outbound), (118, 12, 4))
+
+    def test_cancel_many_releases_counters_seat_maps_and_holds(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmed = [self.book() for _ in range(2)]
+            Order.confirm_many([order.pk for order in confirmed])
+            already = self.book(round_trip=False)
+            already.cancel()
+        booked = self.book(Flight.SeatClass.FIRST_CLASS, seats=4, round_trip=False)
+        self.assertTrue(holds.held_seats([self.outbound.pk]))
+
+        orders = confirmed + [booked, already]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Order.cancel_many([order.pk for order in orders], chunk_size=2), 3)
+
+        self.assertEqual(self.statuses(orders), [Order.OrderStatus.CANCELLED] * 4)
+        self.assertEqual(self.counters(self.outbound), (120, 12, 4))
+        self.assertEqual(self.counters(self.inbound), (120, 12, 4))
+        for flight in (self.outbound, self.inbound):
+            seat_map = Flight.objects.select_related("airplane").get(pk=flight.pk).get_seat_map()
+            self.assertFalse(seat_map.is_taken("5A") or seat_map.is_taken("5F"))
+        self.assertFalse(holds.held_seats([self.outbound.pk]))
+        self.assertEqual(Order.cancel_many([order.pk for order in orders]), 0)
+
+    def test_admin_actions(self):
+        superuser = User.objects.create_user(
+            email="root@example.com", username="root", password="secret", is_staff=True, is_superuser=True
+        )
+        client = Client()
+        client.force_login(superuser)
+        orders = [self.book() for _ in range(2)]
+        unseatable = Order.objects.create(
+            user=self.user, flight=self.outbound, total_price=500,
+            tickets_data=[{"seat_class": Flight.SeatClass.FIRST_CLASS, "price": 100}] * 5,
+        )
+        selected = [order.pk for order in orders] + [unseatable.pk]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/admin/tasks/order/", {
+                "action": "confirm_orders", "_selected_action": selected,
+            }, follow=True)
+        self.assertEqual(
+            [str(message) for message in response.context["messages"]],
+            ["Confirmed 2 order(s).", "1 order(s) could not be confirmed."],
+        )
+        self.assertEqual(self.counters(self.outbound), (118, 12, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/admin/tasks/order/", {
+                "action": "cancel_orders", "_selected_action": selected,
+            }, follow=True)
+        self.assertEqual([str(message) for message in response.context["messages"]], ["Cancelled 3 order(s)."])
+        self.assertEqual(self.counters(self.outbound), (120, 12, 4))
+
+
+class ExpireOrdersTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = self.create_flight("EXP1", self.kyiv, self.lviv)
+
+    def book(self, age, seats=1):
+        order = Order.objects.create(
+            user=self.user, flight=self.flight, total_price=100 * seats,
+            tickets_data=[{"seat_class": Flight.SeatClass.ECONOMY, "price": 100}] * seats,
+        )
+        order.hold_seats()
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+        return order
+
+    def statuses(self, orders):
+        return [Order.objects.get(pk=order.pk).status for order in orders]
+
+    def held(self):
+        return holds.held_seats([self.flight.pk])[(self.flight.pk, "economy")]
+
+    def test_sweep_cancels_stale_orders_in_batches_oldest_first(self):
+        ttl = timedelta(seconds=settings.ORDER_HOLD_TTL_SECONDS)
+        stale = [self.book(ttl + timedelta(minutes=10 - minute)) for minute in range(5)]
+        fresh = self.book(timedelta(seconds=1))
+
+        metrics = sweep_expired_orders(batch_size=2, max_batches=1)
+        self.assertEqual((metrics["expired"], metrics["batches"]), (2, 1))
+        self.assertEqual(self.statuses(stale[:3]), [Order.OrderStatus.CANCELLED] * 2 + [Order.OrderStatus.BOOKED])
+
+        metrics = sweep_expired_orders(batch_size=2)
+        self.assertEqual((metrics["expired"], metrics["batches"]), (3, 2))
+        self.assertEqual(self.statuses(stale), [Order.OrderStatus.CANCELLED] * 5)
+        self.assertEqual(self.statuses([fresh]), [Order.OrderStatus.BOOKED])
+        self.assertFalse(Order.objects.filter(status=Order.OrderStatus.CANCELLED).exclude(tickets_data=None).exists())
+
+    def test_sweep_releases_seat_holds(self):
+        ttl = timedelta(seconds=settings.ORDER_HOLD_TTL_SECONDS)
+        self.book(ttl + timedelta(minutes=1), seats=3)
+        self.book(timedelta(seconds=1), seats=2)
+        self.assertEqual(self.held(), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            sweep_expired_orders()
+        self.assertEqual(self.held(), 2)
+
+    def test_sweep_reports_lag_of_the_oldest_order(self):
+        ttl = timedelta(seconds=settings.ORDER_HOLD_TTL_SECONDS)
+        self.book(ttl + timedelta(minutes=5))
+        self.book(ttl + timedelta(minutes=1))
+        metrics = sweep_expired_orders()
+        self.assertAlmostEqual(metrics["lag_seconds"], 300, delta=5)
+        self.assertGreater(metrics["rows_per_second"], 0)
+
+        self.assertEqual(sweep_expired_orders(), {
+            "expired": 0, "batches": 0, "seconds": mock.ANY, "rows_per_second": mock.ANY, "lag_seconds": 0.0,
+        })
+
+    def test_countdown_task_cancels_only_stale_booked_orders(self):
+        ttl = timedelta(seconds=settings.ORDER_HOLD_TTL_SECONDS)
+        stale, fresh = self.book(ttl + timedelta(minutes=1)), self.book(timedelta(seconds=1))
+        cancel_unpaid_order(stale.pk)
+        cancel_unpaid_order(fresh.pk)
+        self.assertEqual(self.statuses([stale, fresh]), [Order.OrderStatus.CANCELLED, Order.OrderStatus.BOOKED])
+        self.assertEqual(self.held(), 1)
+
+
+class FareEngineTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.outbound = self.create_flight("FARE1", self.kyiv, self.lviv, departs_in=timedelta(days=3))
+        self.inbound = self.create_flight("FARE2", self.lviv, self.kyiv, departs_in=timedelta(days=12))
+        # Quotes move with time to departure; freeze it so the API and the test quote the same instant.
+        now = timezone.now()
+        patcher = mock.patch("django.utils.timezone.now", return_value=now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def grid(self, remaining, days):
+        return fares.fare_grid(
+            base=np.array([100.0]), capacity=np.array([[100.0, 10.0, 4.0]]),
+            remaining=np.array([remaining], dtype=float), days=np.array([days], dtype=float),
+        )[0].tolist()
+
+    def test_fare_grid_rises_with_load_factor(self):
+        far = 10_000
+        self.assertEqual(self.grid([100, 10, 4], far), [100.0, 250.0, 400.0])
+        self.assertEqual(self.grid([50, 10, 4], far)[0], 137.5)
+        self.assertEqual(self.grid([0, 0, 0], far), [250.0, 625.0, 1000.0])
+        # Overbooked or unknown capacity counts as full, never more.
+        self.assertEqual(self.grid([-5, 10, 4], far)[0], 250.0)
+
+    def test_fare_grid_rises_as_departure_nears(self):
+        economy = [self.grid([100, 10, 4], days)[0] for days in (60, 14, 1, 0, -1)]
+        self.assertEqual(economy, sorted(economy))
+        self.assertEqual(economy[-2:], [160.0, 160.0])
+        self.assertAlmostEqual(economy[1], 100 * (1 + 0.6 / np.e), places=2)
+
+    def test_quote_prices_flights_in_one_batch(self):
+        Flight.objects.filter(pk=self.inbound.pk).update(economy_seats=60)
+        flights = list(Flight.objects.filter(pk__in=[self.outbound.pk, self.inbound.pk]))
+        with self.assertNumQueries(1):
+            quoted = fares.quote(flights)
+        # Half the cabin sold outweighs the nearer departure of the outbound flight.
+        self.assertGreater(quoted[self.inbound.pk]["economy"], quoted[self.outbound.pk]["economy"])
+        self.assertGreater(quoted[self.outbound.pk]["business"], quoted[self.inbound.pk]["business"])
+        self.assertEqual(set(quoted[self.outbound.pk]), {"economy", "business", "first_class"})
+
+    def test_one_way_order_is_priced_by_the_server(self):
+        response = self.client.post("/api/flight/orders/", {
+            "flight_id": self.outbound.pk,
+            "tickets": [{"seat_class": "economy", "price": "0.01"}, {"seat_class": "business", "price": "1"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        quote = fares.quote([self.outbound])[self.outbound.pk]
+        order = Order.objects.get(pk=response.data["id"])
+        self.assertEqual([ticket["price"] for ticket in order.tickets_data], [str(quote["economy"]), str(quote["business"])])
+        self.assertEqual(order.total_price, quote["economy"] + quote["business"])
+        self.assertEqual(order.quoted_fares, {
+            str(self.outbound.pk): {seat_class: str(fare) for seat_class, fare in quote.items()},
+        })
+
+    def test_round_trip_order_sums_both_flights(self):
+        response = self.client.post("/api/flight/orders/", {
+            "flight_id": self.outbound.pk, "return_flight_id": self.inbound.pk, "ticket_type": "round_trip",
+            "tickets": [
+                {"seat_class": "first_class", "price": "5"},
+                {"seat_class": "first_class", "direction": "return", "price": "5"},
+            ],
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        quoted = fares.quote([self.outbound, self.inbound])
+        order = Order.objects.get(pk=response.data["id"])
+        self.assertEqual(order.total_price, quoted[self.outbound.pk]["first_class"] + quoted[self.inbound.pk]["first_class"])
+        self.assertEqual(set(order.quoted_fares), {str(self.outbound.pk), str(self.inbound.pk)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f"/api/flight/orders/{order.pk}/buy/").status_code, 200)
+        self.assertEqual(
+            sorted(order.tickets.values_list("price", flat=True)),
+            sorted([quoted[self.outbound.pk]["first_class"], quoted[self.inbound.pk]["first_class"]]),
+        )
+
+    def test_flights_expose_their_quotes(self):
+        response = self.client.get(f"/api/flight/flights/{self.outbound.flight_number}/")
+        quote = fares.quote([self.outbound])[self.outbound.pk]
+        self.assertEqual(response.data["fares"], {seat_class: f"{fare:.2f}" for seat_class, fare in quote.items()})
+
+
+class LargeTableAdminTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_user(
+            email="root@example.com", username="root", password="secret", is_staff=True, is_superuser=True
+        )
+        self.client = Client()
+        self.client.force_login(self.superuser)
+
+    def changelist_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_orders(1, 2)
+        few = {path: self.changelist_queries(path) for path in ("/admin/tasks/flight/", "/admin/tasks/order/", "/admin/tasks/ticket/")}
+        self.create_orders(8, 2, user=self.admin)
+        many = {path: self.changelist_queries(path) for path in few}
+        self.assertEqual(many, few)
+
+    def test_large_unfiltered_tables_use_the_planner_estimate(self):
+        self.create_orders(3, 1)
+        with mock.patch("tasks.pagination.estimated_count", return_value=5_000_000) as estimate:
+            paginator = EstimatedCountPaginator(Order.objects.all(), 100)
+            self.assertEqual(paginator.count, 5_000_000)
+            # Filtered lists and small tables are counted exactly.
+            self.assertEqual(EstimatedCountPaginator(Order.objects.filter(user=self.user), 100).count, 3)
+            estimate.return_value = 10
+            self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 100).count, 3)
+        # SQLite has no planner statistics to read.
+        self.assertIsNone(estimated_count(Order))
+        self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 100).count, 3)
+
+    def test_change_forms_use_autocomplete(self):
+        self.create_orders(1, 1)
+        for path in ("/admin/tasks/order/add/", "/admin/tasks/ticket/add/", "/admin/tasks/flight/add/"):
+            response = self.client.get(path)
+            self.assertContains(response, "admin-autocomplete")
+            self.assertNotContains(response, "OUT0")
+            self.assertNotContains(response, "client@example.com")
+
+    def test_date_hierarchy_drills_down(self):
+        order, = self.create_orders(1, 1)
+        created = timezone.localtime(order.created_at)
+        response = self.client.get("/admin/tasks/order/", {
+            "created_at__year": created.year, "created_at__month": created.month, "created_at__day": created.day,
+        })
+        self.assertContains(response, f"/admin/tasks/order/{order.pk}/change/")
+
+
+class SeatHoldTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = self.create_flight("HOLD1", self.kyiv, self.lviv)
+
+    def book(self, seats, seat_class=Flight.SeatClass.FIRST_CLASS):
+        return self.client.post("/api/flight/orders/", {
+            "flight_id": self.flight.pk,
+            "tickets": [{"seat_class": seat_class, "price": 100}] * seats,
+        }, format="json")
+
+    def test_booking_holds_seats(self):
+        self.assertEqual(self.book(3).status_code, 201)
+        self.assertEqual(holds.held_seats([self.flight.pk])[(self.flight.pk, "first_class")], 3)
+
+        response = self.client.get(f"/api/flight/flights/{self.flight.flight_number}/")
+        self.assertEqual(response.data["seat_availability"]["first_class"], 1)
+        response = self.client.get("/api/flight/flights/")
+        self.assertEqual(response.data["results"][0]["seat_availability"]["first_class"], 1)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.first_class_seats, 4)
+
+    def test_booking_beyond_held_seats_is_rejected(self):
+        self.assertEqual(self.book(3).status_code, 201)
+        response = self.book(2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("No first_class seats available", str(response.data))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.book(1).status_code, 201)
+
+    def test_buy_consumes_hold_and_respects_other_holds(self):
+        first = self.book(2).data["id"]
+        other = Order.objects.create(
+            user=self.user, flight=self.flight, total_price=300,
+            tickets_data=[{"seat_class": Flight.SeatClass.FIRST_CLASS, "price": 100}] * 3,
+        )
+        # An unheld order can't take seats another booking holds.
+        self.assertEqual(self.client.post(f"/api/flight/orders/{other.pk}/buy/").status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/flight/orders/{first}/buy/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(holds.held_seats([self.flight.pk]))
+        response = self.client.get(f"/api/flight/flights/{self.flight.flight_number}/")
+        self.assertEqual(response.data["seat_availability"]["first_class"], 2)
+
+    def test_cancel_releases_hold(self):
+        order = self.book(4).data["id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/flight/orders/{order}/cancel/")
+        self.assertEqual(self.book(4).status_code, 201)
+
+    @override_settings(ORDER_HOLD_TTL_SECONDS=-60)
+    def test_expired_holds_are_not_counted(self):
+        self.assertEqual(self.book(4).status_code, 201)
+        self.assertFalse(holds.held_seats([self.flight.pk]))
+
+
+class SeatMapTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = self.create_flight("SEAT1", self.kyiv, self.lviv)
+
+    def book(self, *tickets):
+        return self.client.post("/api/flight/orders/", {
+            "flight_id": self.flight.pk, "tickets": [{"seat_class": "economy", **ticket} for ticket in tickets],
+        }, format="json")
+
+    def buy(self, *tickets):
+        response = self.book(*tickets)
+        self.assertEqual(response.status_code, 201, response.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/flight/orders/{response.data['id']}/buy/")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["order"]
+
+    def seat_numbers(self, order):
+        return sorted(ticket["seat_number"] for ticket in order["tickets"])
+
+    def test_layout_numbers_cabins_front_to_back(self):
+        layout = self.airplane.get_seat_layout()
+        self.assertEqual(layout.size, 136)
+        self.assertEqual([cabin["first_row"] for cabin in layout.cabins], [1, 2, 5])
+        self.assertEqual(layout.labels[layout.seat_index("5A")], "5A")
+        # Window seats, then aisle seats, then the middle of each row.
+        economy = [layout.labels[index] for index in layout.preference["economy"][:6]]
+        self.assertEqual(economy, ["5A", "5F", "5C", "5D", "5B", "5E"])
+
+    def test_auto_assignment_takes_the_best_free_seats(self):
+        order = self.buy({}, {}, {"seat_class": "first_class"})
+        self.assertEqual(self.seat_numbers(order), ["1A", "5A", "5F"])
+        self.assertEqual(self.seat_numbers(self.buy({})), ["5C"])
+
+    def test_explicit_seats_are_taken_before_auto_assignment(self):
+        order = self.buy({}, {"seat_number": "5A"})
+        self.assertEqual(self.seat_numbers(order), ["5A", "5F"])
+
+    def test_explicit_seat_conflicts_are_rejected_at_booking(self):
+        self.buy({"seat_number": "5a"})
+        for tickets, message in (
+            ([{"seat_number": "5A"}], "Seat 5A is already taken."),
+            ([{"seat_number": "1A"}], "Seat 1A is not a economy seat."),
+            ([{"seat_number": "99Z"}], "Seat 99Z does not exist on this airplane."),
+            ([{"seat_number": "6A"}, {"seat_number": "6a"}], "Seat 6a is requested twice."),
+        ):
+            response = self.book(*tickets)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, str(response.data))
+
+    def test_seat_taken_after_booking_fails_the_purchase(self):
+        booked = self.book({"seat_number": "7C"}).data["id"]
+        self.buy({"seat_number": "7C"})
+        response = self.client.post(f"/api/flight/orders/{booked}/buy/")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("outbound flight: Seat 7C is already taken.", response.data["detail"])
+        self.assertEqual(Order.objects.get(pk=booked).status, Order.OrderStatus.BOOKED)
+
+    def test_cancel_releases_seats_and_counters(self):
+        order = self.buy({"seat_number": "5A"}, {})
+        self.flight.refresh_from_db()
+        self.assertTrue(self.flight.get_seat_map().is_taken("5A"))
+        self.assertEqual(self.flight.economy_seats, 118)
+
+        self.assertEqual(self.client.post(f"/api/flight/orders/{order['id']}/cancel/").status_code, 200)
+        self.flight.refresh_from_db()
+        seat_map = self.flight.get_seat_map()
+        self.assertFalse(seat_map.is_taken("5A") or seat_map.is_taken("5F"))
+        self.assertEqual(self.flight.economy_seats, 120)
+        self.assertEqual(self.seat_numbers(self.buy({"seat_number": "5A"})), ["5A"])
+
+    def test_seat_map_endpoint(self):
+        self.buy({"seat_number": "1B", "seat_class": "first_class"}, {})
+        response = self.client.get(f"/api/flight/flights/{self.flight.flight_number}/seat-map/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["seat_count"], 136)
+        self.assertEqual(
+            [(cabin["seat_class"], cabin["letters"]) for cabin in response.data["cabins"]],
+            [("first_class", "ABCD"), ("business", "ABCD"), ("economy", "ABCDEF")],
+        )
+        occupancy = base64.b64decode(response.data["occupancy"])
+        taken = [index for index in range(136) if occupancy[index >> 3] & (0x80 >> (index & 7))]
+        layout = self.airplane.get_seat_layout()
+        self.assertEqual([layout.labels[index] for index in taken], ["1B", "5A"])
+        self.assertEqual(response.data["seat_availability"]["first_class"], 3)
+
+    def test_seat_config_is_locked_while_flights_are_booked(self):
+        self.client.force_authenticate(self.admin)
+        self.buy({"seat_number": "10A"})
+        response = self.client.patch(f"/api/flight/airplanes/{self.airplane.slug}/", {"first_class_seats": 8})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Seat configuration can't change", str(response.data))
+
+        airplane = Airplane.objects.get(pk=self.airplane.pk)
+        airplane.economy_seats_per_row = 4
+        with self.assertRaises(ValidationError):
+            airplane.full_clean()
+        with self.assertRaises(ValidationError):
+            airplane.save()
+        # Other fields stay editable.
+        response = self.client.patch(f"/api/flight/airplanes/{self.airplane.slug}/", {"model": "A320neo"})
+        self.assertEqual(response.status_code, 200)
+
+        self.flight.refresh_from_db()
+        self.assertTrue(self.flight.get_seat_map().is_taken("10A"))
+
+    def test_unbooked_flights_follow_a_new_seat_config(self):
+        self.client.force_authenticate(self.admin)
+        order = self.buy({"seat_number": "10A"})
+        self.client.post(f"/api/flight/orders/{order['id']}/cancel/")
+        response = self.client.patch(
+            f"/api/flight/airplanes/{self.airplane.slug}/", {"first_class_seats": 8, "economy_seats": 150}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.flight.refresh_from_db()
+        self.assertEqual((self.flight.first_class_seats, self.flight.economy_seats), (8, 150))
+        self.assertIsNone(self.flight.seat_map)
+        self.assertEqual(self.flight.seat_layout.size, 170)
+
+    def test_booked_flights_keep_their_airplane(self):
+        self.client.force_authenticate(self.admin)
+        larger = Airplane.objects.create(model="A330", airline=self.airline, economy_seats=300)
+        spare = self.create_flight("SEAT2", self.kyiv, self.lviv)
+        self.buy({})
+
+        response = self.client.patch(f"/api/flight/flights/{self.flight.flight_number}/", {"airplane_id": larger.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("airplane_id", response.data)
+        self.flight.airplane = larger
+        with self.assertRaises(ValidationError):
+            self.flight.save()
+
+        response = self.client.patch(f"/api/flight/flights/{spare.flight_number}/", {"airplane_id": larger.pk})
+        self.assertEqual(response.status_code, 200)
+        spare.refresh_from_db()
+        self.assertEqual((spare.economy_seats, spare.first_class_seats), (300, 0))
+
+
+class ImportFlightsTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        self.larger = Airplane.objects.create(model="A330", airline=self.airline, economy_seats=300)
+        self.booked = self.create_flight("IMP1", self.kyiv, self.lviv)
+        self.spare = self.create_flight("IMP2", self.kyiv, self.lviv)
+        order = Order.objects.create(
+            user=self.user, flight=self.booked, total_price=100,
+            tickets_data=[{"seat_class": Flight.SeatClass.ECONOMY, "price": 100}],
+        )
+        order.buy()
+
+    def run_import(self, rows):
+        departure = (timezone.now() + timedelta(days=20)).replace(microsecond=0)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as stream:
+            writer = csv.writer(stream)
+            writer.writerow(["flight_number", "airplane", "departure_airport", "arrival_airport",
+                             "departure_time", "arrival_time"])
+            for number, airplane in rows:
+                writer.writerow([number, airplane.slug, self.kyiv.slug, self.lviv.slug,
+                                 departure.isoformat(), (departure + timedelta(hours=2)).isoformat()])
+        self.addCleanup(os.remove, stream.name)
+        output = io.StringIO()
+        call_command("import_flights", stream.name, stdout=output)
+        return departure, output.getvalue()
+
+    def test_upsert_keeps_booked_flights_on_their_airplane(self):
+        departure, output = self.run_import([("IMP1", self.larger), ("IMP2", self.larger), ("IMP3", self.larger)])
+        self.assertIn("Imported 2 flights", output)
+        self.assertIn("Skipped 1 rows that move flights with bookings to another airplane: IMP1", output)
+
+        self.booked.refresh_from_db()
+        self.assertEqual((self.booked.airplane_id, self.booked.economy_seats), (self.airplane.pk, 119))
+        self.assertNotEqual(self.booked.departure_time, departure)
+        self.assertTrue(self.booked.get_seat_map().is_taken("5A"))
+
+        self.spare.refresh_from_db()
+        self.assertEqual((self.spare.airplane_id, self.spare.economy_seats), (self.larger.pk, 300))
+        self.assertEqual((self.spare.first_class_seats, self.spare.departure_time), (0, departure))
+        self.assertEqual(Flight.objects.get(flight_number="IMP3").economy_seats, 300)
+
+    def import_rows(self, rows, **options):
+        departure = (timezone.now() + timedelta(days=20)).replace(microsecond=0)
+        defaults = {
+            "airplane": self.airplane.slug, "departure_airport": self.kyiv.slug, "arrival_airport": self.lviv.slug,
+            "departure_time": departure.isoformat(), "arrival_time": (departure + timedelta(hours=2)).isoformat(),
+        }
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as stream:
+            writer = csv.DictWriter(stream, fieldnames=["flight_number", *defaults, "status", "base_fare"])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({**defaults, **row})
+        self.addCleanup(os.remove, stream.name)
+        output = io.StringIO()
+        call_command("import_flights", stream.name, stdout=output, **options)
+        return output.getvalue()
+
+    def test_rows_without_optional_columns_keep_stored_values(self):
+        Flight.objects.filter(pk=self.spare.pk).update(status=Flight.FlightStatus.CANCELLED, base_fare=250)
+        self.import_rows([
+            {"flight_number": "IMP3", "status": "delayed", "base_fare": "300"},
+            {"flight_number": "IMP2"},
+            {"flight_number": "IMP4"},
+            {"flight_number": "IMP1", "base_fare": "180"},
+        ])
+        values = dict(
+            (number, (status, base_fare)) for number, status, base_fare in
+            Flight.objects.filter(flight_number__startswith="IMP").values_list("flight_number", "status", "base_fare")
+        )
+        default_fare = Flight._meta.get_field("base_fare").default
+        self.assertEqual(values, {
+            "IMP1": (Flight.FlightStatus.SCHEDULED, 180),
+            "IMP2": (Flight.FlightStatus.CANCELLED, 250),
+            "IMP3": (Flight.FlightStatus.DELAYED, 300),
+            "IMP4": (Flight.FlightStatus.SCHEDULED, default_fare),
+        })
+
+    def test_last_row_of_a_repeated_flight_number_wins(self):
+        output = self.import_rows([
+            {"flight_number": "IMP3", "status": "delayed"},
+            {"flight_number": "IMP4"},
+            {"flight_number": "IMP3", "status": "cancelled"},
+        ])
+        self.assertIn("1 rows repeated a flight_number within a chunk", output)
+        self.assertIn("Imported 2 flights", output)
+        self.assertEqual(Flight.objects.get(flight_number="IMP3").status, Flight.FlightStatus.CANCELLED)
+
+        # Repeats in different chunks are separate upserts.
+        output = self.import_rows([{"flight_number": "IMP5"}, {"flight_number": "IMP5", "base_fare": "90"}], chunk_size=1)
+        self.assertNotIn("repeated", output)
+        self.assertEqual(Flight.objects.get(flight_number="IMP5").base_fare, 90)
+
+    def test_malformed_rows_abort_or_are_skipped(self):
+        rows = [
+            {"flight_number": "IMP3"},
+            {"flight_number": "IMP4", "arrival_airport": "nowhere"},
+            {"flight_number": "IMP5", "status": "landed"},
+            {"flight_number": "IMP6", "base_fare": "cheap"},
+            {"flight_number": "IMP7", "departure_time": "tomorrow"},
+        ]
+        with self.assertRaisesMessage(CommandError, "Row 2: unknown airport 'nowhere'"):
+            self.import_rows(rows)
+        self.assertFalse(Flight.objects.filter(flight_number="IMP3").exists())
+
+        output = self.import_rows(rows, skip_invalid=True)
+        self.assertIn("Imported 1 flights in 1 chunks, skipped 4", output)
+        self.assertEqual(sorted(Flight.objects.filter(flight_number__gt="IMP2").values_list("flight_number", flat=True)), ["IMP3"])
+
+    def test_upsert_on_the_same_airplane_keeps_seat_counters(self):
+        departure, output = self.run_import([("IMP1", self.airplane)])
+        self.assertIn("Imported 1 flights", output)
+        self.booked.refresh_from_db()
+        self.assertEqual((self.booked.departure_time, self.booked.economy_seats), (departure, 119))
+        self.assertTrue(self.booked.get_seat_map().is_taken("5A"))
+
+
+class LoadReferenceDataTests(FlightDataMixin, TestCase):
+    def test_airplanes_with_bookings_keep_their_seat_configuration(self):
+        Airline.objects.filter(pk=self.airline.pk).update(code="SKY")
+        booked, spare = (
+            Airplane.objects.create(model="A320", registration=registration, airline=self.airline, economy_seats=120)
+            for registration in ("UR-AAA", "UR-BBB")
+        )
+        booked_flight = Flight.objects.create(
+            flight_number="REF1", airplane=booked, departure_airport=self.kyiv, arrival_airport=self.lviv,
+            departure_time=timezone.now() + timedelta(days=3), arrival_time=timezone.now() + timedelta(days=3, hours=2),
+        )
+        spare_flight = Flight.objects.create(
+            flight_number="REF2", airplane=spare, departure_airport=self.kyiv, arrival_airport=self.lviv,
+            departure_time=timezone.now() + timedelta(days=3), arrival_time=timezone.now() + timedelta(days=3, hours=2),
+        )
+        Order.objects.create(
+            user=self.user, flight=booked_flight, total_price=100,
+            tickets_data=[{"seat_class": Flight.SeatClass.ECONOMY, "price": 100}],
+        ).buy()
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as stream:
+            stream.write(
+                "registration,model,airline,economy_seats,business_seats,first_class_seats\n"
+                "UR-AAA,A320neo,SKY,150,0,8\n"
+                "UR-BBB,A320neo,SKY,150,0,8\n"
+            )
+        self.addCleanup(os.remove, stream.name)
+        output = io.StringIO()
+        call_command("load_reference_data", airplanes=stream.name, stdout=output)
+        self.assertIn("Kept the seat configuration of 1 airplanes with booked flights: UR-AAA", output.getvalue())
+
+        booked.refresh_from_db()
+        self.assertEqual((booked.model, booked.economy_seats, booked.first_class_seats), ("A320neo", 120, 0))
+        booked_flight.refresh_from_db()
+        self.assertEqual(booked_flight.economy_seats, 119)
+        self.assertTrue(booked_flight.get_seat_map().is_taken("1A"))
+
+        spare.refresh_from_db()
+        self.assertEqual((spare.economy_seats, spare.first_class_seats, spare.capacity), (150, 8, 158))
+        spare_flight.refresh_from_db()
+        self.assertEqual((spare_flight.economy_seats, spare_flight.first_class_seats), (150, 8))
+
+
+@override_settings(ROUTE_MIN_CONNECTION_MINUTES=45, ROUTE_MAX_CONNECTION_HOURS=24)
+class RouteSearchTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.odesa = Airport.objects.create(name="Odesa", city="Odesa", country=self.country)
+        self.day = (timezone.now() + timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.direct = self.flight("DIR1", self.kyiv, self.lviv, "10:00", "12:00")
+        self.first_leg = self.flight("LEG1", self.kyiv, self.odesa, "08:00", "09:00")
+        self.tight = self.flight("LEG2", self.odesa, self.lviv, "09:30", "10:30")
+        self.second_leg = self.flight("LEG3", self.odesa, self.lviv, "10:00", "11:00")
+        route_index.rebuild()
+
+    def flight(self, number, origin, destination, departs, arrives):
+        at = lambda clock: self.day + timedelta(hours=int(clock[:2]), minutes=int(clock[3:]))
+        return Flight.objects.create(
+            flight_number=number, airplane=self.airplane, departure_airport=origin, arrival_airport=destination,
+            departure_time=at(departs), arrival_time=at(arrives),
+        )
+
+    def search(self, **kwargs):
+        itineraries = find_itineraries(
+            Flight.objects.all(), self.kyiv.pk, self.lviv.pk, self.day, self.day + timedelta(days=1), **kwargs
+        )
+        return [[leg.flight_number for leg in itinerary["legs"]] for itinerary in itineraries]
+
+    def test_connections_rank_by_arrival_and_respect_the_minimum_gap(self):
+        # LEG2 leaves Odesa 30 minutes after LEG1 lands, under the 45 minute minimum.
+        self.assertEqual(self.search(), [["LEG1", "LEG3"], ["DIR1"]])
+        self.assertEqual(self.search(max_legs=1), [["DIR1"]])
+        with override_settings(ROUTE_MIN_CONNECTION_MINUTES=30):
+            self.assertEqual(self.search(limit=1), [["LEG1", "LEG2"]])
+
+    def test_sold_out_flights_do_not_crowd_out_itineraries(self):
+        for minute in range(10, 50, 10):
+            self.flight(f"FULL{minute}", self.odesa, self.lviv, f"10:{minute}", "11:00")
+        self.flight("FULL99", self.kyiv, self.lviv, "09:00", "10:00")
+        route_index.rebuild()
+        Flight.objects.filter(flight_number__startswith="FULL").update(
+            **{field: 0 for field in Flight.SEAT_FIELDS.values()}
+        )
+        Flight.objects.filter(pk=self.second_leg.pk).update(economy_seats=0, business_seats=0, first_class_seats=1)
+
+        self.assertEqual(self.search(limit=1, seat_class="economy"), [["DIR1"]])
+        self.assertEqual(self.search(limit=1, passengers=2), [["DIR1"]])
+        self.assertEqual(self.search(limit=1), [["LEG1", "LEG3"]])
+
+        route_index.rebuild()
+        self.assertFalse(any(number.startswith("FULL") for number in map(self.indexed_number, route_index._edges)))
+
+    def indexed_number(self, flight_id):
+        return Flight.objects.get(pk=flight_id).flight_number
+
+    def test_index_applies_flight_changes_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            late = self.flight("DIR2", self.kyiv, self.lviv, "06:00", "07:00")
+        self.assertEqual(self.search(limit=1), [["DIR2"]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            late.status = Flight.FlightStatus.CANCELLED
+            late.save()
+        self.assertNotIn(late.pk, route_index._edges)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first_leg.economy_seats = self.first_leg.business_seats = self.first_leg.first_class_seats = 0
+            self.first_leg.save(update_fields=list(Flight.SEAT_FIELDS.values()))
+        self.assertNotIn(self.first_leg.pk, route_index._edges)
+        self.assertEqual(self.search(), [["DIR1"]])
+
+    def test_routes_endpoint(self):
+        response = APIClient().get("/api/flight/flights/routes/", {
+            "departure_airport": self.kyiv.pk, "arrival_airport": self.lviv.pk, "date": self.day.date().isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([itinerary["connections"] for itinerary in response.data], [1, 0])
+
+
+class FlightListCacheTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.outbound = self.create_flight("LST1", self.kyiv, self.lviv)
+        self.inbound = self.create_flight("LST2", self.lviv, self.kyiv)
+
+    def get(self, **params):
+        response = self.client.get("/api/flight/flights/", params)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        return response["X-Cache"], {flight["flight_number"]: flight for flight in results}
+
+    def test_miss_then_hit(self):
+        status, first = self.get(departure_airport=self.kyiv.pk)
+        self.assertEqual((status, list(first)), ("MISS", ["LST1"]))
+        status, second = self.get(departure_airport=self.kyiv.pk)
+        self.assertEqual((status, second), ("HIT", first))
+        self.assertEqual(self.get(departure_airport=self.kyiv.pk, fields="flight_number")[0], "MISS")
+
+    def test_create_invalidates_only_matching_lists(self):
+        self.get(departure_airport=self.kyiv.pk)
+        self.get(departure_airport=self.lviv.pk)
+        departure = timezone.now() + timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/flight/flights/", {
+                "flight_number": "LST3", "airplane_id": self.airplane.pk,
+                "departure_airport_id": self.kyiv.pk, "arrival_airport_id": self.lviv.pk,
+                "departure_time": departure, "arrival_time": departure + timedelta(hours=2),
+            }, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        status, flights = self.get(departure_airport=self.kyiv.pk)
+        self.assertEqual((status, sorted(flights)), ("MISS", ["LST1", "LST3"]))
+        self.assertEqual(self.get(departure_airport=self.lviv.pk)[0], "HIT")
+
+    def test_status_change_moves_the_flight_between_lists(self):
+        self.get(status="scheduled")
+        self.get(status="delayed")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.outbound.status = Flight.FlightStatus.DELAYED
+            self.outbound.save()
+        self.assertEqual(self.get(status="scheduled"), ("MISS", {"LST2": mock.ANY}))
+        self.assertEqual(list(self.get(status="delayed")[1]), ["LST1"])
+
+    def test_patch_refreshes_lists_and_payloads(self):
+        self.get()
+        departure = (self.outbound.departure_time + timedelta(hours=3)).replace(microsecond=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/flight/flights/{self.outbound.flight_number}/", {"departure_time": departure}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        status, flights = self.get()
+        self.assertEqual(status, "MISS")
+        self.assertEqual(flights["LST1"]["departure_time"], response.json()["departure_time"])
+
+    def test_book_seat_refreshes_the_cached_payload(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.outbound.book_seat(Flight.SeatClass.ECONOMY))
+        # The list of ids is still valid; only the flight's payload is rebuilt.
+        status, flights = self.get()
+        self.assertEqual(status, "HIT")
+        self.assertEqual(flights["LST1"]["economy_seats"], 119)
+        self.assertEqual(flights["LST2"]["economy_seats"], 120)
+
+    def test_cache_stats_are_staff_only(self):
+        self.get()
+        self.get()
+        stats = self.client.get("/api/flight/flights/cache-stats/").json()
+        self.assertEqual((stats["list_hits"], stats["list_misses"], stats["list_hit_ratio"]), (1, 1, 0.5))
+        self.assertEqual(stats["payload_hits"], 2)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get("/api/flight/flights/cache-stats/").status_code, 403)
+
+
+class KeysetPaginationTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.orders = self.create_orders(5, 1)
+
+    def walk(self, url, params=None, link="next"):
+        pages = []
+        while url:
+            data = self.client.get(url, params).json()
+            pages.append([order["id"] for order in data["results"]])
+            url, params = data[link], None
+        return pages
+
+    def test_next_links_visit_every_row_once(self):
+        pages = self.walk("/api/flight/orders/", {"pagination": "cursor", "page_size": 2})
+        expected = [order.pk for order in sorted(self.orders, key=lambda order: (order.created_at, order.pk), reverse=True)]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_link_returns_the_page_before(self):
+        first = self.client.get("/api/flight/orders/", {"pagination": "cursor", "page_size": 2}).json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertNotIn("pagination=", second["next"])
+
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+        self.assertEqual(self.client.get(back["next"]).json()["results"], second["results"])
+
+    def test_null_ordering_values_sort_last_ascending_and_first_descending(self):
+        prices = [300, None, 100, None, 200]
+        for order, price in zip(self.orders, prices):
+            order.total_price = price
+        Order.objects.bulk_update(self.orders, ["total_price"])
+        ids = [order.pk for order in self.orders]
+        ascending = [ids[2], ids[4], ids[0], ids[1], ids[3]]
+
+        pages = self.walk("/api/flight/orders/", {"pagination": "cursor", "page_size": 2, "ordering": "total_price"})
+        self.assertEqual(sum(pages, []), ascending)
+        pages = self.walk("/api/flight/orders/", {"pagination": "cursor", "page_size": 2, "ordering": "-total_price"})
+        self.assertEqual(sum(pages, []), ascending[::-1])
+
+        last = self.client.get("/api/flight/orders/", {
+            "pagination": "cursor", "page_size": 2, "ordering": "total_price",
+        }).json()
+        while last["next"]:
+            last = self.client.get(last["next"]).json()
+        pages = self.walk(last["previous"], link="previous")
+        self.assertEqual(sum(pages[::-1], []), ascending[:4])
+
+    def test_count_only_when_requested(self):
+        data = self.client.get("/api/flight/orders/", {"pagination": "cursor", "page_size": 2}).json()
+        self.assertNotIn("count", data)
+        data = self.client.get("/api/flight/orders/", {"pagination": "cursor", "page_size": 2, "count": "true"}).json()
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(self.client.get(data["next"]).json()["count"], 5)
+
+    def test_tampered_cursor_is_not_found(self):
+        for cursor in ("not-base64!", base64.urlsafe_b64encode(b'{"v": [1]}').decode()):
+            response = self.client.get("/api/flight/orders/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class FlightRepresentationTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.outbound = self.create_flight("REP1", self.kyiv, self.lviv)
+        self.inbound = self.create_flight("REP2", self.lviv, self.kyiv, departs_in=timedelta(days=11))
+
+    def get(self, path="/api/flight/flights/", **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @staticmethod
+    def ids(included):
+        return {name: sorted(item["id"] for item in items) for name, items in included.items()}
+
+    def test_fields_keep_only_the_listed_fields_and_id(self):
+        results = self.get(fields="flight_number,status,fares")["results"]
+        self.assertEqual(set(results[0]), {"id", "flight_number", "status", "fares"})
+        self.assertEqual(set(results[0]["fares"]), {"economy", "business", "first_class"})
+        self.assertNotIn("included", self.get(fields="flight_number"))
+
+    def test_compact_lists_relations_as_ids_and_side_loads_them(self):
+        data = self.get(compact="true", ordering="departure_time")
+        first = data["results"][0]
+        self.assertEqual(
+            (first["airplane"], first["departure_airport"], first["arrival_airport"]),
+            (self.airplane.pk, self.kyiv.pk, self.lviv.pk),
+        )
+        self.assertEqual(self.ids(data["included"]), {
+            "airplanes": [self.airplane.pk], "airlines": [self.airline.pk],
+            "airports": sorted([self.kyiv.pk, self.lviv.pk]), "countries": [self.country.pk],
+        })
+        self.assertEqual(data["included"]["airlines"][0]["airport"], self.kyiv.pk)
+
+    def test_compact_expand_nests_the_relation_instead_of_side_loading_it(self):
+        data = self.get(compact="true", expand="airplane,unknown", ordering="departure_time")
+        self.assertEqual(data["results"][0]["airplane"]["airline"]["name"], "Sky")
+        self.assertEqual(data["results"][0]["departure_airport"], self.kyiv.pk)
+        self.assertEqual(self.ids(data["included"]), {
+            "airplanes": [], "airlines": [], "airports": sorted([self.kyiv.pk, self.lviv.pk]),
+            "countries": [self.country.pk],
+        })
+
+    def test_compact_fields_side_load_only_the_listed_relations(self):
+        data = self.get(compact="true", fields="flight_number,departure_airport")
+        self.assertEqual(set(data["results"][0]), {"id", "flight_number", "departure_airport"})
+        self.assertEqual(self.ids(data["included"]), {
+            "airplanes": [], "airlines": [], "airports": sorted([self.kyiv.pk, self.lviv.pk]),
+            "countries": [self.country.pk],
+        })
+        data = self.get(compact="true", fields="flight_number")
+        self.assertEqual(self.ids(data["included"]), {"airplanes": [], "airlines": [], "airports": [], "countries": []})
+
+    def test_compact_retrieve_side_loads_its_relations(self):
+        data = self.get(f"/api/flight/flights/{self.outbound.flight_number}/", compact="1", expand="arrival_airport")
+        self.assertEqual(data["arrival_airport"]["city"], "Lviv")
+        self.assertEqual(self.ids(data["included"])["airports"], [self.kyiv.pk])
+
+    def test_cached_compact_list_keeps_its_included_block(self):
+        first = self.client.get("/api/flight/flights/", {"compact": "true"})
+        second = self.client.get("/api/flight/flights/", {"compact": "true"})
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(second.json(), first.json())
+        # Each representation is cached separately.
+        self.assertIn("city", self.get()["results"][0]["departure_airport"])
+
+    def test_build_included_runs_one_query_per_model(self):
+        representation = FlightRepresentation(frozenset(), frozenset(), True)
+        with self.assertNumQueries(4):
+            included = build_included([self.outbound, self.inbound], representation)
+        self.assertEqual(len(included["airports"]), 2)
+
+    def test_writes_ignore_read_parameters(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(
+            f"/api/flight/flights/{self.outbound.flight_number}/?fields=status&compact=true",
+            {"status": Flight.FlightStatus.DELAYED}, format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["departure_airport"]["city"], "Kyiv")
+        self.assertNotIn("included", response.json())
+
+
+class RouteCalendarTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.month = (timezone.localdate().replace(day=1) + timedelta(days=70)).replace(day=1)
+        self.start = timezone.make_aware(datetime.combine(self.month, time(8)))
+
+    def flight_on(self, number, day, hour=8, origin=None, destination=None):
+        departure = self.start + timedelta(days=day, hours=hour - 8)
+        return Flight.objects.create(
+            flight_number=number, airplane=self.airplane,
+            departure_airport=origin or self.kyiv, arrival_airport=destination or self.lviv,
+            departure_time=departure, arrival_time=departure + timedelta(hours=2),
+        )
+
+    def get(self, month=None):
+        response = self.client.get("/api/flight/flights/calendar/", {
+            "departure_airport": self.kyiv.pk, "arrival_airport": self.lviv.pk, "month": f"{month or self.month:%Y-%m}",
+        })
+        self.assertEqual(response.status_code, 200)
+        return response["X-Cache"], {day["date"]: day for day in response.json()["days"]}
+
+    def test_days_aggregate_bookable_flights_on_the_route(self):
+        morning = self.flight_on("CAL1", 2)
+        evening = self.flight_on("CAL2", 2, hour=20)
+        Flight.objects.filter(pk=evening.pk).update(economy_seats=0)
+        cancelled = self.flight_on("CAL3", 3)
+        Flight.objects.filter(pk=cancelled.pk).update(status=Flight.FlightStatus.CANCELLED)
+        self.flight_on("CAL4", 3, origin=self.lviv, destination=self.kyiv)
+
+        days = route_calendar(self.kyiv.pk, self.lviv.pk, self.month, now=self.start - timedelta(days=1))
+        self.assertEqual(len(days), calendar.monthrange(self.month.year, self.month.month)[1])
+        self.assertEqual(days[0]["date"], self.month)
+
+        day = days[2]
+        self.assertEqual(day["flights"], 2)
+        self.assertEqual(day["seats"], {"economy": 120, "business": 24, "first_class": 8})
+        self.assertEqual(day["lowest_fare"], day["fares"]["economy"])
+        # Each class shows the lowest full quote among flights with seats left in it: the sold-out evening
+        # economy cabin doesn't count, and the evening's business seats are cheaper, being less last-minute.
+        evening.refresh_from_db()
+        quoted = fares.quote([morning, evening], now=self.start - timedelta(days=1))
+        self.assertEqual(day["fares"]["economy"], str(quoted[morning.pk]["economy"]))
+        self.assertLess(quoted[evening.pk]["business"], quoted[morning.pk]["business"])
+        self.assertEqual(day["fares"]["business"], str(quoted[evening.pk]["business"]))
+
+        self.assertEqual((days[3]["flights"], days[3]["lowest_fare"]), (0, None))
+        self.assertEqual(days[3]["fares"], {"economy": None, "business": None, "first_class": None})
+
+    def test_departed_days_are_empty(self):
+        self.flight_on("CAL1", 1)
+        self.flight_on("CAL2", 4)
+        days = route_calendar(self.kyiv.pk, self.lviv.pk, self.month, now=self.start + timedelta(days=2))
+        self.assertEqual([day["flights"] for day in days[:5]], [0, 0, 0, 0, 1])
+
+    def test_booking_refreshes_only_the_calendar_of_its_route_and_month(self):
+        flight = self.flight_on("CAL1", 5)
+        later = self.month + timedelta(days=40)
+        self.assertEqual(self.get()[0], "MISS")
+        self.assertEqual(self.get(later)[0], "MISS")
+        status, days = self.get()
+        self.assertEqual((status, days[f"{flight.departure_time:%Y-%m-%d}"]["seats"]["economy"]), ("HIT", 120))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(flight.book_seat(Flight.SeatClass.ECONOMY))
+        status, days = self.get()
+        self.assertEqual((status, days[f"{flight.departure_time:%Y-%m-%d}"]["seats"]["economy"]), ("MISS", 119))
+        self.assertEqual(self.get(later)[0], "HIT")
+
+    def test_moving_a_flight_refreshes_both_months(self):
+        flight = self.flight_on("CAL1", 5)
+        later = self.month + timedelta(days=40)
+        self.get()
+        self.get(later)
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.departure_time += timedelta(days=40)
+            flight.arrival_time += timedelta(days=40)
+            flight.save()
+
+        status, days = self.get()
+        self.assertEqual((status, sum(day["flights"] for day in days.values())), ("MISS", 0))
+        status, days = self.get(later)
+        self.assertEqual((status, sum(day["flights"] for day in days.values())), ("MISS", 1))
+
+    def test_new_flight_on_another_route_keeps_the_calendar(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight_on("CAL1", 5, origin=self.lviv, destination=self.kyiv)
+        self.assertEqual(self.get()[0], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight_on("CAL2", 5)
+        self.assertEqual(self.get()[0], "MISS")
+
+
+class SeedTests(FlightDataMixin, TestCase):
+    counts = {"countries": 2, "airports": 5, "airlines": 2, "airplanes": 4, "users": 20, "flights": 40, "orders": 160}
+
+    def seed(self, seed=0, **options):
+        call_command("seed", seed=seed, start_date=date(2030, 1, 15), stdout=io.StringIO(), **self.counts, **options)
+        return Flight.objects.filter(flight_number__startswith=f"S{seed:02}")
+
+    @staticmethod
+    def snapshot(flights):
+        orders = Order.objects.filter(flight__in=flights)
+        return (
+            list(flights.order_by("pk").values_list()),
+            list(orders.order_by("pk").values_list()),
+            list(Ticket.objects.filter(order__in=orders).order_by("pk").values_list()),
+            list(User.objects.filter(email__endswith="@seed.example.com").order_by("pk").values_list()),
+        )
+
+    def test_same_seed_gives_the_same_rows_and_ids(self):
+        # Rows already stored do not move the seed's ids.
+        self.create_flight("PS100", self.kyiv, self.lviv)
+        first = self.snapshot(self.seed(3))
+        self.assertEqual(first[0][0][0], 4 * ID_BLOCK + 1)
+        self.assertTrue(all(len(rows) for rows in first))
+        self.assertEqual(self.snapshot(self.seed(3, replace=True)), first)
+
+    def test_different_seeds_do_not_collide(self):
+        first, second = self.seed(1), self.seed(2)
+        self.assertEqual((first.count(), second.count()), (40, 40))
+        self.assertNotEqual(
+            list(first.values_list("departure_time", flat=True)), list(second.values_list("departure_time", flat=True))
+        )
+        self.assertEqual(User.objects.filter(email__endswith="@seed.example.com").count(), 40)
+        # Seeds that would share a tag are refused rather than deleting each other's rows.
+        with self.assertRaisesMessage(CommandError, "--seed must be between 0 and 1295."):
+            self.seed(1296 + 1)
+        with self.assertRaisesMessage(CommandError, "Seed 1 was already generated"):
+            self.seed(1)
+
+    def test_rows_already_in_the_id_block_abort(self):
+        Country.objects.create(pk=ID_BLOCK + 7, name="Moldova")
+        with self.assertRaisesMessage(CommandError, "ids are already used by rows not generated with it in: country."):
+            self.seed(0)
+        self.assertFalse(Country.objects.filter(slug__startswith="seed-").exists())
+        self.assertEqual(self.seed(1).count(), 40)
+
+    def test_seat_counters_and_maps_match_the_tickets(self):
+        flights = self.seed().select_related("airplane")
+        self.assertTrue(Ticket.objects.filter(order__flight__in=flights).exists())
+        for flight in flights:
+            tickets = Ticket.objects.filter(order__flight=flight, order__status=Order.OrderStatus.CONFIRMED)
+            self.assertEqual(Ticket.objects.filter(order__flight=flight).count(), tickets.count())
+            seat_map = flight.get_seat_map()
+            for seat_class, field in Flight.SEAT_FIELDS.items():
+                issued = tickets.filter(seat_class=seat_class).count()
+                self.assertEqual(getattr(flight, field), getattr(flight.airplane, field) - issued)
+                self.assertEqual(seat_map.free_count(seat_class), getattr(flight, field))
+            self.assertTrue(all(seat_map.is_taken(seat) for seat in tickets.values_list("seat_number", flat=True)))
+            for order in flight.orders.filter(status=Order.OrderStatus.BOOKED):
+                self.assertEqual(order.total_price, sum(Decimal(ticket["price"]) for ticket in order.tickets_data))
+
+
+class CheckQueryPlansTests(TestCase):
+    options = {"flights": 300, "airports": 6, "users": 10, "orders": 300, "stdout": io.StringIO()}
+
+    @override_settings(ALLOWED_HOSTS=["localhost"])
+    def test_list_queries_use_indexes(self):
+        output = io.StringIO()
+        call_command("check_query_plans", **{**self.options, "stdout": output})
+        self.assertIn("All list queries use indexes.", output.getvalue())
+        self.assertFalse(Flight.objects.exists())
+
+    def test_scans_and_keyset_sorts_fail(self):
+        cases = (("flights by arrival, keyset", FlightViewSet, None, {"ordering": "arrival_time", "pagination": "cursor"}),)
+        output = io.StringIO()
+        with mock.patch("tasks.management.commands.check_query_plans.CASES", cases):
+            with self.assertRaisesMessage(CommandError, "1 query scanned a table or sorted a keyset page."):
+                call_command("check_query_plans", **{**self.options, "stdout": output})
+        self.assertIn("scan flight, sort", output.getvalue())
+
+
+class LoadTestTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "report.json")
+
+    async def send(self, host, port, method, path, headers, body=b""):
+        """The harness's raw HTTP call, answered by the test client instead of a server."""
+        response = self.client.generic(method, path, body, content_type="application/json", headers=headers)
+        return response.status_code, response.content
+
+    def run_loadtest(self, send, **options):
+        options = {"server": "none", "users": 2, "journeys": 2, "searches": 2, "flights": 2, **options}
+        # The journeys' event loop calls the test client, and so the ORM, inline. Each virtual user's
+        # task gets its own connection, which is why these tests commit instead of using TestCase.
+        with mock.patch("tasks.management.commands.loadtest.send", send), \
+                mock.patch.dict(os.environ, {"DJANGO_ALLOW_ASYNC_UNSAFE": "true"}):
+            call_command("loadtest", output=self.output, stdout=io.StringIO(), **options)
+        with open(self.output) as report:
+            return json.load(report)
+
+    def test_percentile_picks_the_nearest_rank(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_chunked_bodies_are_reassembled(self):
+        self.assertEqual(dechunk(b"4\r\n{\"a\"\r\n3;ext=1\r\n: 1\r\n1\r\n}\r\n0\r\n\r\n"), b'{"a": 1}')
+
+    def test_journeys_write_a_report_per_endpoint(self):
+        report = self.run_loadtest(self.send)
+
+        self.assertEqual(report["journeys"], {"completed": 4, "failed": 0})
+        self.assertEqual(report["options"]["users"], 2)
+        requests = {step: row["requests"] for step, row in report["endpoints"].items()}
+        self.assertEqual(requests, {"register": 2, "login": 2, "search": 8, "order": 4, "buy": 4, "cancel": 4})
+        self.assertEqual(report["totals"]["requests"], 24)
+        self.assertEqual(report["totals"]["errors"], 0)
+        for row in report["endpoints"].values():
+            self.assertEqual(row["error_rate"], 0.0)
+            self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+            self.assertLessEqual(row["p95_ms"], row["p99_ms"])
+            self.assertLessEqual(row["p99_ms"], row["max_ms"])
+        self.assertEqual(report["endpoints"]["order"]["statuses"], {"201": 4})
+        # The fixture and the virtual users are removed again.
+        self.assertFalse(User.objects.filter(email__startswith="loadtest-").exists())
+        self.assertFalse(Flight.objects.exists())
+
+    def test_failed_requests_count_as_errors_and_failed_journeys(self):
+        async def refuse_orders(host, port, method, path, headers, body=b""):
+            if path == "/api/flight/orders/":
+                return 503, b""
+            return await self.send(host, port, method, path, headers, body)
+
+        report = self.run_loadtest(refuse_orders)
+
+        self.assertEqual(report["journeys"], {"completed": 0, "failed": 4})
+        order = report["endpoints"]["order"]
+        self.assertEqual((order["requests"], order["errors"], order["error_rate"]), (4, 4, 1.0))
+        self.assertEqual(order["statuses"], {"503": 4})
+        self.assertEqual(report["endpoints"]["buy"]["requests"], 0)
+        self.assertEqual(report["totals"]["errors"], 4)
+
+    def test_unreachable_server_fails_every_journey(self):
+        async def refuse(*args):
+            raise ConnectionRefusedError
+
+        report = self.run_loadtest(refuse)
+
+        self.assertEqual(report["journeys"], {"completed": 0, "failed": 4})
+        self.assertEqual(report["endpoints"]["register"]["statuses"], {"0": 2})
+        self.assertEqual(report["endpoints"]["login"]["requests"], 0)
+
+
+class AsyncEndpointTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+        self.outbound = [
+            self.create_flight(f"ASY{day}", self.kyiv, self.lviv, departs_in=timedelta(days=day)) for day in (3, 1, 2)
+        ]
+        self.create_flight("ASYRET", self.lviv, self.kyiv)
+
+    async def test_search_filters_and_pages_by_departure(self):
+        response = await self.client.get(
+            "/api/flight/async/flights/", {"departure_airport": self.kyiv.pk, "page_size": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([flight["flight_number"] for flight in data["results"]], ["ASY1", "ASY2"])
+        self.assertIsNone(data["previous"])
+
+        response = await self.client.get(data["next"])
+        self.assertEqual([flight["flight_number"] for flight in response.json()["results"]], ["ASY3"])
+
+        response = await self.client.get("/api/flight/async/flights/", {"status": "unknown"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status", response.json())
+
+    async def test_detail(self):
+        response = await self.client.get("/api/flight/async/flights/ASY1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["arrival_airport"]["city"], "Lviv")
+        response = await self.client.get("/api/flight/async/flights/NOPE/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_order_creation_requires_a_token_and_holds_seats(self):
+        body = {"flight_id": self.outbound[0].pk, "tickets": [{"seat_class": "first_class"}] * 3}
+        response = await self.client.post("/api/flight/async/orders/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+        token = str(AccessToken.for_user(self.user))
+        response = await self.client.post(
+            "/api/flight/async/orders/", body, content_type="application/json",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["user"]["email"], self.user.email)
+
+        response = await self.client.get(f"/api/flight/async/flights/{self.outbound[0].flight_number}/")
+        self.assertEqual(response.json()["seat_availability"]["first_class"], 1)
+
+
+class InstrumentationTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        install()
+        route_histograms.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        self.create_orders(2, 2)
+        timing = self.client.get("/api/flight/orders/")["Server-Timing"]
+        for metric in ("sql;dur=", "serializer;dur=", "render;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_repeated_queries_are_counted(self):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            for pk in (1, 1, 2):
+                list(Flight.objects.filter(pk=pk))
+        finally:
+            current_metrics.reset(token)
+        self.assertEqual((metrics.query_count, metrics.duplicates, metrics.similar), (3, 1, 2))
+        self.assertIn('sql-repeat;desc="1 duplicate, 2 similar"', metrics.server_timing(0.01))
+
+    def test_route_metrics_are_staff_only(self):
+        self.client.get("/api/flight/flights/")
+        self.client.get("/api/flight/flights/")
+        self.assertEqual(self.client.get("/api/metrics/routes/").status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        stats = self.client.get("/api/metrics/routes/").json()["routes"]["GET flight-list"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(sum(stats["histogram_ms"].values()), 2)
+        self.assertGreater(stats["queries"], 0)
+        self.assertGreater(stats["serializer_ms"], 0)
+
+
+
+class ReplicaRoutingTests(FlightDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = self.create_flight("REP1", self.kyiv, self.lviv)
+
+    def read_database(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.renderer_context["view"].read_database
+
+    @override_settings(FLIGHT_CACHE_TIMEOUT=300, REPLICA_CACHE_TIMEOUT=10)
+    def test_router_reads_from_the_request_replica_and_writes_to_the_primary(self):
+        token = replica_alias.set("replica_1")
+        try:
+            with mock.patch.object(PrimaryReplicaRouter, "same_database", return_value=False):
+                self.assertEqual(Flight.objects.all().db, "replica_1")
+            self.assertEqual(router.db_for_write(Order), "default")
+            self.assertEqual(caching._timeout(), 10)
+        finally:
+            replica_alias.reset(token)
+        self.assertEqual(Flight.objects.all().db, "default")
+        self.assertEqual(caching._timeout(), 300)
+        self.assertFalse(router.allow_migrate("replica_1", "tasks"))
+
+    # The test database stands in for the replica.
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.assertEqual(self.read_database("/api/flight/flights/"), "default")
+        self.assertEqual(self.read_database(f"/api/flight/airports/{self.kyiv.slug}/"), "default")
+
+        response = self.client.post("/api/flight/orders/", {
+            "flight_id": self.flight.pk, "tickets": [{"seat_class": "economy", "direction": "outbound"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(cache.get(pin_key(self.user.pk)))
+        self.assertIsNone(self.read_database("/api/flight/flights/"))
+        response = self.client.post(f"/api/flight/orders/{response.json()['id']}/buy/")
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.read_database("/api/flight/flights/"), "default")
+
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_anonymous_writers_are_pinned_with_a_cookie(self):
+        client = APIClient()
+        password = "Repl1ca-Passw0rd!"
+        response = client.post("/api/accounts/register/", {
+            "email": "replica@example.com", "username": "replica", "first_name": "Read", "last_name": "Replica",
+            "date_of_birth": "1990-01-01", "password": password, "password_confirm": password,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(client.get("/api/flight/countries/").renderer_context["view"].read_database)
@@ -4,6 +4,7 @@ from .views import (
     CountryViewSet, AirportViewSet, AirlineViewSet, AirplaneViewSet,
     FlightViewSet, OrderViewSet, TicketViewSet
 )
+from .async_views import FlightSearchView, FlightDetailView, OrderCreateView
 
 router = DefaultRouter()
 router.register(r"countries", CountryViewSet, basename="country")
@@ -15,5 +16,8 @@ router.register(r"orders", OrderViewSet, basename="order")
 router.register(r"tickets", TicketViewSet, basename="ticket")
 
 urlpatterns = [
+    path("async/flights/", FlightSearchView.as_view(), name="async-flight-search"),
+    path("async/flights/<str:flight_number>/", FlightDetailView.as_view(), name="async-flight-detail"),
+    path("async/orders/", OrderCreateView.as_view(), name="async-order-create"),
     path("", include(router.urls)),
 ]
@@ -2,14 +2,22 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from .models import Country, Airport, Airline, Airplane, Flight, Order, Ticket
 from .serializers import (
     CountrySerializer, AirportSerializer, AirlineSerializer, AirplaneSerializer,
-    FlightSerializer, OrderSerializer, TicketSerializer
+    FlightSerializer, CompactFlightSerializer, FlightSeatMapSerializer, RouteSearchSerializer, RouteCalendarSerializer,
+    ItinerarySerializer, OrderSerializer, TicketSerializer, flight_representation, build_included
 )
-from users.permissions import IsOwnerOrAdmin
+from .routing import find_itineraries
+from .calendars import route_calendar
+from conf.db_router import ReplicaReadMixin
+from users.permissions import IsOwnerOrAdmin, IsAdminUser
+from . import caching, holds
+from .pagination import KeysetPagination
 
-class CountryViewSet(viewsets.ModelViewSet):
+class CountryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -19,7 +27,7 @@ class CountryViewSet(viewsets.ModelViewSet):
     lookup_field = "slug"
 
 
-class AirportViewSet(viewsets.ModelViewSet):
+class AirportViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Airport.objects.select_related("country").all()
     serializer_class = AirportSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -30,7 +38,7 @@ class AirportViewSet(viewsets.ModelViewSet):
     lookup_field = "slug"
 
 
-class AirlineViewSet(viewsets.ModelViewSet):
+class AirlineViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Airline.objects.select_related("airport__country").all()
     serializer_class = AirlineSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -41,7 +49,7 @@ class AirlineViewSet(viewsets.ModelViewSet):
     lookup_field = "slug"
 
 
-class AirplaneViewSet(viewsets.ModelViewSet):
+class AirplaneViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Airplane.objects.select_related("airline__airport").all()
     serializer_class = AirplaneSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -52,9 +60,9 @@ class AirplaneViewSet(viewsets.ModelViewSet):
     lookup_field = "slug"
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Flight.objects.select_related(
-        "airplane", "airplane__airline", "departure_airport", "arrival_airport"
+        "airplane__airline__airport__country", "departure_airport__country", "arrival_airport__country"
     ).all()
     serializer_class = FlightSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -63,21 +71,192 @@ class FlightViewSet(viewsets.ModelViewSet):
     search_fields = ["flight_number", "airplane__model", "airplane__airline__name"]
     ordering_fields = ["departure_time", "arrival_time", "flight_number"]
     lookup_field = "flight_number"
+    pagination_class = KeysetPagination
+    keyset_ordering = ("departure_time", "id")
+
+    related_paths = {
+        "airplane": "airplane__airline__airport__country",
+        "departure_airport": "departure_airport__country",
+        "arrival_airport": "arrival_airport__country",
+    }
+    model_fields = {
+        "airplane": ["airplane"],
+        "departure_airport": ["departure_airport"],
+        "arrival_airport": ["arrival_airport"],
+        "seat_availability": list(Flight.SEAT_FIELDS.values()),
+        "fares": ["base_fare", "departure_time", "airplane", *Flight.SEAT_FIELDS.values()],
+    }
+
+    @property
+    def representation(self):
+        return flight_representation(self.request)
+
+    def get_serializer_class(self):
+        if self.representation.compact:
+            return CompactFlightSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        representation = self.representation
+        if self.action not in ("list", "retrieve") or not (representation.fields or representation.compact):
+            return super().get_queryset()
+
+        relations = [
+            name for name in self.related_paths
+            if (not representation.fields or name in representation.fields)
+            and (not representation.compact or name in representation.expand)
+        ]
+        queryset = Flight.objects.select_related(*(self.related_paths[name] for name in relations))
+        if representation.fields:
+            columns = {"id", "flight_number"}
+            for name in representation.fields:
+                columns.update(self.model_fields.get(name, [name] if name in self.model_field_names else []))
+            queryset = queryset.only(*columns)
+        return queryset
+
+    @property
+    def model_field_names(self):
+        return {field.name for field in Flight._meta.concrete_fields}
+
+    def representation_variant(self):
+        representation = self.representation
+        return "|".join((
+            ",".join(sorted(representation.fields)),
+            ",".join(sorted(representation.expand)),
+            "compact" if representation.compact else "",
+        ))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == "list":
+            context["raw_seat_availability"] = True
+        return context
+
+    def _serialize_flights(self, flight_ids):
+        flights = list(self.get_queryset().in_bulk(flight_ids).values())
+        return {flight.pk: data for flight, data in zip(flights, self.get_serializer(flights, many=True).data)}
+
+    def list(self, request, *args, **kwargs):
+        variant = self.representation_variant()
+        key = caching.list_key(request)
+        entry = caching.get_list(key)
+        if entry is not None:
+            ids = entry['results'] if isinstance(entry, dict) else entry
+            results = caching.get_payloads(ids, self._serialize_flights, variant)
+            holds.subtract_from_payloads(results)
+            response = Response({**entry, 'results': results} if isinstance(entry, dict) else results)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        flights = list(page if page is not None else queryset)
+        results = self.get_serializer(flights, many=True).data
+        caching.store_payloads({flight.pk: item for flight, item in zip(flights, results)}, variant)
+        holds.subtract_from_payloads(results)
+
+        ids = [flight.pk for flight in flights]
+        if page is not None:
+            response = self.get_paginated_response(results)
+            entry = {**response.data, 'results': ids}
+        else:
+            response = Response(results)
+            entry = ids
+        if self.representation.compact:
+            if page is None:
+                response, entry = Response({'results': results}), {'results': ids}
+            response.data['included'] = entry['included'] = build_included(flights, self.representation)
+        caching.set_list(key, entry)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        if self.representation.compact:
+            data = {**data, 'included': build_included([instance], self.representation)}
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(caching.get_stats())
+
+    @action(detail=True, methods=['get'], url_path='seat-map')
+    def seat_map(self, request, flight_number=None):
+        flight = self.get_object()
+        return Response(FlightSeatMapSerializer(flight).data)
+
+    @action(detail=False, methods=['get'])
+    def routes(self, request):
+        params = RouteSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        now = timezone.now()
+        if data.get('date'):
+            earliest = timezone.make_aware(datetime.combine(data['date'], time.min))
+            latest = earliest + timedelta(days=1)
+            earliest = max(earliest, now)
+        else:
+            earliest, latest = now, now + timedelta(days=1)
+
+        itineraries = find_itineraries(
+            self.get_queryset(), data['departure_airport'].pk, data['arrival_airport'].pk, earliest, latest,
+            max_legs=data['max_legs'], limit=data['limit'],
+            seat_class=data.get('seat_class'), passengers=data['passengers'],
+        )
+        return Response(ItinerarySerializer(itineraries, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        params = RouteCalendarSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        departure_airport, arrival_airport = data['departure_airport'].pk, data['arrival_airport'].pk
+        month = data.get('month') or timezone.localdate().replace(day=1)
+        key = caching.calendar_key(departure_airport, arrival_airport, month)
+        days = caching.get_calendar(key)
+        cache_status = 'HIT'
+        if days is None:
+            days = route_calendar(departure_airport, arrival_airport, month)
+            caching.set_calendar(key, days)
+            cache_status = 'MISS'
+
+        response = Response({
+            'departure_airport': departure_airport,
+            'arrival_airport': arrival_airport,
+            'month': f"{month:%Y-%m}",
+            'days': days,
+        })
+        response['X-Cache'] = cache_status
+        return response
 
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.select_related("user", "flight", "return_flight").all()
+    queryset = Order.objects.select_related(
+        "user",
+        "flight__airplane__airline__airport__country",
+        "flight__departure_airport__country",
+        "flight__arrival_airport__country",
+        "return_flight__airplane__airline__airport__country",
+        "return_flight__departure_airport__country",
+        "return_flight__arrival_airport__country",
+    ).prefetch_related("tickets")
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ["ticket_type", "status", "flight", "return_flight"]
     search_fields = ["flight__flight_number", "return_flight__flight_number"]
     ordering_fields = ["created_at", "total_price"]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-created_at", "-id")
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         if self.request.user.is_staff:
-            return Order.objects.select_related("user", "flight", "return_flight").all()
-        return Order.objects.filter(user=self.request.user).select_related("user", "flight", "return_flight")
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsOwnerOrAdmin])
     def buy(self, request, pk=None):
@@ -91,7 +270,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         try:
             order.buy()
-            serializer = self.get_serializer(order)
+            serializer = self.get_serializer(self.get_object())
             return Response({
                 "message": "Order successfully confirmed and tickets issued!",
                 "order": serializer.data
@@ -114,7 +293,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         try:
             order.cancel()
-            serializer = self.get_serializer(order)
+            serializer = self.get_serializer(self.get_object())
             return Response({
                 "message": "Order successfully cancelled and seats released!",
                 "order": serializer.data
@@ -127,15 +306,23 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 
 class TicketViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Ticket.objects.select_related("order", "order__flight", "order__return_flight").all()
+    queryset = Ticket.objects.select_related(
+        "order__flight__departure_airport",
+        "order__flight__arrival_airport",
+        "order__return_flight__departure_airport",
+        "order__return_flight__arrival_airport",
+    )
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ["seat_class", "direction", "order__flight", "order__ticket_type"]
     search_fields = ["seat_number", "order__flight__flight_number"]
-    ordering_fields = ["seat_number", "price"]
+    ordering_fields = ["seat_number", "price", "created_at"]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-created_at", "-id")
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         if self.request.user.is_staff:
-            return Ticket.objects.select_related("order", "order__flight", "order__return_flight").all()
-        return Ticket.objects.filter(order__user=self.request.user).select_related("order", "order__flight", "order__return_flight")
+            return queryset
+        return queryset.filter(order__user=self.request.user)
@@ -0,0 +1,162 @@
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+
+class UserCache:
+    """
+    Users by token id for authentication: a per-process LRU whose entries
+    live ``AUTH_USER_LOCAL_TTL`` seconds, in front of the shared cache,
+    in front of the database. Every concrete field but the password hash
+    is cached; ``get()`` rebuilds the user with ``from_db()``, so the hash
+    is a deferred field loaded on access and ``save()`` leaves it alone.
+    ``User.save()`` and deletes drop both entries, so changes show up
+    everywhere within the local TTL. Bulk ``update()`` calls bypass that
+    and are bounded by ``AUTH_USER_CACHE_TIMEOUT``.
+    """
+
+    SECRET_FIELDS = ("password",)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = TTLCache(maxsize=settings.AUTH_USER_LOCAL_SIZE, ttl=settings.AUTH_USER_LOCAL_TTL)
+        return self._local
+
+    @cached_property
+    def fields(self):
+        # In concrete field order, as from_db() expects.
+        return [field.attname for field in User._meta.concrete_fields if field.attname not in self.SECRET_FIELDS]
+
+    @staticmethod
+    def key(user_id):
+        return f"auth-user-fields:{user_id}"
+
+    # Ids are compared as strings: simplejwt puts str(user.id) in tokens.
+    def _get_local(self, user_id):
+        with self._lock:
+            return self.local.get(str(user_id))
+
+    def _set_local(self, user_id, entry):
+        with self._lock:
+            self.local[str(user_id)] = entry
+
+    @staticmethod
+    def _query(user_id):
+        return User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+
+    def pack(self, user):
+        return {
+            "values": [getattr(user, field) for field in self.fields],
+            # The digest revocation claims are compared with, only when that check is on.
+            "password_digest": get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None,
+        }
+
+    def unpack(self, entry):
+        """A new instance per call, so requests never share or mutate a cached user."""
+        user = User.from_db(User.objects.db, self.fields, entry["values"])
+        user.password_digest = entry["password_digest"]
+        return user
+
+    def get(self, user_id):
+        entry = self._get_local(user_id)
+        if entry is None:
+            entry = cache.get(self.key(user_id))
+            if entry is None:
+                entry = self.pack(self._query(user_id).get())
+                cache.set(self.key(user_id), entry, settings.AUTH_USER_CACHE_TIMEOUT)
+            self._set_local(user_id, entry)
+        return self.unpack(entry)
+
+    async def aget(self, user_id):
+        entry = self._get_local(user_id)
+        if entry is None:
+            entry = await cache.aget(self.key(user_id))
+            if entry is None:
+                entry = self.pack(await self._query(user_id).aget())
+                await cache.aset(self.key(user_id), entry, settings.AUTH_USER_CACHE_TIMEOUT)
+            self._set_local(user_id, entry)
+        return self.unpack(entry)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.local.pop(str(user_id), None)
+        cache.delete(self.key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self.local.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that resolves the token's user through ``user_cache``."""
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        try:
+            user = user_cache.get(user_id)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.check_user(user, validated_token)
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    @staticmethod
+    def check_user(user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    ``CachedJWTAuthentication`` for async views: the token is validated
+    in-process as before and the user is resolved with the async cache and ORM.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        try:
+            user = await user_cache.aget(user_id)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.check_user(user, validated_token)
@@ -0,0 +1,101 @@
+import re
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+CERTS_KEY = "google-oauth:certs"
+CERTS_REFRESH_KEY = "google-oauth:certs-refresh"
+DEFAULT_CERTS_MAX_AGE = 3600
+CLOCK_SKEW_SECONDS = 10
+
+
+class GoogleOAuthError(ValueError):
+    """Google rejected the code, or returned an ID token that does not verify."""
+
+
+class GoogleOAuthClient:
+    """
+    Authorization-code exchange and ID-token verification for Google sign-in.
+
+    Requests go through one pooled session with a timeout on every call.
+    The ID token that comes back with the exchange is verified against
+    Google's signing keys, cached in the shared cache for as long as
+    Google's Cache-Control allows, so no userinfo request is needed.
+    """
+
+    def __init__(self):
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.GOOGLE_HTTP_POOL_SIZE, pool_maxsize=settings.GOOGLE_HTTP_POOL_SIZE,
+                # Authorization codes are single use, so only failed connects are retried.
+                max_retries=Retry(total=1, connect=1, read=0, status=0, allowed_methods=None, backoff_factor=0.1),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def exchange_code(self, code):
+        response = self.session.post(settings.GOOGLE_TOKEN_URI, data={
+            "code": code,
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+            "redirect_uri": settings.GOOGLE_REDIRECT_URL,
+            "grant_type": "authorization_code",
+        }, timeout=settings.GOOGLE_HTTP_TIMEOUT)
+        try:
+            data = response.json()
+        except ValueError:
+            raise GoogleOAuthError({"error": "invalid_response", "status": response.status_code})
+        if "error" in data or not response.ok:
+            raise GoogleOAuthError(data)
+        if "id_token" not in data:
+            raise GoogleOAuthError({"error": "missing_id_token"})
+        return data
+
+    def certs(self, refresh=False):
+        certs = None if refresh else cache.get(CERTS_KEY)
+        if certs is None:
+            response = self.session.get(settings.GOOGLE_CERTS_URI, timeout=settings.GOOGLE_HTTP_TIMEOUT)
+            response.raise_for_status()
+            certs = response.json()
+            match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+            cache.set(CERTS_KEY, certs, int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE)
+        return certs
+
+    def verify_id_token(self, token):
+        try:
+            key_id = jwt.decode_header(token).get("kid")
+        except (ValueError, google_exceptions.GoogleAuthError):
+            raise GoogleOAuthError({"error": "invalid_id_token"})
+        certs = self.certs()
+        # Google rotates keys; refetch for an unknown key id, at most once per GOOGLE_CERTS_MIN_REFRESH.
+        if key_id not in certs and cache.add(CERTS_REFRESH_KEY, True, settings.GOOGLE_CERTS_MIN_REFRESH):
+            certs = self.certs(refresh=True)
+        try:
+            claims = jwt.decode(
+                token, certs=certs, audience=settings.GOOGLE_CLIENT_ID, clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+            )
+        except (ValueError, google_exceptions.GoogleAuthError) as e:
+            raise GoogleOAuthError({"error": "invalid_id_token", "detail": str(e)})
+        if claims.get("iss") not in ISSUERS:
+            raise GoogleOAuthError({"error": "invalid_id_token", "detail": "Wrong issuer"})
+        return claims
+
+    def authenticate(self, code):
+        """Exchange ``code`` and return the verified claims of its ID token."""
+        return self.verify_id_token(self.exchange_code(code)["id_token"])
+
+
+google_client = GoogleOAuthClient()
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 15:00
+
+from django.db import migrations
+
+INDEX = "token_outstanding_expires_idx"
+
+
+def create_index(apps, schema_editor):
+    concurrently = "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {INDEX} ON token_blacklist_outstandingtoken (expires_at)"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+
+
+class Migration(migrations.Migration):
+    # The token tables are large in production; build the index without locking writes.
+    atomic = False
+
+    dependencies = [
+        ('users', '0005_remove_user_avatar_url_remove_user_is_google_user'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
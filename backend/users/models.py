@@ -1,7 +1,4 @@
 from django.db import models
-import google.auth.transport.requests
-import google.oauth2.id_token
-
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+MASK64 = (1 << 64) - 1
+# Blacklist rows are re-read this far below the highest id seen, for inserts that commit out of id order.
+SYNC_OVERLAP = 256
+BUILD_CHUNK = 50000
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings, bit-packed in a numpy array."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    @staticmethod
+    def _digest(item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def _positions(self, item):
+        h1, h2 = self._digest(item)
+        return [((h1 + i * h2) & MASK64) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, items):
+        """Add many items: hashes in Python, bit positions and writes vectorized."""
+        digests = np.array([self._digest(item) for item in items], dtype=np.uint64).reshape(-1, 2)
+        if not len(digests):
+            return
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = ((digests[:, :1] + steps * digests[:, 1:]) % np.uint64(self.size)).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Blacklisted refresh-token JTIs as a per-process Bloom filter, synced from
+    ``BlacklistedToken``: new rows are read incrementally at most every
+    ``TOKEN_REVOCATION_SYNC_SECONDS`` and the filter is rebuilt in a
+    background thread every ``TOKEN_REVOCATION_REBUILD_SECONDS`` (dropping
+    pruned tokens) or once it outgrows its capacity.
+
+    A JTI not in the filter is not revoked; a hit, or any check before the
+    first build finishes, is confirmed with the exact query. Rows another
+    process inserted since the last sync can be missed, which is why
+    ``users.tokens.RefreshToken.blacklist()`` refuses to blacklist a token
+    twice: every rotation and logout is checked against the database there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._last_id = self._count = 0
+            self._built_at = self._synced_at = float("-inf")
+            self._building = False
+
+    def is_revoked(self, jti):
+        bloom = self._current()
+        if bloom is not None and jti not in bloom:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def add(self, jti):
+        """Record a token this process blacklisted, once its transaction commits."""
+        def record():
+            bloom = self._filter
+            if bloom is not None:
+                bloom.add(jti)
+        transaction.on_commit(record)
+
+    def _current(self):
+        now = time.monotonic()
+        with self._lock:
+            bloom = self._filter
+            stale = bloom is None or self._count > bloom.capacity or (
+                now - self._built_at > settings.TOKEN_REVOCATION_REBUILD_SECONDS
+            )
+            if stale and not self._building:
+                self._building = True
+                threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+            sync = bloom is not None and now - self._synced_at > settings.TOKEN_REVOCATION_SYNC_SECONDS
+            if sync:
+                self._synced_at = now
+        if sync:
+            self._sync(bloom)
+        return bloom
+
+    def _sync(self, bloom):
+        rows = list(
+            BlacklistedToken.objects.filter(id__gt=self._last_id - SYNC_OVERLAP).order_by().values_list("id", "token__jti")
+        )
+        if rows:
+            bloom.update([jti for _, jti in rows])
+            with self._lock:
+                self._count += sum(row_id > self._last_id for row_id, _ in rows)
+                self._last_id = max(self._last_id, max(row_id for row_id, _ in rows))
+
+    def rebuild(self):
+        """Build a fresh filter from every blacklisted token and swap it in; returns it."""
+        started = time.monotonic()
+        bloom = BloomFilter(
+            max(settings.TOKEN_REVOCATION_CAPACITY, 2 * BlacklistedToken.objects.count()),
+            settings.TOKEN_REVOCATION_ERROR_RATE,
+        )
+        last_id = count = 0
+        rows = BlacklistedToken.objects.order_by().values_list("id", "token__jti").iterator(chunk_size=BUILD_CHUNK)
+        chunk = []
+        for row_id, jti in rows:
+            chunk.append(jti)
+            last_id = max(last_id, row_id)
+            if len(chunk) == BUILD_CHUNK:
+                bloom.update(chunk)
+                count += len(chunk)
+                chunk = []
+        bloom.update(chunk)
+        count += len(chunk)
+        with self._lock:
+            self._filter, self._last_id, self._count = bloom, last_id, count
+            self._built_at = self._synced_at = started
+        return bloom
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Could not build the token revocation filter")
+        finally:
+            self._building = False
+            connection.close()
+
+
+revocations = RevocationList()
+
+
+def prune_tokens(batch_size=None, now=None):
+    """
+    Delete expired outstanding tokens and their blacklist rows, one batch
+    of ids per transaction, and return metrics. Expired tokens fail
+    verification on their own, so their blacklist rows are dead weight.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = now or timezone.now()
+    started = time.perf_counter()
+    deleted = blacklisted = batches = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by().values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            OutstandingToken.objects.filter(pk__in=ids).only("pk").delete()
+        deleted += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+
+    elapsed = time.perf_counter() - started
+    metrics = {
+        'deleted': deleted,
+        'blacklisted': blacklisted,
+        'batches': batches,
+        'seconds': round(elapsed, 4),
+        'rows_per_second': round(deleted / elapsed, 1) if elapsed else 0.0,
+    }
+    if deleted:
+        logger.info("Pruned expired tokens: %s", metrics)
+    return metrics
+
+
+@shared_task
+def prune_expired_tokens():
+    return prune_tokens()
@@ -1,7 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import user_cache
 from .models import User
+from .tokens import RefreshToken
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -68,4 +74,38 @@ class UserUpdateSerializer(serializers.ModelSerializer):
     
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
-    
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    simplejwt's refresh with the user read through ``user_cache``, the
+    revocation check of ``users.tokens.RefreshToken`` and the rotation in
+    one transaction. A token whose user is gone is a 401 rather than a 500.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            try:
+                user = user_cache.get(user_id)
+            except User.DoesNotExist:
+                user = None
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            with transaction.atomic():
+                if api_settings.BLACKLIST_AFTER_ROTATION:
+                    refresh.blacklist()
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                refresh.outstand_new()
+            data["refresh"] = str(refresh)
+
+        return data
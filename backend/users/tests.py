@@ -1,3 +1,297 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import rsa
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from google.auth import crypt, jwt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication, user_cache
+from .models import User
+from .revocation import BloomFilter, prune_tokens, revocations
+from .tokens import RefreshToken
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class GoogleStubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        self.server.calls.append(self.path)
+        code = form["code"][0]
+        if code == "slow":
+            time.sleep(1)
+        if code not in self.server.id_tokens:
+            return self.reply(400, {"error": "invalid_grant"})
+        self.reply(200, {"access_token": "access", "id_token": self.server.id_tokens[code], "expires_in": 3599})
+
+    def do_GET(self):
+        self.server.calls.append(self.path)
+        self.reply(200, self.server.certs, {"Cache-Control": "public, max-age=3600"})
+
+    def reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class GoogleCallbackTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.keys = {kid: rsa.newkeys(1024) for kid in ("key-1", "key-2", "rogue")}
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), GoogleStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.enterClassContext(override_settings(
+            GOOGLE_TOKEN_URI=f"{base}/token", GOOGLE_CERTS_URI=f"{base}/certs",
+            GOOGLE_CLIENT_ID=CLIENT_ID, GOOGLE_HTTP_TIMEOUT=0.3,
+        ))
+
+    def setUp(self):
+        cache.clear()
+        self.server.calls = []
+        self.server.id_tokens = {}
+        self.publish("key-1")
+
+    def publish(self, *kids):
+        self.server.certs = {kid: self.keys[kid][0].save_pkcs1().decode() for kid in kids}
+
+    def issue(self, code, kid="key-1", **claims):
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234567890",
+            "email": "traveller@example.com", "email_verified": True, "name": "Traveller",
+            "iat": now, "exp": now + 3600, **claims,
+        }
+        signer = crypt.RSASigner.from_string(self.keys[kid][1].save_pkcs1().decode(), key_id=kid)
+        self.server.id_tokens[code] = jwt.encode(signer, payload).decode()
+
+    def callback(self, code):
+        return self.client.get("/api/accounts/google/callback/", {"code": code})
+
+    def test_id_token_is_verified_locally_with_cached_keys(self):
+        self.issue("first")
+        self.issue("second")
+        response = self.callback("first")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+        self.assertEqual(response.data["user"]["email"], "traveller@example.com")
+        self.assertTrue(User.objects.filter(email="traveller@example.com").exists())
+
+        self.assertEqual(self.callback("second").status_code, 200)
+        # One key fetch for both logins and no userinfo request.
+        self.assertEqual(self.server.calls, ["/token", "/certs", "/token"])
+
+    def test_rotated_key_is_fetched_once(self):
+        self.issue("old")
+        self.assertEqual(self.callback("old").status_code, 200)
+        self.publish("key-1", "key-2")
+        self.issue("new", kid="key-2")
+        self.issue("forged", kid="rogue")
+
+        self.assertEqual(self.callback("new").status_code, 200)
+        self.assertEqual(self.callback("forged").status_code, 400)
+        self.assertEqual(self.server.calls.count("/certs"), 2)
+
+    def test_invalid_id_tokens_are_rejected(self):
+        self.issue("audience", aud="someone-else")
+        self.issue("issuer", iss="https://evil.example.com")
+        self.issue("expired", iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)
+        self.issue("unverified", email_verified=False)
+        for code in ("audience", "issuer", "expired", "unverified"):
+            with self.subTest(code=code):
+                self.assertEqual(self.callback(code).status_code, 400)
+        self.assertFalse(User.objects.exists())
+
+    def test_token_endpoint_errors_and_timeouts(self):
+        response = self.callback("unknown")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "invalid_grant")
+
+        self.issue("slow")
+        started = time.monotonic()
+        response = self.callback("slow")
+        self.assertEqual(response.status_code, 502)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(email="cached@example.com", username="cached", password="secret")
+        self.request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def authenticate(self):
+        return CachedJWTAuthentication().authenticate(self.request)[0]
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        # Callers get their own copy.
+        user.first_name = "Changed"
+        self.assertEqual(self.authenticate().first_name, "")
+
+    def test_shared_cache_serves_other_processes(self):
+        self.authenticate()
+        user_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(), self.user)
+
+    def test_save_invalidates_role_and_deactivation(self):
+        self.assertFalse(self.authenticate().is_staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        self.assertTrue(self.authenticate().is_staff)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_api_uses_cached_users(self):
+        self.client.get("/api/accounts/profile/", HTTP_AUTHORIZATION=self.request.META["HTTP_AUTHORIZATION"])
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/api/accounts/profile/", HTTP_AUTHORIZATION=self.request.META["HTTP_AUTHORIZATION"]
+            )
+        self.assertEqual(response.data["email"], "cached@example.com")
+
+    def test_password_hash_is_not_cached(self):
+        self.authenticate()
+        entry = cache.get(user_cache.key(self.user.pk))
+        self.assertEqual(set(entry), {"values", "password_digest"})
+        self.assertNotIn(self.user.password, entry["values"])
+        self.assertIn("cached@example.com", entry["values"])
+
+        user = self.authenticate()
+        self.assertFalse(user._state.adding)
+        self.assertEqual((user.email, user.username, user.role), ("cached@example.com", "cached", "client"))
+        self.assertEqual(user.get_deferred_fields(), {"password"})
+        # Loaded on access, for the few callers that need it.
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("secret"))
+
+    def test_profile_update_keeps_the_password(self):
+        self.authenticate()
+        response = self.client.patch(
+            "/api/accounts/profile/", {"first_name": "Cached"}, content_type="application/json",
+            HTTP_AUTHORIZATION=self.request.META["HTTP_AUTHORIZATION"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], "cached@example.com")
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.email), ("Cached", "cached@example.com"))
+        self.assertTrue(self.user.check_password("secret"))
+
+    # simplejwt rebinds api_settings on setting_changed, which modules that imported it never see.
+    @mock.patch.object(api_settings, "CHECK_REVOKE_TOKEN", True)
+    def test_password_change_revokes_tokens(self):
+        self.request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.authenticate(), self.user)
+        self.assertEqual(len(cache.get(user_cache.key(self.user.pk))["password_digest"]), 32)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("changed")
+            self.user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, "password has been changed"):
+            self.authenticate()
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(email="tokens@example.com", username="tokens", password="secret")
+        self.refresh = RefreshToken.for_user(self.user)
+        revocations.reset()
+        revocations.rebuild()
+
+    def post_refresh(self, token):
+        return self.client.post("/api/accounts/token/refresh/", {"refresh": str(token)})
+
+    def test_rotated_token_cannot_be_replayed(self):
+        response = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data["refresh"], str(self.refresh))
+        self.assertEqual(self.post_refresh(response.data["refresh"]).status_code, 200)
+        self.assertEqual(self.post_refresh(self.refresh).status_code, 401)
+
+    def test_replay_is_rejected_before_the_filter_syncs(self):
+        # Blacklisted by another process: this process's filter has not synced yet.
+        BlacklistedToken.objects.create(token=self.refresh.outstand()[0])
+        self.assertFalse(revocations.is_revoked(self.refresh["jti"]))
+        self.assertEqual(self.post_refresh(self.refresh).status_code, 401)
+
+    def test_logout_revokes_once(self):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {self.refresh.access_token}"}
+        response = self.client.post("/api/accounts/logout/", {"refresh": str(self.refresh)}, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post("/api/accounts/logout/", {"refresh": str(self.refresh)}, **headers).status_code, 401)
+        self.assertEqual(self.post_refresh(self.refresh).status_code, 401)
+
+    def test_unrevoked_tokens_are_checked_in_memory(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked(self.refresh["jti"]))
+        with self.captureOnCommitCallbacks(execute=True):
+            RefreshToken(str(self.refresh)).blacklist()
+        self.assertTrue(revocations.is_revoked(self.refresh["jti"]))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        bloom.update([f"bulk-{i}" for i in range(500)])
+        bloom.add("single")
+        self.assertTrue(all(f"bulk-{i}" in bloom for i in range(500)))
+        self.assertIn("single", bloom)
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 100)
+
+    def test_prune_removes_expired_tokens(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.set_exp(lifetime=timedelta(days=-1))
+        expired.outstand()
+        expired.blacklist()
+        live = RefreshToken.for_user(self.user)
+        live.blacklist()
+        OutstandingToken.objects.filter(jti=expired["jti"]).update(expires_at=timezone.now() - timedelta(days=1))
+
+        metrics = prune_tokens(batch_size=1)
+        self.assertEqual(metrics["deleted"], 1)
+        self.assertEqual(metrics["blacklisted"], 1)
+        self.assertFalse(OutstandingToken.objects.filter(jti=expired["jti"]).exists())
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=live["jti"]).exists())
+        self.assertTrue(OutstandingToken.objects.filter(jti=self.refresh["jti"]).exists())
 
-# Create your tests here.
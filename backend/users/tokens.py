@@ -0,0 +1,59 @@
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .authentication import user_cache
+from .models import User
+from .revocation import revocations
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh token checked against ``revocations`` instead of a blacklist
+    query per refresh. ``blacklist()`` succeeds once per token, so a rotated
+    or logged-out token cannot be replayed while other processes' filters
+    catch up.
+    """
+
+    def check_blacklist(self):
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def outstand(self):
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM], defaults=self.outstanding_fields()
+        )
+
+    def outstand_new(self):
+        """Record a token whose jti was just set: a plain insert, no lookup or savepoint."""
+        return OutstandingToken.objects.create(jti=self.payload[api_settings.JTI_CLAIM], **self.outstanding_fields())
+
+    def outstanding_fields(self):
+        try:
+            user = user_cache.get(self.payload.get(api_settings.USER_ID_CLAIM))
+        except User.DoesNotExist:
+            user = None
+        return {
+            "user": user,
+            "created_at": self.current_time,
+            "token": str(self),
+            "expires_at": datetime_from_epoch(self["exp"]),
+        }
+
+    def blacklist(self):
+        with transaction.atomic(savepoint=False):
+            token, _created = self.outstand()
+            # The savepoint keeps a caller's transaction usable after a duplicate.
+            try:
+                with transaction.atomic():
+                    blacklisted = BlacklistedToken.objects.create(token=token)
+            except IntegrityError:
+                blacklisted = None
+        if blacklisted is None:
+            raise TokenError(_("Token is blacklisted"))
+        revocations.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
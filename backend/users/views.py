@@ -1,7 +1,7 @@
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .models import User
 from .serializers import (
@@ -18,6 +18,8 @@ from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 import requests
+from .google_oauth import google_client, GoogleOAuthError
+from .tokens import RefreshToken
 
 class UserRegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -95,8 +97,10 @@ class LogoutView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         refresh_token = serializer.validated_data["refresh"]
-        token = RefreshToken(refresh_token)
-        token.blacklist()
+        try:
+            RefreshToken(refresh_token).blacklist()
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
@@ -123,33 +127,21 @@ class GoogleAuthCallbackView(APIView):
         if not code:
             return Response({"error": "No code provided"}, status=400)
 
-        token_data = {
-            "code": code,
-            "client_id": settings.GOOGLE_CLIENT_ID,
-            "client_secret": settings.GOOGLE_CLIENT_SECRET,
-            "redirect_uri": settings.GOOGLE_REDIRECT_URL,
-            "grant_type": "authorization_code",
-        }
-        token_resp = requests.post(settings.GOOGLE_TOKEN_URI, data=token_data)
-        token_json = token_resp.json()
+        try:
+            claims = google_client.authenticate(code)
+        except GoogleOAuthError as e:
+            return Response(e.args[0], status=400)
+        except requests.RequestException:
+            return Response({"error": "Google did not respond"}, status=502)
 
-        if "error" in token_json:
-            return Response(token_json, status=400)
-
-        access_token = token_json["access_token"]
-
-        userinfo_resp = requests.get(
-            settings.GOOGLE_USERINFO_URI,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
-        userinfo = userinfo_resp.json()
-
-        email = userinfo.get("email")
-        name = userinfo.get("name")
-        picture = userinfo.get("picture")
+        email = claims.get("email")
+        name = claims.get("name")
+        picture = claims.get("picture")
 
         if not email:
             return Response({"error": "No email from Google"}, status=400)
+        if not claims.get("email_verified"):
+            return Response({"error": "Google email is not verified"}, status=400)
 
         user, _ = User.objects.get_or_create(email=email, defaults={"username": email, "first_name": name})
 